@@ -5,6 +5,12 @@ import json
 from streamlit_drawable_canvas import st_canvas
 from PIL import Image
 import datetime
+import hashlib
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+from geometry import parse_yolo_lines, xywh_to_xyxy, xywhn_to_xyxy, xyxy_to_xywhn, yolo_lines
+from thumbnails import ensure_thumbnail
 
 # Configure Streamlit page
 st.set_page_config(page_title="Infrared Annotation Tool", layout="wide")
@@ -28,6 +34,7 @@ false_neg_labels_dir = 'annotations/false_negatives/'
 corrected_ann_dir = 'annotations/corrected_yaml/'
 metadata_file = 'annotations/potential_false_negatives.yaml'
 json_tracking_file = 'annotations/box_changes.json'
+thumbnails_dir = 'annotations/thumbnails/'
 
 os.makedirs(false_neg_labels_dir, exist_ok=True)
 os.makedirs(corrected_ann_dir, exist_ok=True)
@@ -104,7 +111,8 @@ if not os.path.exists(metadata_file):
     st.stop()
 
 with open(metadata_file, 'r') as f:
-    annotations_data = yaml.safe_load(f)
+    # An empty file means a run that flagged nothing
+    annotations_data = yaml.safe_load(f) or []
 
 # Filter out images that don't exist and store full paths
 image_files = []
@@ -129,9 +137,9 @@ with col1:
         st.session_state.current_idx = 0
     for i, img_path in enumerate(image_files):
         try:
-            img = Image.open(img_path)
-            scale = min(1.0, 100 / img.size[0])
-            thumb = img.resize((int(img.size[0] * scale), int(img.size[1] * scale)))
+            # Images can come from anywhere, so the cache name carries a hash of the full path
+            path_hash = hashlib.sha1(os.path.abspath(img_path).encode('utf-8')).hexdigest()[:12]
+            thumb = ensure_thumbnail(img_path, thumbnails_dir, f'{path_hash}_{os.path.basename(img_path)}', 128)
             st.image(thumb, use_column_width=True)
             if st.button(f"Select Image {i+1}", key=f"btn_{i}"):
                 st.session_state.current_idx = i
@@ -153,17 +161,11 @@ with col2:
         label_path = os.path.join(false_neg_labels_dir, selected_image_name.replace('.jpg', '.txt'))
         if os.path.exists(label_path):
             with open(label_path, 'r') as f:
-                for i, line in enumerate(f.readlines()):
-                    parts = line.strip().split()
-                    if len(parts) == 5:
-                        cls, x_center, y_center, w, h = map(float, parts)
-                        x1 = (x_center - w / 2) * img_width
-                        y1 = (y_center - h / 2) * img_height
-                        x2 = (x_center + w / 2) * img_width
-                        y2 = (y_center + h / 2) * img_height
-                        box_id = f"Box {i+1}"
-                        canvas_objects.append(create_box(x1, y1, x2, y2, box_id, is_original=True))
-                        canvas_objects.append(create_text_label(x1 + 4, max(2, y1 - 14), box_id))
+                _, boxes_xywhn = parse_yolo_lines(f)
+            for i, (x1, y1, x2, y2) in enumerate(xywhn_to_xyxy(boxes_xywhn, img_width, img_height).tolist()):
+                box_id = f"Box {i+1}"
+                canvas_objects.append(create_box(x1, y1, x2, y2, box_id, is_original=True))
+                canvas_objects.append(create_text_label(x1 + 4, max(2, y1 - 14), box_id))
         if 'canvas_objects' not in st.session_state or st.session_state.get('current_image_idx', -1) != st.session_state.current_idx:
             st.session_state['canvas_objects'] = canvas_objects
             st.session_state['current_image_idx'] = st.session_state.current_idx
@@ -232,24 +234,15 @@ with col3:
             save_to_json(selected_image_path, updated_objects, labels_per_box)
         if len(updated_objects) > 0 and st.button("💾 Save Annotations"):
             try:
-                new_annotations = []
-                yolo_lines = []
-                for i, obj in enumerate(updated_objects):
-                    if obj["type"] == "rect":
-                        left, top = obj["left"], obj["top"]
-                        width, height = obj["width"], obj["height"]
-                        x_center = (left + width / 2) / st.session_state.img_width
-                        y_center = (top + height / 2) / st.session_state.img_height
-                        w_norm = width / st.session_state.img_width
-                        h_norm = height / st.session_state.img_height
-                        class_id = label_options.index(st.session_state.get(f"label_{i}", "Person"))
-                        yolo_lines.append(f"{class_id} {x_center:.6f} {y_center:.6f} {w_norm:.6f} {h_norm:.6f}\n")
-                        new_annotations.append({
-                            'label': st.session_state.get(f"label_{i}", "Person"),
-                            'bbox': [x_center, y_center, w_norm, h_norm]
-                        })
+                rects = [(i, obj) for i, obj in enumerate(updated_objects) if obj["type"] == "rect"]
+                box_labels = [st.session_state.get(f"label_{i}", "Person") for i, _ in rects]
+                boxes_xywhn = xyxy_to_xywhn(
+                    xywh_to_xyxy([[obj["left"], obj["top"], obj["width"], obj["height"]] for _, obj in rects]),
+                    st.session_state.img_width, st.session_state.img_height)
+                new_annotations = [{'label': label, 'bbox': bbox}
+                                   for label, bbox in zip(box_labels, boxes_xywhn.tolist())]
                 with open(label_path, 'w') as f:
-                    f.writelines(yolo_lines)
+                    f.writelines(yolo_lines([label_options.index(label) for label in box_labels], boxes_xywhn))
                 corrected_file = os.path.join(corrected_ann_dir, selected_image_name.replace('.jpg', '.yaml'))
                 yaml_data = {
                     'image': selected_image_path,
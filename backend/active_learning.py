@@ -0,0 +1,144 @@
+from itertools import chain
+
+import numpy as np
+
+from geometry import iter_pairs_by_key, paired_iou
+
+STRATEGIES = ('least_confidence', 'near_threshold', 'entropy', 'disagreement')
+# Detections scoring within this distance of the confidence threshold count as near it
+DEFAULT_BAND = 0.1
+DEFAULT_MATCH_IOU = 0.5
+
+
+class FlatPredictions:
+    """Every detection of a prediction set in flat arrays, grouped by image.
+
+    Image i owns rows offsets[i]:offsets[i + 1] of boxes, scores and classes,
+    so per-image statistics are single segmented NumPy reductions.
+    """
+
+    def __init__(self, names, counts, boxes, scores, classes):
+        self.names = names
+        self.counts = np.asarray(counts, dtype=np.int64)
+        self.offsets = np.concatenate(([0], np.cumsum(self.counts)))
+        self.boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+        self.scores = np.asarray(scores, dtype=np.float32)
+        self.classes = np.asarray(classes, dtype=np.float32)
+        self.image_of = np.repeat(np.arange(len(names)), self.counts)
+
+    def __len__(self):
+        return len(self.names)
+
+    def subset(self, indices):
+        """The predictions of images at indices, in that order."""
+        indices = np.asarray(indices, dtype=np.int64)
+        rows = _segment_rows(self.offsets[indices], self.counts[indices])
+        return FlatPredictions([self.names[i] for i in indices], self.counts[indices],
+                               self.boxes[rows], self.scores[rows], self.classes[rows])
+
+    def align(self, names):
+        """The predictions of names in that order; names without predictions get none."""
+        position = {name: i for i, name in enumerate(self.names)}
+        # -1 picks the trailing zero count (and the final offset), so missing names cost no special case
+        indices = np.array([position.get(name, -1) for name in names], dtype=np.int64)
+        counts = np.append(self.counts, 0)[indices]
+        rows = _segment_rows(self.offsets[indices], counts)
+        return FlatPredictions(list(names), counts, self.boxes[rows], self.scores[rows], self.classes[rows])
+
+    def where(self, mask):
+        """The same images keeping only the detections where mask is set."""
+        return FlatPredictions(self.names, np.bincount(self.image_of[mask], minlength=len(self)),
+                               self.boxes[mask], self.scores[mask], self.classes[mask])
+
+
+def flatten_predictions(items):
+    """Build FlatPredictions from (image_name, [prediction, ...]) pairs as stored in results files."""
+    names, preds = [], []
+    for name, predictions in items:
+        names.append(name)
+        preds.append(predictions)
+    counts = [sum(len(p.get('scores', [])) for p in predictions) for predictions in preds]
+    total = sum(counts)
+    each = [p for predictions in preds for p in predictions]
+    scores = np.fromiter(chain.from_iterable(p.get('scores', []) for p in each), np.float32, total)
+    classes = np.fromiter(chain.from_iterable(p.get('classes', []) for p in each), np.float32, total)
+    boxes = np.fromiter(chain.from_iterable(chain.from_iterable(p.get('boxes', [])) for p in each),
+                        np.float32, total * 4)
+    return FlatPredictions(names, counts, boxes, scores, classes)
+
+
+def from_columns(columns):
+    """FlatPredictions over a PredictionColumns run; the arrays stay memory-mapped."""
+    return FlatPredictions(columns.names, np.diff(columns.offsets), columns.boxes, columns.scores, columns.classes)
+
+
+def _segment_rows(starts, counts):
+    """Row indices covering [start, start + count) for each segment, concatenated."""
+    total = int(counts.sum())
+    seg_starts = np.cumsum(counts) - counts
+    return np.arange(total) - np.repeat(seg_starts - starts, counts)
+
+
+def _segment_max(values, offsets, empty):
+    counts = np.diff(offsets)
+    out = np.full(len(counts), empty, dtype=np.float64)
+    nonempty = counts > 0
+    if nonempty.any():
+        # reduceat on the non-empty starts only: empty segments contribute no rows in between
+        out[nonempty] = np.maximum.reduceat(values, offsets[:-1][nonempty])
+    return out
+
+
+def least_confidence(preds):
+    """1 - the image's top detection score; images without detections score 0."""
+    top = _segment_max(preds.scores, preds.offsets, empty=np.nan)
+    return np.where(np.isnan(top), 0.0, 1.0 - top)
+
+
+def near_threshold(preds, threshold, band=DEFAULT_BAND):
+    """Number of detections scoring within band of the confidence threshold they were kept at."""
+    near = np.abs(preds.scores - threshold) <= band
+    return np.bincount(preds.image_of, weights=near, minlength=len(preds))
+
+
+def entropy(preds):
+    """Summed binary entropy (bits) of the detection scores: many hesitant boxes rank highest."""
+    p = np.clip(preds.scores.astype(np.float64), 1e-7, 1 - 1e-7)
+    h = -(p * np.log2(p) + (1 - p) * np.log2(1 - p))
+    return np.bincount(preds.image_of, weights=h, minlength=len(preds))
+
+
+def disagreement(preds, other, iou_threshold=DEFAULT_MATCH_IOU):
+    """Fraction of detections, across both models, with no same-class match at iou_threshold.
+
+    other must hold the same images in the same order. Boxes are grouped by
+    (image, class) and every pair within a group is scored at once, a few
+    million pairs per step.
+    """
+    _, class_index = np.unique(np.concatenate((preds.classes, other.classes)), return_inverse=True)
+    num_classes = int(class_index.max()) + 1 if len(class_index) else 1
+    keys_a = preds.image_of * num_classes + class_index[:len(preds.scores)]
+    keys_b = other.image_of * num_classes + class_index[len(preds.scores):]
+    matched_a = np.zeros(len(preds.scores), dtype=bool)
+    matched_b = np.zeros(len(other.scores), dtype=bool)
+    for a_rows, b_rows in iter_pairs_by_key(keys_a, keys_b):
+        match = paired_iou(preds.boxes[a_rows], other.boxes[b_rows]) >= iou_threshold
+        matched_a[a_rows[match]] = True
+        matched_b[b_rows[match]] = True
+    unmatched = (np.bincount(preds.image_of, weights=~matched_a, minlength=len(preds))
+                 + np.bincount(other.image_of, weights=~matched_b, minlength=len(other)))
+    total = preds.counts + other.counts
+    return np.where(total > 0, unmatched / np.maximum(total, 1), 0.0)
+
+
+def top_k(names, scores, k):
+    """The k names with the highest scores, highest first; ties keep input order. Zero scores are skipped."""
+    scores = np.asarray(scores, dtype=np.float64)
+    candidates = np.flatnonzero(scores > 0)
+    if len(candidates) > k:
+        # Partition to find the cutoff so only the k winners are fully sorted
+        cutoff = -np.partition(-scores[candidates], k - 1)[k - 1]
+        above = candidates[scores[candidates] > cutoff]
+        candidates = np.concatenate((above, candidates[scores[candidates] == cutoff][:k - len(above)]))
+    order = candidates[np.lexsort((candidates, -scores[candidates]))]
+    return [names[i] for i in order], scores[order]
@@ -0,0 +1,141 @@
+import json
+import os
+import sqlite3
+import time
+
+STORE_FILENAME = 'annotations.sqlite'
+LEGACY_FILENAME = 'manual_annotations.json'
+# The legacy file is renamed to this once imported, so nothing keeps reading a copy that no longer updates
+LEGACY_IMPORTED_SUFFIX = '.imported'
+
+
+class AnnotationStore:
+    """Per-image manual annotations for one project, kept in SQLite.
+
+    Each save touches a single row inside one transaction, so a save costs the
+    same on a 10-image and a 100k-image project. WAL mode plus a busy timeout
+    lets several WSGI worker processes read and write the same project safely.
+    An existing manual_annotations.json is imported the first time the store is
+    opened and then renamed to manual_annotations.json.imported; from then on
+    the store is the only copy, exported on request by iter_export_json.
+    """
+
+    def __init__(self, project_dir):
+        self.project_dir = project_dir
+        self.path = os.path.join(project_dir, STORE_FILENAME)
+        self._conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        with self._transaction():
+            self._conn.execute('CREATE TABLE IF NOT EXISTS images ('
+                               'file_name TEXT PRIMARY KEY, width INTEGER, height INTEGER, '
+                               'annotations TEXT NOT NULL, updated_at REAL)')
+            self._conn.execute('CREATE TABLE IF NOT EXISTS categories ('
+                               'name TEXT PRIMARY KEY, position INTEGER NOT NULL)')
+            self._conn.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)')
+            imported = self._conn.execute("SELECT 1 FROM meta WHERE key = 'legacy_imported'").fetchone()
+            legacy_path = os.path.join(project_dir, LEGACY_FILENAME)
+            migrate = not imported and os.path.exists(legacy_path)
+            if migrate:
+                with open(legacy_path, 'r', encoding='utf-8') as f:
+                    self._import(json.load(f))
+            if not imported:
+                self._conn.execute("INSERT INTO meta VALUES ('legacy_imported', '1')")
+        if migrate:
+            os.replace(legacy_path, legacy_path + LEGACY_IMPORTED_SUFFIX)
+
+    def close(self):
+        self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _transaction(self):
+        return _Transaction(self._conn)
+
+    def get(self, file_name):
+        row = self._conn.execute('SELECT width, height, annotations FROM images WHERE file_name = ?',
+                                 (file_name,)).fetchone()
+        if row is None:
+            return None
+        return {'width': row[0], 'height': row[1], 'annotations': json.loads(row[2])}
+
+    def put(self, file_name, width, height, annotations):
+        """Insert or replace one image's annotations and register any new labels."""
+        with self._transaction():
+            self._put(file_name, width, height, annotations)
+
+    def _put(self, file_name, width, height, annotations):
+        self._conn.execute('INSERT INTO images VALUES (?, ?, ?, ?, ?) ON CONFLICT(file_name) DO UPDATE SET '
+                           'width = excluded.width, height = excluded.height, '
+                           'annotations = excluded.annotations, updated_at = excluded.updated_at',
+                           (file_name, width, height, json.dumps(annotations), time.time()))
+        for ann in annotations:
+            label = ann.get('label') or ann.get('category')
+            if label:
+                self._add_category(label)
+
+    def _add_category(self, label):
+        self._conn.execute('INSERT OR IGNORE INTO categories '
+                           'SELECT ?, COALESCE(MAX(position) + 1, 0) FROM categories', (label,))
+
+    def delete(self, file_name):
+        with self._transaction():
+            self._conn.execute('DELETE FROM images WHERE file_name = ?', (file_name,))
+
+    def categories(self):
+        return [row[0] for row in self._conn.execute('SELECT name FROM categories ORDER BY position')]
+
+    def iter_images(self):
+        """Yield (file_name, entry) in first-saved order without loading the whole table."""
+        cursor = self._conn.execute('SELECT file_name, width, height, annotations FROM images ORDER BY rowid')
+        for file_name, width, height, annotations in cursor:
+            yield file_name, {'width': width, 'height': height, 'annotations': json.loads(annotations)}
+
+    def names(self):
+        """Names of every image with a saved annotation entry, including ones saved with no boxes."""
+        return [row[0] for row in self._conn.execute('SELECT file_name FROM images')]
+
+    def count(self):
+        return self._conn.execute('SELECT COUNT(*) FROM images').fetchone()[0]
+
+    def replace_all(self, data):
+        """Replace the whole store with a manual_annotations.json style document."""
+        with self._transaction():
+            self._conn.execute('DELETE FROM images')
+            self._conn.execute('DELETE FROM categories')
+            self._import(data)
+
+    def import_json(self, data):
+        """Merge a manual_annotations.json style document into the store."""
+        with self._transaction():
+            self._import(data)
+
+    def _import(self, data):
+        for label in data.get('categories', []):
+            self._add_category(label)
+        for file_name, entry in data.get('images', {}).items():
+            self._put(file_name, entry.get('width'), entry.get('height'), entry.get('annotations', []))
+
+    def iter_export_json(self):
+        """Yield the store as manual_annotations.json text, one image per chunk."""
+        yield '{\n  "images": {'
+        for i, (file_name, entry) in enumerate(self.iter_images()):
+            yield (',\n    ' if i else '\n    ') + f'{json.dumps(file_name)}: {json.dumps(entry)}'
+        yield f'\n  }},\n  "categories": {json.dumps(self.categories())}\n}}\n'
+
+
+class _Transaction:
+    """BEGIN IMMEDIATE ... COMMIT, so concurrent writers queue instead of failing mid-update."""
+
+    def __init__(self, conn):
+        self._conn = conn
+
+    def __enter__(self):
+        self._conn.execute('BEGIN IMMEDIATE')
+
+    def __exit__(self, exc_type, *exc):
+        self._conn.execute('ROLLBACK' if exc_type else 'COMMIT')
@@ -6,6 +6,35 @@ import random
 import json
 import yaml
 import time
+import hashlib
+
+import numpy as np
+
+from active_learning import (DEFAULT_BAND, STRATEGIES, disagreement, entropy, flatten_predictions, from_columns,
+                             least_confidence, near_threshold, top_k)
+from annotation_store import AnnotationStore
+from image_index import ImageIndexes
+from image_metadata import ImageMetadataStore, read_header, scan_metadata_job
+from ingest import (UploadOffsetMismatch, append_upload_chunk, ingest_zip, ingest_zip_job, start_upload,
+                    upload_offset, upload_path)
+from http_cache import send_cached_file, send_compressed_json, write_json_export
+from evaluation import DEFAULT_FALSE_NEGATIVE_IMAGES, evaluate_project, project_class_names
+from export import EXPORT_FORMATS, iter_export_zip
+from geometry import xywh_to_xyxy, xyxy_to_xywh
+from engines import DEFAULT_CONF, ENGINES, OnnxRuntimeEngine, UltralyticsEngine, default_engine, export_onnx, load_onnx_session, ort
+from auto_label import (EXECUTION_KEYS, INFERENCE_PARAM_KEYS, cached_predictions, execution_settings, inference_params,
+                        run_auto_label_job)
+from jobs import JobManager, sse_events
+from near_duplicates import MAX_RADIUS, HammingIndex, cluster_representatives
+from model_cache import ModelCache
+from prediction_cache import PredictionCache
+from prediction_store import RESULTS_EXPORT_FILENAME, RESULTS_LOG_FILENAME, current_prediction_columns, iter_results_json
+from subsets import (SET_OPERATIONS, ImageIds, bitmap_count, combine_bitmaps, create_subset, iter_subset_json,
+                     list_subsets as find_subsets, sample, subset_bitmap, subset_contains, subset_images,
+                     subset_name_of, subset_paths, write_subset)
+from sam_service import EmbeddingCache, SamService, mask_to_box, mask_to_rle, precompute_embeddings_job
+from thumbnails import (THUMBNAIL_MIMETYPE, THUMBNAIL_SIZES, ensure_project_thumbnail, pregenerate_thumbnails_job,
+                        remove_project_thumbnails)
 
 try:
     from ultralytics import YOLO
@@ -20,7 +49,7 @@ BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 PROJECTS_DIR = os.path.join(BASE_DIR, 'projects')
 os.makedirs(PROJECTS_DIR, exist_ok=True)
 
-# In-memory store for auto-annotate requests
+# In-memory store for auto-annotate requests, keyed by job id
 AUTO_ANNOTATE_REQUESTS = {}
 
 MODELS_DIR = os.path.abspath(os.path.join(BASE_DIR, '..', 'models'))
@@ -28,6 +57,35 @@ CONFIG_DIR = os.path.abspath(os.path.join(BASE_DIR, '..', 'config'))
 MODELS_YAML = os.path.join(CONFIG_DIR, 'models.yaml')
 LABELS_FILE = os.path.join(CONFIG_DIR, 'labels.txt')
 
+# Number of images sent through each model call during auto-labeling
+DEFAULT_AUTO_LABEL_BATCH_SIZE = 16
+
+# Loaded models are shared across requests, evicted by least recent use
+MODEL_CACHE_BUDGET_MB = int(os.environ.get('MODEL_CACHE_BUDGET_MB', '1024'))
+MODEL_CACHE = ModelCache(MODEL_CACHE_BUDGET_MB * 1024 * 1024)
+
+# Background jobs (auto-labeling runs) execute on this pool
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', '2'))
+JOBS = JobManager(AUTO_ANNOTATE_REQUESTS, max_workers=JOB_WORKERS)
+
+# SAM prompting: encoder embeddings are cached per image in memory and under <project>/sam_embeddings
+SAM_FAMILY = 'sam'
+SAM_EMBEDDINGS = EmbeddingCache(int(os.environ.get('SAM_EMBEDDING_MEMORY_ITEMS', '16')),
+                                int(os.environ.get('SAM_EMBEDDING_DISK_MB', '4096')) * 1024 * 1024)
+SAM = SamService(MODELS_DIR, SAM_EMBEDDINGS)
+
+# Image listings are served from per-project in-memory indexes, refreshed on directory mtime
+IMAGE_INDEXES = ImageIndexes()
+
+# Hamming distance (of 64 dHash bits) under which two frames count as near-duplicates
+DEFAULT_NEAR_DUPLICATE_RADIUS = int(os.environ.get('NEAR_DUPLICATE_RADIUS', '5'))
+
+# Threads decompressing zip members in parallel during upload
+INGEST_WORKERS = int(os.environ.get('INGEST_WORKERS', '4'))
+
+# Thumbnails are generated at upload time under <project>/thumbnails; 0 uses every CPU
+THUMBNAIL_WORKERS = int(os.environ.get('THUMBNAIL_WORKERS', '0')) or None
+
 
 # Serve the main frontend page
 from flask import render_template
@@ -83,30 +141,163 @@ def upload_zip(project_name):
         return jsonify({'error': 'No file uploaded'}), 400
     file = request.files['file']
     project_dir = os.path.join(PROJECTS_DIR, project_name)
-    images_dir = os.path.join(project_dir, 'images')
-    os.makedirs(images_dir, exist_ok=True)
-    SUPPORTED_EXTS = (".jpg", ".jpeg", ".png", ".bmp")
-    with zipfile.ZipFile(file.stream) as z:
-        valid_files = [f for f in z.namelist() if f.lower().endswith(SUPPORTED_EXTS)]
-        for f in valid_files:
-            filename = os.path.basename(f)
-            if filename:
-                with z.open(f) as source, open(os.path.join(images_dir, filename), "wb") as target:
-                    target.write(source.read())
-    return jsonify({'message': f"Uploaded {len(valid_files)} image(s)!"})
+    # Werkzeug spools large bodies to a temporary file, so members are read from disk
+    try:
+        report = ingest_zip(file.stream, project_dir, INGEST_WORKERS)
+    except zipfile.BadZipFile:
+        return jsonify({'error': 'Uploaded file is not a valid zip archive'}), 400
+    job = after_ingest(project_name, report['added'])
+    return jsonify({'message': f"Uploaded {len(report['added'])} image(s)!",
+                    'num_duplicates': len(report['duplicates']), 'duplicates': report['duplicates'],
+                    'collisions': report['collisions'], 'thumbnail_job_id': job.id})
+
+def after_ingest(project_name, added):
+    """Index newly ingested images and start generating their thumbnails."""
+    project_dir = os.path.join(PROJECTS_DIR, project_name)
+    IMAGE_INDEXES.get(os.path.join(project_dir, 'images')).add(added)
+    return JOBS.submit('thumbnails', project_name, pregenerate_thumbnails_job,
+                       project_dir, added, THUMBNAIL_WORKERS, total=len(added))
+
+# Resumable uploads: create, PUT chunks at ?offset=, GET to find where to resume, then complete
+@app.route('/api/projects/<project_name>/uploads', methods=['POST'])
+def start_chunked_upload(project_name):
+    project_dir = os.path.join(PROJECTS_DIR, project_name)
+    if not os.path.exists(project_dir):
+        return jsonify({'error': 'Project does not exist'}), 404
+    return jsonify({'upload_id': start_upload(project_dir), 'offset': 0}), 201
+
+@app.route('/api/projects/<project_name>/uploads/<upload_id>', methods=['GET'])
+def get_chunked_upload(project_name, upload_id):
+    project_dir = os.path.join(PROJECTS_DIR, project_name)
+    try:
+        return jsonify({'upload_id': upload_id, 'offset': upload_offset(project_dir, upload_id)})
+    except (ValueError, FileNotFoundError):
+        return jsonify({'error': 'Upload not found'}), 404
+
+@app.route('/api/projects/<project_name>/uploads/<upload_id>', methods=['PUT'])
+def put_upload_chunk(project_name, upload_id):
+    project_dir = os.path.join(PROJECTS_DIR, project_name)
+    offset = request.args.get('offset', type=int)
+    if offset is None:
+        return jsonify({'error': 'offset is required'}), 400
+    try:
+        new_offset = append_upload_chunk(project_dir, upload_id, offset, request.stream)
+    except (ValueError, FileNotFoundError):
+        return jsonify({'error': 'Upload not found'}), 404
+    except UploadOffsetMismatch as e:
+        return jsonify({'error': str(e), 'offset': e.offset}), 409
+    return jsonify({'upload_id': upload_id, 'offset': new_offset})
+
+@app.route('/api/projects/<project_name>/uploads/<upload_id>/complete', methods=['POST'])
+def complete_chunked_upload(project_name, upload_id):
+    project_dir = os.path.join(PROJECTS_DIR, project_name)
+    try:
+        zip_path = upload_path(project_dir, upload_id)
+    except (ValueError, FileNotFoundError):
+        return jsonify({'error': 'Upload not found'}), 404
+    if not zipfile.is_zipfile(zip_path):
+        return jsonify({'error': 'Uploaded file is not a valid zip archive'}), 400
+    job = JOBS.submit('ingest', project_name, ingest_zip_job, zip_path, project_dir, INGEST_WORKERS,
+                      lambda added: after_ingest(project_name, added), True)
+    return jsonify({'message': 'Extracting images', 'job_id': job.id}), 202
 
 @app.route('/projects/<project_name>/images/<filename>')
 def serve_image(project_name, filename):
     images_dir = os.path.join(PROJECTS_DIR, project_name, 'images')
-    return send_from_directory(images_dir, filename)
+    # Clients that append ?v=<mtime or hash> get a year-long cache; plain URLs revalidate with a 304
+    return send_cached_file(images_dir, filename, immutable='v' in request.args)
 
-@app.route('/projects/<project_name>/images/', methods=['GET'])
-def list_images(project_name):
+@app.route('/projects/<project_name>/thumbnails/<int:size>/<filename>')
+def serve_thumbnail(project_name, filename, size):
+    if size not in THUMBNAIL_SIZES:
+        return jsonify({'error': f'Thumbnail size must be one of {list(THUMBNAIL_SIZES)}'}), 400
+    project_dir = os.path.join(PROJECTS_DIR, project_name)
+    filename = os.path.basename(filename)
+    if not os.path.isfile(os.path.join(project_dir, 'images', filename)):
+        return jsonify({'error': 'Image not found'}), 404
+    # Served from the cache when fresh, otherwise generated now (e.g. before the upload job reaches it)
+    try:
+        path = ensure_project_thumbnail(project_dir, filename, size)
+    except (OSError, ValueError) as e:
+        return jsonify({'error': f'Could not create thumbnail: {e}'}), 500
+    return send_cached_file(os.path.dirname(path), os.path.basename(path), mimetype=THUMBNAIL_MIMETYPE,
+                            immutable='v' in request.args)
+
+def project_images(project_name):
+    """All image names of a project, sorted, from the cached index."""
+    return IMAGE_INDEXES.get(os.path.join(PROJECTS_DIR, project_name, 'images')).names()
+
+def image_listing_response(project_name):
+    """Shared body of the image listing routes.
+
+    Query args: prefix, sort (name|mtime), order (asc|desc), limit and cursor.
+    Without limit/cursor the response is the plain array of names; with them
+    it is {images, next_cursor}, where next_cursor is null on the last page.
+    """
     images_dir = os.path.join(PROJECTS_DIR, project_name, 'images')
     if not os.path.exists(images_dir):
         return jsonify([])
-    files = [f for f in os.listdir(images_dir) if os.path.isfile(os.path.join(images_dir, f))]
-    return jsonify(files)
+    limit = request.args.get('limit')
+    cursor = request.args.get('cursor')
+    try:
+        if limit is not None:
+            limit = int(limit)
+            if limit < 1:
+                raise ValueError('limit must be a positive integer')
+        names, next_cursor = IMAGE_INDEXES.get(images_dir).page(
+            limit=limit, cursor=cursor, prefix=request.args.get('prefix', ''),
+            sort=request.args.get('sort', 'name'), descending=request.args.get('order', 'asc') == 'desc')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if limit is None and cursor is None:
+        return jsonify(names)
+    return jsonify({'images': names, 'next_cursor': next_cursor})
+
+@app.route('/projects/<project_name>/images/', methods=['GET'])
+def list_images(project_name):
+    return image_listing_response(project_name)
+
+@app.route('/api/projects/<project_name>/images/<filename>', methods=['DELETE'])
+def delete_image(project_name, filename):
+    project_dir = os.path.join(PROJECTS_DIR, project_name)
+    images_dir = os.path.join(project_dir, 'images')
+    filename = os.path.basename(filename)
+    image_path = os.path.join(images_dir, filename)
+    if not os.path.isfile(image_path):
+        return jsonify({'error': 'Image not found'}), 404
+    os.remove(image_path)
+    IMAGE_INDEXES.get(images_dir).remove([filename])
+    remove_project_thumbnails(project_dir, filename)
+    with AnnotationStore(project_dir) as store:
+        store.delete(filename)
+    with ImageMetadataStore(project_dir) as metadata:
+        metadata.delete(filename)
+    return jsonify({'message': f'Deleted {filename}'})
+
+@app.route('/api/projects/<project_name>/metadata', methods=['GET'])
+def get_image_metadata(project_name):
+    """Recorded metadata for ?image=, or a {WxH: count} resolution summary without it."""
+    project_dir = os.path.join(PROJECTS_DIR, project_name)
+    if not os.path.exists(project_dir):
+        return jsonify({'error': 'Project does not exist'}), 404
+    image_name = request.args.get('image')
+    with ImageMetadataStore(project_dir) as metadata:
+        if image_name:
+            row = metadata.get(os.path.basename(image_name))
+            if row is None:
+                return jsonify({'error': 'No current metadata for this image'}), 404
+            return jsonify(row)
+        groups = metadata.resolution_groups(project_images(project_name))
+    return jsonify({'resolutions': {f'{w}x{h}': len(names) for (w, h), names in groups.items()}})
+
+@app.route('/api/projects/<project_name>/metadata/scan', methods=['POST'])
+def scan_image_metadata(project_name):
+    """Backfill metadata for images that were added outside the upload path or changed since."""
+    project_dir = os.path.join(PROJECTS_DIR, project_name)
+    if not os.path.exists(project_dir):
+        return jsonify({'error': 'Project does not exist'}), 404
+    job = start_metadata_scan(project_name, project_images(project_name))
+    return jsonify({'message': 'Metadata scan started', 'job_id': job.id}), 202
 
 @app.route('/api/projects/<project_name>/save_annotations', methods=['POST'])
 def save_annotations(project_name):
@@ -116,10 +307,9 @@ def save_annotations(project_name):
     project_dir = os.path.join(PROJECTS_DIR, project_name)
     if not os.path.exists(project_dir):
         return jsonify({'error': 'Project does not exist'}), 404
-    out_path = os.path.join(project_dir, 'manual_annotations.json')
     try:
-        with open(out_path, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=2)
+        with AnnotationStore(project_dir) as store:
+            store.replace_all(data)
         return jsonify({'message': 'Annotations saved successfully!'})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -132,46 +322,244 @@ def save_single_annotation(project_name):
     project_dir = os.path.join(PROJECTS_DIR, project_name)
     if not os.path.exists(project_dir):
         return jsonify({'error': 'Project does not exist'}), 404
-    out_path = os.path.join(project_dir, 'manual_annotations.json')
-    # Load existing annotations.json or create new structure
-    if os.path.exists(out_path):
-        with open(out_path, 'r', encoding='utf-8') as f:
-            all_data = json.load(f)
-    else:
-        all_data = {"images": {}, "categories": []}
-    # Update or add the image annotation
-    all_data["images"][data['file_name']] = {
-        "width": data['width'],
-        "height": data['height'],
-        "annotations": data['annotations']
-    }
-    # Update categories if new labels are present
-    for ann in data['annotations']:
-        label = ann.get('label') or ann.get('category')
-        if label and label not in all_data['categories']:
-            all_data['categories'].append(label)
-    # Save back
-    with open(out_path, 'w', encoding='utf-8') as f:
-        json.dump(all_data, f, indent=2)
+    # Only this image's row is written; the rest of the project is untouched
+    with AnnotationStore(project_dir) as store:
+        store.put(data['file_name'], data['width'], data['height'], data['annotations'])
     return jsonify({'message': f"Annotation for {data['file_name']} saved!"})
 
+def image_dimensions(project_dir, image_name, metadata=None):
+    """(width, height) from the ingest metadata, reading just the header if it is not recorded.
+
+    Pass an open ImageMetadataStore when looking up many images.
+    """
+    if metadata is None:
+        with ImageMetadataStore(project_dir) as metadata:
+            row = metadata.get(image_name)
+    else:
+        row = metadata.get(image_name)
+    if row and row['width']:
+        return row['width'], row['height']
+    image_path = os.path.join(project_dir, 'images', image_name)
+    if not os.path.exists(image_path):
+        return None, None
+    try:
+        header = read_header(image_path)
+    except (OSError, ValueError):
+        return None, None
+    return header['width'], header['height']
+
+def _annotation_etag(entry):
+    raw = json.dumps(entry, sort_keys=True)
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+@app.route('/api/projects/<project_name>/annotations', methods=['GET'])
+def get_image_annotations(project_name):
+    image_name = request.args.get('image')
+    if not image_name:
+        return jsonify({'error': 'Missing image parameter'}), 400
+    project_dir = os.path.join(PROJECTS_DIR, project_name)
+    if not os.path.exists(project_dir):
+        return jsonify({'error': 'Project does not exist'}), 404
+    with AnnotationStore(project_dir) as store:
+        entry = store.get(image_name)
+    annotations = entry['annotations'] if entry else []
+    boxes = []
+    for ann in annotations:
+        x, y, w, h = ann['bbox']
+        boxes.append({'x': x, 'y': y, 'w': w, 'h': h, 'label': ann.get('label') or ann.get('category')})
+    response = jsonify(boxes)
+    # Browsers revalidate on every visit and get a bodyless 304 while the image is unchanged
+    response.set_etag(_annotation_etag(entry))
+    response.headers['Cache-Control'] = 'no-cache'
+    return response.make_conditional(request)
+
+@app.route('/api/projects/<project_name>/annotate', methods=['POST'])
+def annotate_image(project_name):
+    data = request.get_json()
+    if not data or 'image' not in data or not isinstance(data.get('boxes'), list):
+        return jsonify({'error': 'Invalid annotation data'}), 400
+    project_dir = os.path.join(PROJECTS_DIR, project_name)
+    if not os.path.exists(project_dir):
+        return jsonify({'error': 'Project does not exist'}), 404
+    try:
+        annotations = [{'id': i + 1, 'bbox': [float(b['x']), float(b['y']), float(b['w']), float(b['h'])],
+                        'label': b.get('label')} for i, b in enumerate(data['boxes'])]
+    except (KeyError, TypeError, ValueError):
+        return jsonify({'error': 'Each box needs numeric x, y, w and h'}), 400
+    image_name = data['image']
+    with AnnotationStore(project_dir) as store:
+        width, height = data.get('width'), data.get('height')
+        if not width or not height:
+            existing = store.get(image_name)
+            if existing and existing['width'] and existing['height']:
+                width, height = existing['width'], existing['height']
+            else:
+                width, height = image_dimensions(project_dir, os.path.basename(image_name))
+        store.put(image_name, width, height, annotations)
+        entry = store.get(image_name)
+    response = jsonify({'message': f'Annotation for {image_name} saved!'})
+    response.set_etag(_annotation_etag(entry))
+    return response
+
+@app.route('/api/projects/<project_name>/manual_annotations.json', methods=['GET'])
+def export_manual_annotations(project_name):
+    project_dir = os.path.join(PROJECTS_DIR, project_name)
+    if not os.path.exists(project_dir):
+        return jsonify({'error': 'Project does not exist'}), 404
+
+    def generate():
+        with AnnotationStore(project_dir) as store:
+            yield from store.iter_export_json()
+
+    return Response(stream_with_context(generate()), mimetype='application/json',
+                    headers={'Content-Disposition': 'attachment; filename=manual_annotations.json'})
+
+def annotation_records(project_dir, names=None):
+    """records() for iter_export_zip over the saved manual annotations."""
+    def records():
+        with AnnotationStore(project_dir) as store, ImageMetadataStore(project_dir) as metadata:
+            for name, entry in store.iter_images():
+                if names is not None and name not in names:
+                    continue
+                width, height = entry['width'], entry['height']
+                if not (width and height):
+                    width, height = image_dimensions(project_dir, name, metadata)
+                    if not (width and height):
+                        continue
+                yield name, width, height, [(a['label'], *a['bbox'], None) for a in entry['annotations']]
+    return records
+
+def prediction_records(columns, project_dir, names=None, min_score=0.0):
+    """records() for iter_export_zip over a PredictionColumns run; classes are named class_<id>."""
+    def records():
+        with ImageMetadataStore(project_dir) as metadata:
+            for i, name in enumerate(columns.names):
+                if names is not None and name not in names:
+                    continue
+                width, height = image_dimensions(project_dir, name, metadata)
+                if not (width and height):
+                    continue
+                rows = slice(int(columns.offsets[i]), int(columns.offsets[i + 1]))
+                scores = columns.scores[rows]
+                keep = scores >= min_score
+                xywh = xyxy_to_xywh(columns.boxes[rows][keep].astype(np.float64))
+                yield name, width, height, [
+                    (f'class_{int(c)}', *box, s)
+                    for box, s, c in zip(xywh.tolist(), scores[keep].tolist(), columns.classes[rows][keep].tolist())]
+    return records
+
+@app.route('/api/projects/<project_name>/export', methods=['GET'])
+def export_dataset(project_name):
+    """Stream a YOLO or COCO zip of manual annotations or auto-label predictions.
+
+    ?format=yolo|coco, ?source=manual|predictions, ?images=1 to include the
+    image files, ?subset= to restrict to one subset, ?min_score= for
+    predictions. The archive is generated while it is sent, so neither disk
+    nor memory use grows with the project.
+    """
+    fmt = request.args.get('format', 'yolo')
+    source = request.args.get('source', 'manual')
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({'error': f'format must be one of {list(EXPORT_FORMATS)}'}), 400
+    if source not in ('manual', 'predictions'):
+        return jsonify({'error': "source must be 'manual' or 'predictions'"}), 400
+    try:
+        min_score = float(request.args.get('min_score', 0))
+    except ValueError:
+        return jsonify({'error': 'min_score must be a number'}), 400
+    project_dir = os.path.join(PROJECTS_DIR, project_name)
+    if not os.path.exists(project_dir):
+        return jsonify({'error': 'Project does not exist'}), 404
+    names = None
+    if request.args.get('subset'):
+        try:
+            names = set(subset_images(project_dir, subset_name_of(request.args['subset'])))
+        except (ValueError, FileNotFoundError):
+            return jsonify({'error': 'Subset not found'}), 404
+    if source == 'manual':
+        records = annotation_records(project_dir, names)
+        # Class ids follow the project's label list, as in the Streamlit annotator
+        categories = project_class_names(project_dir)
+    else:
+        columns = current_prediction_columns(project_dir)
+        if columns is None:
+            return jsonify({'error': 'No auto-annotate results; run auto-labeling first'}), 404
+        records = prediction_records(columns, project_dir, names, min_score)
+        categories = []
+    images_dir = os.path.join(project_dir, 'images') if request.args.get('images') in ('1', 'true') else None
+    response = Response(stream_with_context(iter_export_zip(fmt, records, categories, images_dir)),
+                        mimetype='application/zip')
+    response.headers['Content-Disposition'] = f'attachment; filename="{project_name}_{source}_{fmt}.zip"'
+    return response
+
+@app.route('/api/projects/<project_name>/evaluate', methods=['POST'])
+def evaluate_predictions(project_name):
+    """Score the latest auto-label run against the manual annotations.
+
+    Optional JSON: subset to restrict the images, score_threshold (default 0,
+    i.e. every stored detection) for precision/recall, the confusion matrix
+    and false negatives, class_names to name prediction class ids when the
+    model was not trained on this project's labels, and
+    max_false_negative_images (default 100, null for all).
+    """
+    data = request.get_json(silent=True) or {}
+    project_dir = os.path.join(PROJECTS_DIR, project_name)
+    if not os.path.exists(project_dir):
+        return jsonify({'error': 'Project does not exist'}), 404
+    try:
+        score_threshold = float(data.get('score_threshold', 0.0))
+        limit = data.get('max_false_negative_images', DEFAULT_FALSE_NEGATIVE_IMAGES)
+        limit = None if limit is None else int(limit)
+    except (TypeError, ValueError):
+        return jsonify({'error': 'score_threshold and max_false_negative_images must be numbers'}), 400
+    class_names = data.get('class_names')
+    if class_names is not None and not (isinstance(class_names, list) and all(isinstance(n, str) for n in class_names)):
+        return jsonify({'error': 'class_names must be a list of strings'}), 400
+    names = None
+    if data.get('subset'):
+        try:
+            names = set(subset_images(project_dir, subset_name_of(data['subset'])))
+        except (ValueError, FileNotFoundError):
+            return jsonify({'error': 'Subset not found'}), 404
+    report = evaluate_project(project_dir, class_names, names, score_threshold=score_threshold,
+                              max_false_negative_images=limit)
+    if report is None:
+        return jsonify({'error': 'No auto-annotate results; run auto-labeling first'}), 404
+    if not report['num_images']:
+        return jsonify({'error': 'No manually annotated images to evaluate against'}), 400
+    return jsonify(report)
+
+@app.route('/api/projects/<project_name>/manual_annotations/import', methods=['POST'])
+def import_manual_annotations(project_name):
+    project_dir = os.path.join(PROJECTS_DIR, project_name)
+    if not os.path.exists(project_dir):
+        return jsonify({'error': 'Project does not exist'}), 404
+    try:
+        if 'file' in request.files:
+            data = json.load(request.files['file'])
+        else:
+            data = request.get_json()
+    except ValueError as e:
+        return jsonify({'error': f'Invalid JSON: {e}'}), 400
+    if not data or 'images' not in data:
+        return jsonify({'error': 'Invalid annotation data'}), 400
+    replace = request.args.get('replace', 'false').lower() == 'true'
+    with AnnotationStore(project_dir) as store:
+        if replace:
+            store.replace_all(data)
+        else:
+            store.import_json(data)
+        total = store.count()
+    return jsonify({'message': f"Imported {len(data['images'])} image(s)", 'num_images': total})
+
 @app.route('/api/projects/<project_name>/images', methods=['GET'])
 def get_project_images(project_name):
-    images_dir = os.path.join(PROJECTS_DIR, project_name, 'images')
-    if not os.path.exists(images_dir):
-        return jsonify([])
-    files = [f for f in os.listdir(images_dir) if os.path.isfile(os.path.join(images_dir, f))]
-    return jsonify(files)
+    return image_listing_response(project_name)
 
 # API: Get images in project
 @app.route('/api/projects/<project_name>/images', methods=['GET'])
 def get_images(project_name):
-    images_dir = os.path.join(PROJECTS_DIR, project_name, 'images')
-    if not os.path.exists(images_dir):
-        return jsonify([])
-
-    files = [f for f in os.listdir(images_dir) if os.path.isfile(os.path.join(images_dir, f))]
-    return jsonify(files)
+    return image_listing_response(project_name)
 
 @app.route('/api/projects/<project_name>/auto_annotate_request', methods=['POST'])
 def save_auto_annotate_request(project_name):
@@ -182,20 +570,13 @@ def save_auto_annotate_request(project_name):
     images_dir = os.path.join(project_dir, 'images')
     if not os.path.exists(images_dir):
         return jsonify({'error': 'Images directory does not exist'}), 404
-    all_images = [f for f in os.listdir(images_dir) if os.path.isfile(os.path.join(images_dir, f))]
+    all_images = project_images(project_name)
     if not all_images:
         return jsonify({'error': 'No images found'}), 404
-    # Find next available subset_N folder
-    n = 1
-    while os.path.exists(os.path.join(project_dir, f'subset_{n}')):
-        n += 1
-    subset_dir = os.path.join(project_dir, f'subset_{n}')
-    os.makedirs(subset_dir, exist_ok=True)
-    subset_json_path = os.path.join(subset_dir, f'subset_{n}.json')
-    try:
-        with open(subset_json_path, 'w', encoding='utf-8') as f:
-            json.dump({'images': all_images}, f, indent=2)
-        return jsonify({'message': f'Complete dataset subset created as subset_{n}/{f"subset_{n}.json"} with {len(all_images)} images.'})
+    try:
+        name = create_subset(project_dir, all_images)
+        return jsonify({'message': f'Complete dataset subset created as {name}/{name}.json with {len(all_images)} images.',
+                        'subset': name})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -208,17 +589,11 @@ def create_manual_subset(project_name):
     project_dir = os.path.join(PROJECTS_DIR, project_name)
     if not os.path.exists(project_dir):
         return jsonify({'error': 'Project does not exist'}), 404
-    # Find next available subset_N folder
-    n = 1
-    while os.path.exists(os.path.join(project_dir, f'subset_{n}')):
-        n += 1
-    subset_dir = os.path.join(project_dir, f'subset_{n}')
-    os.makedirs(subset_dir, exist_ok=True)
-    subset_json_path = os.path.join(subset_dir, f'subset_{n}.json')
-    try:
-        with open(subset_json_path, 'w', encoding='utf-8') as f:
-            json.dump({'images': images}, f, indent=2)
-        return jsonify({'message': f'Manual subset created as subset_{n}/{f"subset_{n}.json"} with {len(images)} images.'})
+    try:
+        # Hand-picked subsets keep the order (and any repeats) they were given in
+        name = create_subset(project_dir, images, keep_order=True)
+        return jsonify({'message': f'Manual subset created as {name}/{name}.json with {len(images)} images.',
+                        'subset': name})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -238,22 +613,208 @@ def create_random_subset(project_name):
     images_dir = os.path.join(project_dir, 'images')
     if not os.path.exists(images_dir):
         return jsonify({'error': 'Images directory does not exist'}), 404
-    all_images = [f for f in os.listdir(images_dir) if os.path.isfile(os.path.join(images_dir, f))]
-    if not all_images:
+    stratify = data.get('stratify')
+    if stratify not in (None, '', 'resolution'):
+        return jsonify({'error': "stratify must be 'resolution' or omitted"}), 400
+    try:
+        # Returned with the subset so the same draw can be repeated
+        seed = int(data['seed']) if data.get('seed') is not None else random.randrange(2 ** 32)
+        if seed < 0:
+            raise ValueError
+    except (TypeError, ValueError):
+        return jsonify({'error': 'seed must be a non-negative integer'}), 400
+    if data.get('subset'):
+        try:
+            population = sorted(set(subset_images(project_dir, subset_name_of(data['subset']))))
+        except (ValueError, FileNotFoundError):
+            return jsonify({'error': 'Subset not found'}), 404
+    else:
+        population = project_images(project_name)
+    if not population:
         return jsonify({'error': 'No images found'}), 404
-    k = max(1, int(len(all_images) * percent / 100.0))
-    selected = random.sample(all_images, k)
-    # Find next available subset_N folder
-    n = 1
-    while os.path.exists(os.path.join(project_dir, f'subset_{n}')):
-        n += 1
-    subset_dir = os.path.join(project_dir, f'subset_{n}')
-    os.makedirs(subset_dir, exist_ok=True)
-    subset_json_path = os.path.join(subset_dir, f'subset_{n}.json')
-    try:
-        with open(subset_json_path, 'w', encoding='utf-8') as f:
-            json.dump({'images': selected}, f, indent=2)
-        return jsonify({'message': f'Random subset created as subset_{n}/{f"subset_{n}.json"} with {len(selected)} images.'})
+    k = max(1, int(len(population) * percent / 100.0))
+    strata = [population]
+    if stratify:
+        with ImageMetadataStore(project_dir) as metadata:
+            strata = list(metadata.resolution_groups(population).values())
+        grouped = {name for names in strata for name in names}
+        # Images whose header has not been read yet form one more stratum
+        strata.append([name for name in population if name not in grouped])
+    selected = sample(strata, k, seed)
+    try:
+        name = create_subset(project_dir, selected)
+        return jsonify({'message': f'Random subset created as {name}/{name}.json with {len(selected)} images.',
+                        'subset': name, 'seed': seed})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def start_metadata_scan(project_name, image_names):
+    """The project's running metadata scan, or a new one over image_names if none is running."""
+    for job in JOBS.list(project_name):
+        if job.kind == 'metadata_scan' and not job.finished:
+            return job
+    return JOBS.submit('metadata_scan', project_name, scan_metadata_job,
+                       os.path.join(PROJECTS_DIR, project_name), image_names, INGEST_WORKERS,
+                       total=len(image_names))
+
+def _changed_since(images_dir, names, timestamp):
+    for name in names:
+        try:
+            if os.stat(os.path.join(images_dir, name)).st_mtime > timestamp:
+                return True
+        except FileNotFoundError:
+            continue
+    return False
+
+def load_dhashes(project_name):
+    """(names, hashes) for every image with a current dHash, or (None, job) while a scan is needed.
+
+    Images a finished scan already tried are skipped rather than waited on;
+    only files changed since the last scan began start another one.
+    """
+    project_dir = os.path.join(PROJECTS_DIR, project_name)
+    all_images = project_images(project_name)
+    with ImageMetadataStore(project_dir) as metadata:
+        missing = set(metadata.stale(all_images))
+        hashes = metadata.dhashes(all_images)
+    if missing:
+        scans = [job for job in JOBS.list(project_name) if job.kind == 'metadata_scan']
+        if any(not job.finished for job in scans):
+            return None, start_metadata_scan(project_name, all_images)
+        last_scan = max((job.started_at for job in scans if job.started_at), default=None)
+        if last_scan is None or _changed_since(os.path.join(project_dir, 'images'), missing, last_scan):
+            return None, start_metadata_scan(project_name, all_images)
+    names = [name for name in all_images if name in hashes and name not in missing]
+    return names, [hashes[name] for name in names]
+
+def _near_duplicate_radius(value):
+    radius = int(value if value is not None else DEFAULT_NEAR_DUPLICATE_RADIUS)
+    if not 0 <= radius <= MAX_RADIUS:
+        raise ValueError
+    return radius
+
+@app.route('/api/projects/<project_name>/near_duplicates', methods=['GET'])
+def get_near_duplicates(project_name):
+    """Images whose dHash is within ?radius= bits of ?image=."""
+    image_name = request.args.get('image')
+    if not image_name:
+        return jsonify({'error': 'Missing image parameter'}), 400
+    try:
+        radius = _near_duplicate_radius(request.args.get('radius'))
+    except ValueError:
+        return jsonify({'error': f'radius must be an integer between 0 and {MAX_RADIUS}'}), 400
+    if not os.path.exists(os.path.join(PROJECTS_DIR, project_name)):
+        return jsonify({'error': 'Project does not exist'}), 404
+    names, hashes = load_dhashes(project_name)
+    if names is None:
+        return jsonify({'error': 'Perceptual hashes are still being computed', 'job_id': hashes.id}), 409
+    if image_name not in names:
+        return jsonify({'error': 'Image not found'}), 404
+    index = HammingIndex(hashes)
+    matches = index.query(hashes[names.index(image_name)], radius)
+    return jsonify([names[i] for i in matches if names[i] != image_name])
+
+@app.route('/api/projects/<project_name>/create_dedup_subset', methods=['POST'])
+def create_dedup_subset(project_name):
+    """Subset with one representative (the first by name) per cluster of near-duplicate frames."""
+    data = request.get_json() or {}
+    try:
+        radius = _near_duplicate_radius(data.get('radius'))
+    except (TypeError, ValueError):
+        return jsonify({'error': f'radius must be an integer between 0 and {MAX_RADIUS}'}), 400
+    project_dir = os.path.join(PROJECTS_DIR, project_name)
+    images_dir = os.path.join(project_dir, 'images')
+    if not os.path.exists(images_dir):
+        return jsonify({'error': 'Images directory does not exist'}), 404
+    names, hashes = load_dhashes(project_name)
+    if names is None:
+        return jsonify({'error': 'Perceptual hashes are still being computed; retry when the job finishes',
+                        'job_id': hashes.id}), 409
+    if not names:
+        return jsonify({'error': 'No images found'}), 404
+    representatives, _ = cluster_representatives(hashes, radius)
+    selected = [names[i] for i in representatives]
+    try:
+        name = create_subset(project_dir, selected)
+        return jsonify({'message': f'Deduplicated subset created as {name}/{name}.json with '
+                                   f'{len(selected)} of {len(names)} images.', 'subset': name})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/projects/<project_name>/create_uncertainty_subset', methods=['POST'])
+def create_uncertainty_subset(project_name):
+    """Subset of the count (or percent) most uncertain images in the latest auto-label run.
+
+    Strategies: least_confidence (lowest top score), near_threshold (most
+    boxes within band of the conf threshold), entropy (summed score entropy)
+    and disagreement (unmatched boxes against the cached predictions of
+    compare_model_family/compare_model_version). Images with a saved manual
+    annotation are skipped unless exclude_annotated is false.
+    """
+    data = request.get_json() or {}
+    strategy = data.get('strategy')
+    if strategy not in STRATEGIES:
+        return jsonify({'error': f'strategy must be one of {list(STRATEGIES)}'}), 400
+    project_dir = os.path.join(PROJECTS_DIR, project_name)
+    if not os.path.exists(project_dir):
+        return jsonify({'error': 'Project does not exist'}), 404
+    columns = current_prediction_columns(project_dir)
+    if columns is None:
+        return jsonify({'error': 'No auto-annotate results; run auto-labeling first'}), 404
+    config_path = os.path.join(project_dir, 'auto_annotate_config.json')
+    config = {}
+    if os.path.exists(config_path):
+        with open(config_path, 'r', encoding='utf-8') as f:
+            config = json.load(f)
+    try:
+        threshold = float(data.get('threshold', config.get('conf', DEFAULT_CONF)))
+        band = float(data.get('band', DEFAULT_BAND))
+        count = int(data['count']) if data.get('count') is not None else None
+        percent = float(data['percent']) if data.get('percent') is not None else None
+        if (count is None) == (percent is None) or (count is not None and count < 1) \
+                or (percent is not None and not 0 < percent <= 100):
+            raise ValueError
+    except (TypeError, ValueError):
+        return jsonify({'error': 'Provide either count >= 1 or percent in (0, 100], and numeric threshold/band'}), 400
+
+    preds = from_columns(columns)
+    keep = set(project_images(project_name))
+    if data.get('exclude_annotated', True):
+        with AnnotationStore(project_dir) as store:
+            keep.difference_update(store.names())
+    preds = preds.subset([i for i, name in enumerate(preds.names) if name in keep])
+    if strategy == 'disagreement':
+        family, version = data.get('compare_model_family'), data.get('compare_model_version')
+        if not (family and version):
+            return jsonify({'error': 'compare_model_family and compare_model_version are required'}), 400
+        model_path = os.path.join(MODELS_DIR, family, version)
+        if not os.path.exists(model_path):
+            return jsonify({'error': f'Model file not found: {model_path}'}), 404
+        engine_name = data.get('compare_engine') or default_engine(version)
+        other = flatten_predictions(cached_predictions(project_dir, engine_name, model_path,
+                                                       inference_params(config), preds.names))
+        if not len(other):
+            return jsonify({'error': f'No cached predictions from {family}/{version} for these images; '
+                                     'run auto-labeling with it first'}), 409
+        position = {name: i for i, name in enumerate(other.names)}
+        preds = preds.subset([i for i, name in enumerate(preds.names) if name in position])
+        other = other.subset([position[name] for name in preds.names])
+        scores = disagreement(preds, other)
+    elif strategy == 'least_confidence':
+        scores = least_confidence(preds)
+    elif strategy == 'near_threshold':
+        scores = near_threshold(preds, threshold, band)
+    else:
+        scores = entropy(preds)
+    k = count if count is not None else max(1, int(len(preds) * percent / 100.0))
+    selected, selected_scores = top_k(preds.names, scores, k)
+    if not selected:
+        return jsonify({'error': f'No image has a non-zero {strategy} score'}), 404
+    try:
+        name = create_subset(project_dir, selected)
+        return jsonify({'message': f'Uncertainty subset ({strategy}) created as {name}/{name}.json with '
+                                   f'{len(selected)} of {len(preds)} images.', 'subset': name,
+                        'min_score': float(selected_scores[-1]), 'max_score': float(selected_scores[0])})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -301,6 +862,34 @@ def get_model_descriptions():
         data = yaml.safe_load(f)
     return jsonify(data.get('models', {}))
 
+@app.route('/api/models/export_onnx', methods=['POST'])
+def export_model_onnx():
+    """Export a .pt model to an .onnx file next to it, reusing an up-to-date export."""
+    data = request.get_json() or {}
+    model_family = data.get('model_family')
+    model_version = data.get('model_version')
+    if not (model_family and model_version):
+        return jsonify({'error': 'model_family and model_version are required'}), 400
+    model_path = os.path.join(MODELS_DIR, model_family, model_version)
+    if not os.path.exists(model_path):
+        return jsonify({'error': f'Model file not found: {model_path}'}), 404
+    if YOLO is None:
+        return jsonify({'error': 'ultralytics not installed on server'}), 500
+    try:
+        onnx_path = export_onnx(model_path, data.get('imgsz') or 640)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    return jsonify({'message': 'Model exported to ONNX.', 'model_version': os.path.basename(onnx_path)})
+
+@app.route('/api/models/cache', methods=['GET'])
+def get_model_cache():
+    return jsonify(MODEL_CACHE.stats())
+
+@app.route('/api/models/cache/clear', methods=['POST'])
+def clear_model_cache():
+    MODEL_CACHE.clear()
+    return jsonify({'message': 'Model cache cleared.'})
+
 @app.route('/api/labels', methods=['GET', 'POST'])
 def manage_labels():
     project_name = request.args.get('project')
@@ -337,20 +926,72 @@ def list_subsets(project_name):
     project_dir = os.path.join(PROJECTS_DIR, project_name)
     if not os.path.exists(project_dir):
         return jsonify([])
-    subsets = []
-    for name in os.listdir(project_dir):
-        if name.startswith('subset_') and os.path.isdir(os.path.join(project_dir, name)):
-            subset_json = os.path.join(project_dir, name, f'{name}.json')
-            if os.path.exists(subset_json):
-                subsets.append({'name': name, 'json': f'{name}/{name}.json'})
-    return jsonify(subsets)
+    # Bitmap subsets are listed under the same <name>/<name>.json path; serve_subset_json materializes them
+    return jsonify([{'name': name, 'json': f'{name}/{name}.json', 'format': fmt}
+                    for name, fmt in find_subsets(project_dir)])
 
 @app.route('/projects/<project_name>/<subset_folder>/<subset_json>')
 def serve_subset_json(project_name, subset_folder, subset_json):
-    subset_dir = os.path.join(PROJECTS_DIR, project_name, subset_folder)
+    project_dir = os.path.join(PROJECTS_DIR, project_name)
+    subset_dir = os.path.join(project_dir, subset_folder)
     if not os.path.exists(subset_dir):
         return jsonify({'error': 'Subset not found'}), 404
-    return send_from_directory(subset_dir, subset_json)
+    json_path, bitmap_path = subset_paths(project_dir, subset_folder)
+    if subset_json == os.path.basename(json_path) and not os.path.exists(json_path) and os.path.exists(bitmap_path):
+        # The materialized list is kept next to the bitmap and rebuilt when the bitmap is newer
+        export_name = f'.{subset_folder}.bitmap.json'
+        export_path = os.path.join(subset_dir, export_name)
+        try:
+            fresh = os.stat(export_path).st_mtime_ns >= os.stat(bitmap_path).st_mtime_ns
+        except FileNotFoundError:
+            fresh = False
+        if not fresh:
+            write_json_export(export_path, iter_subset_json(project_dir, subset_folder))
+        return send_compressed_json(subset_dir, export_name)
+    if subset_json.endswith('.json'):
+        return send_compressed_json(subset_dir, subset_json)
+    return send_cached_file(subset_dir, subset_json)
+
+@app.route('/api/projects/<project_name>/subsets/<subset_name>/contains', methods=['GET'])
+def get_subset_membership(project_name, subset_name):
+    """{image: bool} for each ?image= given; bitmap subsets answer without loading their name list."""
+    names = request.args.getlist('image')
+    if not names:
+        return jsonify({'error': 'Missing image parameter'}), 400
+    project_dir = os.path.join(PROJECTS_DIR, project_name)
+    try:
+        return jsonify(subset_contains(project_dir, subset_name_of(subset_name), names))
+    except (ValueError, FileNotFoundError):
+        return jsonify({'error': 'Subset not found'}), 404
+
+@app.route('/api/projects/<project_name>/subsets/combine', methods=['POST'])
+def combine_subsets(project_name):
+    """Save the union, intersection or difference (first minus the rest) of subsets as a new subset."""
+    data = request.get_json() or {}
+    operation = data.get('operation')
+    if operation not in SET_OPERATIONS:
+        return jsonify({'error': f'operation must be one of {list(SET_OPERATIONS)}'}), 400
+    refs = data.get('subsets') or []
+    if not isinstance(refs, list) or len(refs) < 2:
+        return jsonify({'error': 'At least two subsets are required'}), 400
+    project_dir = os.path.join(PROJECTS_DIR, project_name)
+    if not os.path.exists(project_dir):
+        return jsonify({'error': 'Project does not exist'}), 404
+    try:
+        with ImageIds(project_dir) as image_ids:
+            bitmaps = [subset_bitmap(project_dir, subset_name_of(ref), image_ids) for ref in refs]
+    except (ValueError, FileNotFoundError):
+        return jsonify({'error': 'Subset not found'}), 404
+    result = combine_bitmaps(operation, bitmaps)
+    count = bitmap_count(result)
+    if not count:
+        return jsonify({'error': f'The {operation} of these subsets is empty'}), 400
+    try:
+        name = write_subset(project_dir, result)
+        return jsonify({'message': f'Subset {name} created as the {operation} of {", ".join(refs)} '
+                                   f'with {count} images.', 'subset': name, 'count': count})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
 
 @app.route('/api/projects/<project_name>/save_auto_annotate_config', methods=['POST'])
 def save_auto_annotate_config(project_name):
@@ -363,12 +1004,31 @@ def save_auto_annotate_config(project_name):
     project_dir = os.path.join(PROJECTS_DIR, project_name)
     if not os.path.exists(project_dir):
         return jsonify({'error': 'Project does not exist'}), 404
+    batch_size = data.get('batch_size', DEFAULT_AUTO_LABEL_BATCH_SIZE)
+    try:
+        batch_size = int(batch_size)
+        if batch_size < 1:
+            raise ValueError
+    except Exception:
+        return jsonify({'error': 'Invalid batch_size value'}), 400
     config_path = os.path.join(project_dir, 'auto_annotate_config.json')
     config = {
         'model_family': model_family,
         'model_version': model_version,
-        'subset': subset
+        'subset': subset,
+        'batch_size': batch_size
     }
+    for key in INFERENCE_PARAM_KEYS + EXECUTION_KEYS:
+        if data.get(key) is not None:
+            config[key] = data[key]
+    if data.get('engine'):
+        if data['engine'] not in ENGINES:
+            return jsonify({'error': f"Unknown engine: {data['engine']}"}), 400
+        config['engine'] = data['engine']
+    try:
+        execution_settings(config)
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': f'Invalid execution settings: {e}'}), 400
     try:
         with open(config_path, 'w', encoding='utf-8') as f:
             json.dump(config, f, indent=2)
@@ -403,47 +1063,224 @@ def run_auto_label(project_name):
     model_path = os.path.join(MODELS_DIR, model_family, model_version)
     if not os.path.exists(model_path):
         return jsonify({'error': f'Model file not found: {model_path}'}), 404
-    # Subset path
-    subset_path = os.path.join(project_dir, subset)
-    if not os.path.exists(subset_path):
-        return jsonify({'error': f'Subset file not found: {subset_path}'}), 404
-    with open(subset_path, 'r', encoding='utf-8') as f:
-        subset_data = json.load(f)
-    images = subset_data.get('images', [])
+    # Subset images (legacy name list or bitmap)
+    try:
+        images = subset_images(project_dir, subset_name_of(subset))
+    except (ValueError, FileNotFoundError):
+        return jsonify({'error': f'Subset not found: {subset}'}), 404
     images_dir = os.path.join(project_dir, 'images')
-    results = {}
-    if YOLO is None:
+    try:
+        batch_size = int(config.get('batch_size', DEFAULT_AUTO_LABEL_BATCH_SIZE))
+        if batch_size < 1:
+            raise ValueError
+    except Exception:
+        return jsonify({'error': 'Invalid batch_size in config'}), 400
+    try:
+        execution = execution_settings(config)
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': f'Invalid execution settings in config: {e}'}), 400
+    engine_name = config.get('engine') or default_engine(model_version)
+    if engine_name not in ENGINES:
+        return jsonify({'error': f'Unknown engine: {engine_name}'}), 400
+    if engine_name == 'onnxruntime' and ort is None:
+        return jsonify({'error': 'onnxruntime not installed on server'}), 500
+    if YOLO is None and not model_path.lower().endswith('.onnx'):
         return jsonify({'error': 'ultralytics not installed on server'}), 500
+    for job in JOBS.list(project_name):
+        if job.kind == 'auto_label' and not job.finished:
+            return jsonify({'error': 'Auto-labeling is already running for this project', 'job_id': job.id}), 409
+    image_names = [name for name in images if os.path.exists(os.path.join(images_dir, name))]
+    params = inference_params(config)
+
+    def load_engine(path):
+        if engine_name == 'onnxruntime':
+            session = MODEL_CACHE.get(model_family, os.path.basename(path), path, load_onnx_session)
+            return OnnxRuntimeEngine(session, params)
+        model, lock = MODEL_CACHE.get_with_lock(model_family, model_version, path, YOLO)
+        # Jobs on other projects may be running the same cached model
+        return UltralyticsEngine(model, params, lock)
+
+    job = JOBS.submit('auto_label', project_name, run_auto_label_job,
+                      load_engine, engine_name, model_path, project_dir, image_names, batch_size,
+                      params, execution, total=len(image_names))
+    return jsonify({'message': 'Auto-labeling started', 'job_id': job.id, 'num_images': len(image_names)}), 202
+
+@app.route('/api/projects/<project_name>/prediction_cache/clear', methods=['POST'])
+def clear_prediction_cache(project_name):
+    project_dir = os.path.join(PROJECTS_DIR, project_name)
+    if not os.path.exists(project_dir):
+        return jsonify({'error': 'Project does not exist'}), 404
+    cache = PredictionCache(project_dir)
     try:
-        model = YOLO(model_path)
-        for img_name in images:
-            img_path = os.path.join(images_dir, img_name)
-            if not os.path.exists(img_path):
-                continue
-            pred = model(img_path)
-            # Convert prediction to serializable format (e.g., boxes, scores, classes)
-            pred_data = []
-            for r in pred:
-                boxes = r.boxes.xyxy.cpu().numpy().tolist() if hasattr(r, 'boxes') and hasattr(r.boxes, 'xyxy') else []
-                scores = r.boxes.conf.cpu().numpy().tolist() if hasattr(r, 'boxes') and hasattr(r.boxes, 'conf') else []
-                classes = r.boxes.cls.cpu().numpy().tolist() if hasattr(r, 'boxes') and hasattr(r.boxes, 'cls') else []
-                pred_data.append({'boxes': boxes, 'scores': scores, 'classes': classes})
-            results[img_name] = pred_data
-        # Save results
-        out_path = os.path.join(project_dir, 'auto_annotate_results.json')
-        with open(out_path, 'w', encoding='utf-8') as f:
-            json.dump(results, f, indent=2)
-        return jsonify({'message': f'Auto-labeling complete! Results saved to auto_annotate_results.json', 'num_images': len(results)})
+        cache.clear()
+    finally:
+        cache.close()
+    return jsonify({'message': 'Prediction cache cleared.'})
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    job = JOBS.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job.snapshot())
+
+@app.route('/api/jobs/<job_id>/events', methods=['GET'])
+def stream_job_events(job_id):
+    job = JOBS.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return Response(stream_with_context(sse_events(job)), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/api/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    job = JOBS.cancel(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job.snapshot())
+
+@app.route('/api/projects/<project_name>/jobs', methods=['GET'])
+def list_project_jobs(project_name):
+    jobs = sorted(JOBS.list(project_name), key=lambda j: j.created_at, reverse=True)
+    return jsonify([job.snapshot() for job in jobs])
+
+def resolve_sam_model(model_version=None):
+    """Return the SAM checkpoint to use: the requested one, else the lightest one installed."""
+    sam_dir = os.path.join(MODELS_DIR, SAM_FAMILY)
+    if model_version:
+        return model_version if os.path.isfile(os.path.join(sam_dir, model_version)) else None
+    if not os.path.isdir(sam_dir):
+        return None
+    for model_type in ('vit_b', 'vit_l', 'vit_h'):
+        for f in sorted(os.listdir(sam_dir)):
+            if model_type in f and f.lower().endswith('.pth'):
+                return f
+    return None
+
+def is_plain_image_name(name):
+    """True for a bare file name in images/, False for anything with a path component such as ../."""
+    return isinstance(name, str) and name not in ('', '.', '..') and os.path.basename(name) == name
+
+@app.route('/api/projects/<project_name>/sam/predict', methods=['POST'])
+def sam_predict(project_name):
+    """Refine a click (points) or rough box prompt into a box and mask with SAM."""
+    data = request.get_json() or {}
+    image_name = data.get('image')
+    points = data.get('points') or []
+    point_labels = data.get('point_labels') or [1] * len(points)
+    box = data.get('box')
+    if not image_name or not (points or box):
+        return jsonify({'error': 'image and at least one of points or box are required'}), 400
+    if len(point_labels) != len(points):
+        return jsonify({'error': 'points and point_labels must have the same length'}), 400
+    if not is_plain_image_name(image_name):
+        return jsonify({'error': 'Invalid image name'}), 400
+    project_dir = os.path.join(PROJECTS_DIR, project_name)
+    image_path = os.path.join(project_dir, 'images', image_name)
+    if not os.path.isfile(image_path):
+        return jsonify({'error': 'Image not found'}), 404
+    if not SAM.available:
+        return jsonify({'error': 'segment_anything not installed on server'}), 500
+    model_version = resolve_sam_model(data.get('model_version'))
+    if not model_version:
+        return jsonify({'error': 'No SAM checkpoint found'}), 404
+    # Boxes arrive as [x, y, w, h] like saved annotations; SAM expects xyxy
+    box_xyxy = xywh_to_xyxy(box)[0].tolist() if box else None
+    try:
+        mask, score = SAM.predict(project_dir, SAM_FAMILY, model_version, image_path,
+                                  points=points, point_labels=point_labels, box=box_xyxy)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
+    return jsonify({'box': mask_to_box(mask), 'score': score, 'mask': mask_to_rle(mask)})
+
+@app.route('/api/projects/<project_name>/sam/precompute', methods=['POST'])
+def sam_precompute(project_name):
+    """Start a background job computing SAM embeddings for a subset or a list of images.
+
+    While the project already has a precompute running, that job is returned
+    instead of queueing another one.
+    """
+    data = request.get_json() or {}
+    project_dir = os.path.join(PROJECTS_DIR, project_name)
+    if not os.path.exists(project_dir):
+        return jsonify({'error': 'Project does not exist'}), 404
+    images = data.get('images')
+    if data.get('subset'):
+        try:
+            images = subset_images(project_dir, subset_name_of(data['subset']))
+        except (ValueError, FileNotFoundError):
+            return jsonify({'error': f"Subset not found: {data['subset']}"}), 404
+    if not images:
+        return jsonify({'error': 'subset or images required'}), 400
+    if not all(is_plain_image_name(name) for name in images):
+        return jsonify({'error': 'Invalid image name'}), 400
+    if not SAM.available:
+        return jsonify({'error': 'segment_anything not installed on server'}), 500
+    model_version = resolve_sam_model(data.get('model_version'))
+    if not model_version:
+        return jsonify({'error': 'No SAM checkpoint found'}), 404
+    for job in JOBS.list(project_name):
+        if job.kind == 'sam_precompute' and not job.finished:
+            return jsonify({'message': 'Embedding precompute already running', 'job_id': job.id,
+                            'num_images': job.total}), 202
+    images_dir = os.path.join(project_dir, 'images')
+    image_paths = [os.path.join(images_dir, name) for name in images if os.path.isfile(os.path.join(images_dir, name))]
+    job = JOBS.submit('sam_precompute', project_name, precompute_embeddings_job,
+                      SAM, project_dir, SAM_FAMILY, model_version, image_paths, total=len(image_paths))
+    return jsonify({'message': 'Embedding precompute started', 'job_id': job.id, 'num_images': len(image_paths)}), 202
 
 @app.route('/projects/<project_name>/auto_annotate_results.json')
 def serve_auto_annotate_results(project_name):
+    """The latest run as one {image: predictions} JSON document, gzip/brotli encoded when accepted.
+
+    The document is generated from the run's columns on first request and
+    kept in the run directory; runs never change, so it is never rebuilt.
+    """
+    project_dir = os.path.join(PROJECTS_DIR, project_name)
+    for attempt in range(2):
+        columns = current_prediction_columns(project_dir) if os.path.exists(project_dir) else None
+        if columns is None:
+            return jsonify({'error': 'Results file not found'}), 404
+        try:
+            if not os.path.exists(os.path.join(columns.run_dir, RESULTS_EXPORT_FILENAME)):
+                write_json_export(os.path.join(columns.run_dir, RESULTS_EXPORT_FILENAME), iter_results_json(columns))
+            return send_compressed_json(columns.run_dir, RESULTS_EXPORT_FILENAME)
+        except FileNotFoundError:
+            # A newer run replaced this one, and removed its directory, while the export was written
+            if attempt:
+                raise
+
+@app.route('/api/projects/<project_name>/predictions', methods=['GET'])
+def get_predictions(project_name):
+    """Predictions of the latest auto-label run.
+
+    With one or more ?image= it returns {image: predictions or null}, read
+    from the run's memory-mapped columns without touching other images.
+    Without it returns a summary: run id, image and detection counts and the
+    class ids present.
+    """
+    project_dir = os.path.join(PROJECTS_DIR, project_name)
+    columns = current_prediction_columns(project_dir) if os.path.exists(project_dir) else None
+    if columns is None:
+        return jsonify({'error': 'No auto-annotate results; run auto-labeling first'}), 404
+    names = request.args.getlist('image')
+    if names:
+        response = jsonify({name: columns.get(name) for name in names})
+    else:
+        response = jsonify({'run': columns.run, 'num_images': len(columns), 'num_detections': len(columns.scores),
+                            'classes': [int(c) for c in np.unique(columns.classes)]})
+    # A new run changes the run id, so clients can revalidate cheaply
+    response.set_etag(f'{columns.run}-{hashlib.sha1(request.query_string).hexdigest()[:16]}')
+    response.headers['Cache-Control'] = 'no-cache'
+    return response.make_conditional(request)
+
+@app.route('/projects/<project_name>/auto_annotate_results.jsonl')
+def serve_auto_annotate_results_log(project_name):
+    """Serve the append-only prediction log, readable while a run is in progress."""
     project_dir = os.path.join(PROJECTS_DIR, project_name)
-    results_path = os.path.join(project_dir, 'auto_annotate_results.json')
-    if not os.path.exists(results_path):
-        return jsonify({'error': 'Results file not found'}), 404
-    return send_from_directory(project_dir, 'auto_annotate_results.json')
+    if not os.path.exists(os.path.join(project_dir, RESULTS_LOG_FILENAME)):
+        return jsonify({'error': 'Results log not found'}), 404
+    return send_from_directory(project_dir, RESULTS_LOG_FILENAME, mimetype='application/x-ndjson')
 
 @app.route('/project.html')
 def serve_project_html():
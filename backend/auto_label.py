@@ -0,0 +1,276 @@
+import multiprocessing
+import os
+import queue
+import threading
+from collections import deque
+from itertools import islice
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from engines import DEFAULT_IMGSZ, create_engine, default_engine, export_onnx, needs_onnx_export
+from image_metadata import ImageMetadataStore, read_header
+from prediction_cache import PredictionCache
+from prediction_store import (RESULTS_FILENAME, RESULTS_LOG_FILENAME, PredictionLogWriter, iter_latest_records,
+                              write_prediction_columns)
+
+# Config keys passed through to the engine; they are part of the cache key
+INFERENCE_PARAM_KEYS = ('conf', 'iou', 'imgsz', 'max_det', 'device')
+
+# Images hashed and looked up in the prediction cache per step
+LOOKUP_CHUNK = 500
+
+# Config keys controlling how inference is executed; they never change the output
+EXECUTION_KEYS = ('cpu_workers', 'cpu_threads_per_worker', 'prefetch_threads', 'prefetch_batches')
+
+# Reader threads decoding images ahead of the model, and how many batches they may run ahead
+DEFAULT_PREFETCH_THREADS = 4
+DEFAULT_PREFETCH_BATCHES = 2
+
+# Set in each CPU worker process by _init_cpu_worker
+_worker_engine = None
+
+
+def inference_params(config):
+    return {k: config[k] for k in INFERENCE_PARAM_KEYS if config.get(k) is not None}
+
+
+def execution_settings(config):
+    """Return the process layout for a run; raises ValueError on invalid settings.
+
+    CPU runs (device 'cpu' or the onnxruntime engine) are sharded across
+    cpu_workers processes, each limited to cpu_threads_per_worker threads so
+    workers * threads stays within the core count. Other runs stay in the job
+    thread.
+    """
+    threads = int(config.get('cpu_threads_per_worker') or 1)
+    prefetch_threads = int(config.get('prefetch_threads') or DEFAULT_PREFETCH_THREADS)
+    prefetch_batches = int(config.get('prefetch_batches') or DEFAULT_PREFETCH_BATCHES)
+    if threads < 1 or prefetch_threads < 1 or prefetch_batches < 1:
+        raise ValueError('thread and batch counts must be at least 1')
+    settings = {'cpu_workers': 1, 'cpu_threads_per_worker': threads,
+                'prefetch_threads': prefetch_threads, 'prefetch_batches': prefetch_batches}
+    engine = config.get('engine') or default_engine(config.get('model_version', ''))
+    if config.get('device') != 'cpu' and engine != 'onnxruntime':
+        return settings
+    workers = config.get('cpu_workers')
+    workers = int(workers) if workers else max(1, (os.cpu_count() or 1) // threads)
+    if workers < 1:
+        raise ValueError('cpu_workers must be at least 1')
+    settings['cpu_workers'] = workers
+    return settings
+
+
+def _prefetch(preprocess, batches, threads, depth):
+    """Yield preprocessed batches in order while reader threads decode up to depth batches ahead."""
+    with ThreadPoolExecutor(max_workers=threads, thread_name_prefix='prefetch') as readers:
+        pending = iter(batches)
+        ahead = deque([readers.submit(preprocess, p) for p in batch] for batch in islice(pending, depth))
+        try:
+            while ahead:
+                futures = ahead.popleft()
+                next_batch = next(pending, None)
+                if next_batch is not None:
+                    ahead.append([readers.submit(preprocess, p) for p in next_batch])
+                yield [f.result() for f in futures]
+        finally:
+            for futures in ahead:
+                for f in futures:
+                    f.cancel()
+
+
+class _BackgroundWriter:
+    """Runs write callbacks on one thread behind a bounded queue; errors resurface on close."""
+
+    def __init__(self, maxsize=4):
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._error = None
+        self._thread = threading.Thread(target=self._run, name='result-writer', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            if self._error is None:
+                try:
+                    item[0](*item[1:])
+                except Exception as e:
+                    self._error = e
+
+    def submit(self, fn, *args):
+        if self._error is not None:
+            raise self._error
+        self._queue.put((fn,) + args)
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+        if self._error is not None:
+            raise self._error
+
+
+def _init_cpu_worker(engine_name, model_path, threads, params):
+    global _worker_engine
+    os.environ['OMP_NUM_THREADS'] = str(threads)
+    _worker_engine = create_engine(engine_name, model_path, params, threads)
+
+
+def _infer_cpu_shard(batch_paths):
+    return _worker_engine.predict(batch_paths)
+
+
+def _predict_in_process(job, load_engine, model_path, batches, prefetch_threads, prefetch_batches):
+    job.update(message='Loading model...')
+    engine = load_engine(model_path)
+    job.update(message='Running inference...')
+    prefetched = _prefetch(engine.preprocess, batches, prefetch_threads, prefetch_batches)
+    try:
+        for items in prefetched:
+            job.check_cancelled()
+            yield engine.predict_preprocessed(items)
+    finally:
+        prefetched.close()
+
+
+def _predict_cpu_pool(job, engine_name, model_path, batches, params, workers, threads):
+    """Shard batches over a process pool; results are yielded in submission order."""
+    job.update(message=f'Starting {workers} CPU worker(s)...')
+    # spawn avoids forking a process that already holds Flask and torch threads
+    pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                               initializer=_init_cpu_worker, initargs=(engine_name, model_path, threads, params))
+    try:
+        pending = iter(batches)
+        in_flight = deque(pool.submit(_infer_cpu_shard, b) for b in islice(pending, workers * 2))
+        job.update(message='Running inference...')
+        while in_flight:
+            job.check_cancelled()
+            preds = in_flight.popleft().result()
+            next_batch = next(pending, None)
+            if next_batch is not None:
+                in_flight.append(pool.submit(_infer_cpu_shard, next_batch))
+            yield preds
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+def _lookup_cached(cache, images_dir, image_names, model_hash, key_params):
+    """Yield (names, keys, {key: prediction}) for image_names, LOOKUP_CHUNK images at a time."""
+    for start in range(0, len(image_names), LOOKUP_CHUNK):
+        chunk = image_names[start:start + LOOKUP_CHUNK]
+        image_hashes = cache.file_hashes([os.path.join(images_dir, name) for name in chunk])
+        keys = [PredictionCache.prediction_key(h, model_hash, key_params) for h in image_hashes]
+        yield chunk, keys, cache.get_many(keys)
+
+
+def cached_predictions(project_dir, engine_name, model_path, params, image_names):
+    """Yield (name, predictions) for the image_names already predicted by this model and params."""
+    images_dir = os.path.join(project_dir, 'images')
+    cache = PredictionCache(project_dir)
+    try:
+        model_hash = cache.file_hash(model_path)
+        key_params = dict(params, engine=engine_name)
+        for chunk, keys, cached in _lookup_cached(cache, images_dir, image_names, model_hash, key_params):
+            for name, key in zip(chunk, keys):
+                if key in cached:
+                    yield name, cached[key]
+    finally:
+        cache.close()
+
+
+def _store_batch(cache, log, job, batch, preds):
+    cache.put_many([(key, [pred]) for (_, key), pred in zip(batch, preds)])
+    log.write_many([(name, [pred]) for (name, _), pred in zip(batch, preds)])
+    job.advance(len(batch), message=f'Processed {batch[-1][0]}')
+
+
+def _batches_by_resolution(project_dir, pending, batch_size):
+    """Split (name, key) pairs into batches that each hold images of a single resolution.
+
+    ultralytics letterboxes a batch of mixed sizes to a square instead of a
+    minimal rectangle, which can change the boxes, so keeping every batch to
+    one size keeps the output identical to predicting each image alone.
+    Sizes come from the metadata store, or the image header when unrecorded.
+    Output order is unaffected because the log is compacted in image_names order.
+    """
+    images_dir = os.path.join(project_dir, 'images')
+    with ImageMetadataStore(project_dir) as metadata:
+        groups = metadata.resolution_groups([name for name, _ in pending])
+    size_of = {name: size for size, names in groups.items() for name in names}
+    by_size = {}
+    for name, key in pending:
+        size = size_of.get(name)
+        if size is None:
+            try:
+                header = read_header(os.path.join(images_dir, name))
+                size = (header['width'], header['height'])
+            except (OSError, ValueError):
+                pass
+        by_size.setdefault(size, []).append((name, key))
+    return [items[start:start + batch_size] for items in by_size.values()
+            for start in range(0, len(items), batch_size)]
+
+
+def run_auto_label_job(job, load_engine, engine_name, model_path, project_dir, image_names, batch_size, params,
+                       execution=None):
+    """Job body for auto-labeling: infer image_names in batches and store the results as a columnar run.
+
+    load_engine(path) returns an engine for the model file at path. A .pt model
+    run with the onnxruntime engine is first exported to an .onnx sibling.
+
+    Predictions already in the project's PredictionCache are reused, and every
+    finished batch is committed to it, so a cancelled or crashed run resumes
+    where it stopped. Records are appended to auto_annotate_results.jsonl as
+    they are produced and compacted into a columnar run under predictions/
+    at the end, so memory does not grow with the number of predictions.
+    auto_annotate_results.json is then served from that run on request.
+    """
+    images_dir = os.path.join(project_dir, 'images')
+    log_path = os.path.join(project_dir, RESULTS_LOG_FILENAME)
+    cache = PredictionCache(project_dir)
+    try:
+        with PredictionLogWriter(log_path) as log:
+            job.update(message='Hashing images...')
+            model_hash = cache.file_hash(model_path)
+            key_params = dict(params, engine=engine_name)
+            pending = []
+            for chunk, keys, cached in _lookup_cached(cache, images_dir, image_names, model_hash, key_params):
+                log.write_many((name, cached[key]) for name, key in zip(chunk, keys) if key in cached)
+                pending.extend((name, key) for name, key in zip(chunk, keys) if key not in cached)
+            num_cached = len(image_names) - len(pending)
+            if num_cached:
+                job.advance(num_cached, message=f'Reused {num_cached} cached prediction(s)')
+            batches = _batches_by_resolution(project_dir, pending, batch_size)
+            if batches and engine_name == 'onnxruntime':
+                if needs_onnx_export(model_path):
+                    job.update(message='Exporting model to ONNX...')
+                model_path = export_onnx(model_path, params.get('imgsz') or DEFAULT_IMGSZ)
+            batch_paths = [[os.path.join(images_dir, name) for name, _ in batch] for batch in batches]
+            execution = execution or execution_settings({})
+            workers = min(execution['cpu_workers'], len(batches))
+            if workers > 1:
+                predictions = _predict_cpu_pool(job, engine_name, model_path, batch_paths, params,
+                                                workers, execution['cpu_threads_per_worker'])
+            else:
+                predictions = _predict_in_process(job, load_engine, model_path, batch_paths,
+                                                  execution['prefetch_threads'], execution['prefetch_batches'])
+            writer = _BackgroundWriter()
+            try:
+                for batch, preds in zip(batches, predictions):
+                    writer.submit(_store_batch, cache, log, job, batch, preds)
+            finally:
+                predictions.close()
+                writer.close()
+    finally:
+        cache.close()
+    job.update(message='Writing prediction columns...')
+    num_images = write_prediction_columns(iter_latest_records(log_path, image_names), project_dir)
+    # A results JSON written by an older version would now be stale
+    legacy_path = os.path.join(project_dir, RESULTS_FILENAME)
+    if os.path.exists(legacy_path):
+        os.remove(legacy_path)
+    return {
+        'num_images': num_images,
+        'num_cached': num_cached,
+        'num_inferred': len(pending),
+        'results_file': RESULTS_FILENAME,
+    }
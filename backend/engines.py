@@ -0,0 +1,228 @@
+import os
+import shutil
+import tempfile
+import threading
+
+import numpy as np
+
+try:
+    import cv2
+except ImportError:
+    cv2 = None
+
+try:
+    import onnxruntime as ort
+except ImportError:
+    ort = None
+
+from geometry import clip_boxes, cxcywh_to_xyxy, nms
+
+ENGINES = ('ultralytics', 'onnxruntime')
+
+# Defaults matching ultralytics predict, so both engines agree out of the box
+DEFAULT_CONF = 0.25
+DEFAULT_IOU = 0.7
+DEFAULT_MAX_DET = 300
+DEFAULT_IMGSZ = 640
+
+
+def default_engine(model_version):
+    return 'onnxruntime' if model_version.lower().endswith('.onnx') else 'ultralytics'
+
+
+def serialize_prediction(r):
+    """Convert one ultralytics Results object to boxes, scores and classes lists."""
+    boxes = r.boxes.xyxy.cpu().numpy().tolist() if hasattr(r, 'boxes') and hasattr(r.boxes, 'xyxy') else []
+    scores = r.boxes.conf.cpu().numpy().tolist() if hasattr(r, 'boxes') and hasattr(r.boxes, 'conf') else []
+    classes = r.boxes.cls.cpu().numpy().tolist() if hasattr(r, 'boxes') and hasattr(r.boxes, 'cls') else []
+    return {'boxes': boxes, 'scores': scores, 'classes': classes}
+
+
+class UltralyticsEngine:
+    """Runs a loaded ultralytics YOLO model.
+
+    Predictors keep per-call state, so predict holds lock; jobs sharing a
+    cached model pass the cache's lock for it.
+    """
+
+    name = 'ultralytics'
+
+    def __init__(self, model, params, lock=None):
+        self.model = model
+        self.params = params
+        self.lock = lock or threading.Lock()
+
+    def preprocess(self, path):
+        """Decode one image to the BGR array ultralytics would read itself (letterboxing stays in the model)."""
+        if cv2 is None:
+            return path
+        img = cv2.imread(path)
+        if img is None:
+            raise ValueError(f'Could not read image: {path}')
+        return img
+
+    def predict(self, batch_paths):
+        """Return one {boxes, scores, classes} dict per path, in input order."""
+        return self.predict_preprocessed(batch_paths)
+
+    def predict_preprocessed(self, items):
+        with self.lock:
+            preds = self.model.predict(items, batch=len(items), verbose=False, **self.params)
+        return [serialize_prediction(r) for r in preds]
+
+
+class OnnxRuntimeEngine:
+    """Runs an exported YOLOv8 detection model with ONNX Runtime on the CPU.
+
+    Letterboxing, box decoding and NMS follow ultralytics so the output has the
+    same layout (xyxy pixels in the original image) as UltralyticsEngine.
+    """
+
+    name = 'onnxruntime'
+
+    def __init__(self, session, params):
+        if cv2 is None:
+            raise RuntimeError('opencv-python is required for the onnxruntime engine')
+        self.session = session
+        model_input = session.get_inputs()[0]
+        self.input_name = model_input.name
+        _, _, height, width = model_input.shape
+        self.dynamic_batch = not isinstance(model_input.shape[0], int)
+        fixed_size = isinstance(height, int) and isinstance(width, int)
+        imgsz = params.get('imgsz') or ((height, width) if fixed_size else DEFAULT_IMGSZ)
+        self.imgsz = (imgsz, imgsz) if isinstance(imgsz, int) else tuple(imgsz)
+        self.conf = float(params.get('conf', DEFAULT_CONF))
+        self.iou = float(params.get('iou', DEFAULT_IOU))
+        self.max_det = int(params.get('max_det', DEFAULT_MAX_DET))
+
+    def preprocess(self, path):
+        """Read and letterbox one image; returns (CHW float32 tensor, original (h, w))."""
+        img = cv2.imread(path)
+        if img is None:
+            raise ValueError(f'Could not read image: {path}')
+        shape = img.shape[:2]
+        img = letterbox(img, self.imgsz)
+        tensor = img[:, :, ::-1].transpose(2, 0, 1).astype(np.float32) / 255.0
+        return np.ascontiguousarray(tensor), shape
+
+    def predict(self, batch_paths):
+        """Return one {boxes, scores, classes} dict per path, in input order."""
+        items = [self.preprocess(p) for p in batch_paths]
+        return self.predict_preprocessed(items)
+
+    def predict_preprocessed(self, items):
+        tensors = np.stack([tensor for tensor, _ in items])
+        if self.dynamic_batch:
+            outputs = self.session.run(None, {self.input_name: tensors})[0]
+        else:
+            outputs = np.concatenate([self.session.run(None, {self.input_name: t[None]})[0] for t in tensors])
+        results = []
+        for output, (_, shape) in zip(outputs, items):
+            boxes, scores, classes = decode_yolov8(output, self.conf, self.iou, self.max_det)
+            boxes = scale_boxes(boxes, self.imgsz, shape)
+            results.append({'boxes': boxes.tolist(), 'scores': scores.tolist(), 'classes': classes.tolist()})
+        return results
+
+
+def letterbox(img, new_shape, color=(114, 114, 114)):
+    """Resize keeping aspect ratio and pad to new_shape (h, w), centred like ultralytics."""
+    h, w = img.shape[:2]
+    r = min(new_shape[0] / h, new_shape[1] / w)
+    new_unpad = (int(round(w * r)), int(round(h * r)))
+    dw = (new_shape[1] - new_unpad[0]) / 2
+    dh = (new_shape[0] - new_unpad[1]) / 2
+    if (w, h) != new_unpad:
+        img = cv2.resize(img, new_unpad, interpolation=cv2.INTER_LINEAR)
+    top, bottom = int(round(dh - 0.1)), int(round(dh + 0.1))
+    left, right = int(round(dw - 0.1)), int(round(dw + 0.1))
+    return cv2.copyMakeBorder(img, top, bottom, left, right, cv2.BORDER_CONSTANT, value=color)
+
+
+def scale_boxes(boxes, letterbox_shape, original_shape):
+    """Map xyxy boxes from letterboxed coordinates back to the original (h, w) image."""
+    gain = min(letterbox_shape[0] / original_shape[0], letterbox_shape[1] / original_shape[1])
+    pad_x = round((letterbox_shape[1] - original_shape[1] * gain) / 2 - 0.1)
+    pad_y = round((letterbox_shape[0] - original_shape[0] * gain) / 2 - 0.1)
+    boxes = (boxes - np.array([pad_x, pad_y, pad_x, pad_y], dtype=np.float32)) / gain
+    return clip_boxes(boxes, original_shape[1], original_shape[0])
+
+
+def decode_yolov8(output, conf, iou, max_det):
+    """Decode one raw YOLOv8 head output of shape (4 + num_classes, num_anchors).
+
+    Returns xyxy boxes, scores and float class ids after confidence filtering
+    and class-aware NMS, sorted by descending score.
+    """
+    preds = output.T
+    class_scores = preds[:, 4:]
+    classes = class_scores.argmax(axis=1)
+    scores = class_scores[np.arange(len(preds)), classes]
+    keep = scores > conf
+    boxes, scores, classes = cxcywh_to_xyxy(preds[keep, :4]), scores[keep], classes[keep]
+    keep = nms(boxes, scores, iou, classes=classes, max_det=max_det)
+    return boxes[keep], scores[keep], classes[keep].astype(np.float32)
+
+
+def load_onnx_session(path, threads=None):
+    if ort is None:
+        raise RuntimeError('onnxruntime not installed on server')
+    options = ort.SessionOptions()
+    if threads:
+        options.intra_op_num_threads = threads
+    return ort.InferenceSession(path, sess_options=options, providers=['CPUExecutionProvider'])
+
+
+def onnx_path_for(model_path):
+    return os.path.splitext(model_path)[0] + '.onnx'
+
+
+def needs_onnx_export(model_path):
+    if model_path.lower().endswith('.onnx'):
+        return False
+    onnx_path = onnx_path_for(model_path)
+    return not os.path.exists(onnx_path) or os.path.getmtime(onnx_path) < os.path.getmtime(model_path)
+
+
+_export_locks = {}
+_export_locks_lock = threading.Lock()
+
+
+def export_onnx(model_path, imgsz=DEFAULT_IMGSZ):
+    """Export a .pt model to an .onnx sibling once; later calls reuse it until the .pt changes.
+
+    Jobs exporting the same weights take turns, and the export runs on a copy
+    in a temporary folder whose output is renamed into place, so no reader (in
+    this or another process) ever loads a partly written .onnx.
+    """
+    if not needs_onnx_export(model_path):
+        return model_path if model_path.lower().endswith('.onnx') else onnx_path_for(model_path)
+    onnx_path = onnx_path_for(model_path)
+    with _export_locks_lock:
+        lock = _export_locks.setdefault(os.path.abspath(onnx_path), threading.Lock())
+    with lock:
+        if not needs_onnx_export(model_path):
+            return onnx_path
+        from ultralytics import YOLO
+        work_dir = tempfile.mkdtemp(dir=os.path.dirname(onnx_path), prefix='.onnx-export-')
+        try:
+            work_path = os.path.join(work_dir, os.path.basename(model_path))
+            try:
+                os.link(model_path, work_path)
+            except OSError:
+                shutil.copy2(model_path, work_path)
+            exported = YOLO(work_path).export(format='onnx', imgsz=imgsz, dynamic=True)
+            os.replace(exported, onnx_path)
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+    return onnx_path
+
+
+def create_engine(engine_name, model_path, params, threads=None):
+    """Build an engine without the shared model cache (used by CPU worker processes)."""
+    if engine_name == 'onnxruntime':
+        return OnnxRuntimeEngine(load_onnx_session(model_path, threads), params)
+    import torch
+    from ultralytics import YOLO
+    if threads:
+        torch.set_num_threads(threads)
+    return UltralyticsEngine(YOLO(model_path), params)
@@ -0,0 +1,250 @@
+import os
+
+import numpy as np
+
+from active_learning import FlatPredictions, from_columns
+from annotation_store import AnnotationStore
+from geometry import iter_pairs_by_key, paired_iou, xywh_to_xyxy, xyxy_to_xywh
+from prediction_store import current_prediction_columns
+
+# COCO's AP@[.5:.95]; the first threshold is also used for precision, recall and the confusion matrix
+IOU_THRESHOLDS = np.round(np.linspace(0.5, 0.95, 10), 2)
+_RECALL_POINTS = np.linspace(0, 1, 101)
+DEFAULT_FALSE_NEGATIVE_IMAGES = 100
+
+
+def flatten_ground_truth(items):
+    """FlatPredictions of ground truth from (image_name, xyxy boxes, class ids) items; every score is 1."""
+    names, boxes, classes = [], [], []
+    for name, image_boxes, image_classes in items:
+        names.append(name)
+        boxes.append(np.asarray(image_boxes, dtype=np.float32).reshape(-1, 4))
+        classes.append(np.asarray(image_classes, dtype=np.float32).reshape(-1))
+    counts = [len(c) for c in classes]
+    boxes = np.concatenate(boxes) if boxes else np.empty((0, 4), dtype=np.float32)
+    classes = np.concatenate(classes) if classes else np.empty(0, dtype=np.float32)
+    return FlatPredictions(names, counts, boxes, np.ones(len(classes), dtype=np.float32), classes)
+
+
+def match_detections(gt, preds, iou_thresholds=IOU_THRESHOLDS, class_aware=True):
+    """Greedy COCO-style matching of detections to ground truth at several IoU thresholds at once.
+
+    preds must hold the same images as gt in the same order. Detections
+    are visited from the highest score down and each takes the unmatched
+    ground-truth box it overlaps most. Returns a (thresholds, detections)
+    array of matched ground-truth rows, -1 where a detection is unmatched.
+
+    Instead of a Python loop over detections, matching runs in rounds over
+    all images and thresholds together: each detection proposes its best
+    free box, and a proposal is accepted when no higher-scoring undecided
+    detection could still claim that box. The result equals the sequential
+    greedy pass, and most images settle within a few rounds.
+    """
+    iou_thresholds = np.asarray(iou_thresholds, dtype=np.float64)
+    num_t, num_det, num_gt = len(iou_thresholds), len(preds.scores), len(gt.scores)
+    # Renumber detections by descending score so that a lower row always means a higher score
+    by_score = np.argsort(-preds.scores, kind='stable')
+    if class_aware:
+        _, class_index = np.unique(np.concatenate((preds.classes, gt.classes)), return_inverse=True)
+        num_classes = int(class_index.max()) + 1 if len(class_index) else 1
+        det_keys = preds.image_of[by_score] * num_classes + class_index[:num_det][by_score]
+        gt_keys = gt.image_of * num_classes + class_index[num_det:]
+    else:
+        det_keys, gt_keys = preds.image_of[by_score], gt.image_of
+    det_boxes = preds.boxes[by_score]
+    dets, gts, ious = [], [], []
+    for d_rows, g_rows in iter_pairs_by_key(det_keys, gt_keys):
+        iou = paired_iou(det_boxes[d_rows], gt.boxes[g_rows])
+        keep = iou >= iou_thresholds.min()
+        dets.append(d_rows[keep])
+        gts.append(g_rows[keep])
+        ious.append(iou[keep])
+    matches = np.full(num_t * num_det, -1, dtype=np.int64)
+    if dets:
+        dets, gts, ious = np.concatenate(dets), np.concatenate(gts), np.concatenate(ious)
+        # One copy of every candidate pair per threshold it passes, keyed by (threshold, row)
+        passes = ious[None, :] >= iou_thresholds[:, None]
+        t_index, pair = np.nonzero(passes)
+        det_key = t_index * num_det + dets[pair]
+        gt_key = t_index * num_gt + gts[pair]
+        # Each detection's candidates, best overlap first
+        order = np.lexsort((gts[pair], -ious[pair], det_key))
+        det_key, gt_key = det_key[order], gt_key[order]
+        claimed = np.zeros(num_t * num_gt, dtype=bool)
+        decided = np.zeros(num_t * num_det, dtype=bool)
+        top_claimant = np.empty(num_t * num_gt, dtype=np.int64)
+        while len(det_key):
+            best = np.concatenate(([True], det_key[1:] != det_key[:-1]))
+            # Pairs are ordered by detection, so a box's first pair is its highest-scoring claimant
+            boxes_claimed, first = np.unique(gt_key, return_index=True)
+            top_claimant[boxes_claimed] = det_key[first]
+            accept = best & (top_claimant[gt_key] == det_key)
+            matches[det_key[accept]] = gt_key[accept] % max(num_gt, 1)
+            claimed[gt_key[accept]] = True
+            decided[det_key[accept]] = True
+            remaining = ~claimed[gt_key] & ~decided[det_key]
+            det_key, gt_key = det_key[remaining], gt_key[remaining]
+    # Back to the caller's detection order
+    out = np.empty((num_t, num_det), dtype=np.int64)
+    out[:, by_score] = matches.reshape(num_t, num_det)
+    return out
+
+
+def _average_precision(tp, num_gt):
+    """COCO 101-point interpolated AP per threshold from (thresholds, detections) TP flags in score order."""
+    if tp.shape[1] == 0:
+        return np.zeros(tp.shape[0])
+    tp_cum = np.cumsum(tp, axis=1)
+    fp_cum = np.cumsum(~tp, axis=1)
+    recall = tp_cum / num_gt
+    precision = tp_cum / (tp_cum + fp_cum)
+    # Precision envelope: best precision at this recall or any higher one
+    precision = np.maximum.accumulate(precision[:, ::-1], axis=1)[:, ::-1]
+    ap = np.empty(tp.shape[0])
+    for t in range(tp.shape[0]):
+        idx = np.searchsorted(recall[t], _RECALL_POINTS, side='left')
+        ap[t] = np.where(idx < tp.shape[1], precision[t][np.minimum(idx, tp.shape[1] - 1)], 0).mean()
+    return ap
+
+
+def _ratio(num, den):
+    return float(num / den) if den else None
+
+
+def evaluate(gt, preds, class_names=None, score_threshold=0.0, iou_thresholds=IOU_THRESHOLDS,
+             max_false_negative_images=DEFAULT_FALSE_NEGATIVE_IMAGES):
+    """Compare detections with ground truth over the images in gt.
+
+    Returns a JSON-ready report with per-class and overall precision and
+    recall at iou_thresholds[0] and score_threshold, AP at 0.5, 0.75 and
+    averaged over iou_thresholds (all detections, as in COCO), a confusion
+    matrix from class-agnostic matching (rows predicted, columns true, last
+    one background), and the images with the most missed boxes.
+    class_names[i] names class id i.
+    """
+    class_names = list(class_names or [])
+    iou_thresholds = np.asarray(iou_thresholds, dtype=np.float64)
+    preds = preds.align(gt.names)
+    det_classes = np.rint(preds.classes).astype(np.int64)
+    gt_classes = np.rint(gt.classes).astype(np.int64)
+    matches = match_detections(gt, preds, iou_thresholds)
+    kept = preds.scores >= score_threshold
+
+    def name_of(class_id):
+        return class_names[class_id] if 0 <= class_id < len(class_names) else f'class_{class_id}'
+
+    classes = np.union1d(det_classes, gt_classes)
+    per_class = []
+    tp_total = fp_total = 0
+    for c in classes.tolist():
+        dets = np.flatnonzero(det_classes == c)
+        dets = dets[np.argsort(-preds.scores[dets], kind='stable')]
+        num_gt = int(np.count_nonzero(gt_classes == c))
+        tp = matches[:, dets] >= 0
+        ap = _average_precision(tp, num_gt) if num_gt else None
+        tp_kept = int(np.count_nonzero(tp[0] & kept[dets]))
+        fp_kept = int(np.count_nonzero(kept[dets])) - tp_kept
+        tp_total += tp_kept
+        fp_total += fp_kept
+        per_class.append({
+            'id': c, 'name': name_of(c), 'ground_truth': num_gt, 'predictions': tp_kept + fp_kept,
+            'tp': tp_kept, 'fp': fp_kept, 'fn': num_gt - tp_kept,
+            'precision': _ratio(tp_kept, tp_kept + fp_kept), 'recall': _ratio(tp_kept, num_gt),
+            'ap50': None if ap is None else float(ap[0]),
+            'ap75': None if ap is None or 0.75 not in iou_thresholds else float(ap[iou_thresholds == 0.75][0]),
+            'ap': None if ap is None else float(ap.mean()),
+        })
+    with_gt = [row for row in per_class if row['ap'] is not None]
+
+    # Ground truth is found when a kept detection matched it at the first threshold
+    found = np.zeros(len(gt_classes), dtype=bool)
+    hits = matches[0][kept & (matches[0] >= 0)]
+    found[hits] = True
+    missed_per_image = np.bincount(gt.image_of[~found], minlength=len(gt))
+    worst = np.argsort(-missed_per_image, kind='stable')
+    worst = worst[missed_per_image[worst] > 0]
+    if max_false_negative_images is not None:
+        worst = worst[:max_false_negative_images]
+    gt_xywh = xyxy_to_xywh(gt.boxes.astype(np.float64))
+    false_negatives = {}
+    for i in worst.tolist():
+        rows = np.arange(gt.offsets[i], gt.offsets[i + 1])
+        rows = rows[~found[rows]]
+        false_negatives[gt.names[i]] = [{'label': name_of(c), 'bbox': box}
+                                        for c, box in zip(gt_classes[rows].tolist(), gt_xywh[rows].tolist())]
+
+    # Class-agnostic matching so a box found with the wrong class shows up off the diagonal
+    kept_preds = preds.where(kept)
+    kept_classes = det_classes[kept]
+    agnostic = match_detections(gt, kept_preds, iou_thresholds[:1], class_aware=False)[0]
+    index = {c: i for i, c in enumerate(classes.tolist())}
+    background = len(classes)
+    pred_idx = np.array([index[c] for c in kept_classes.tolist()], dtype=np.int64)
+    true_idx = np.array([index[c] for c in gt_classes.tolist()], dtype=np.int64)
+    matched = agnostic >= 0
+    gt_hit = np.zeros(len(gt_classes), dtype=bool)
+    gt_hit[agnostic[matched]] = True
+    size = background + 1
+    cells = np.concatenate((pred_idx[matched] * size + true_idx[agnostic[matched]],
+                            pred_idx[~matched] * size + background,
+                            background * size + true_idx[~gt_hit]))
+    confusion = np.bincount(cells, minlength=size * size).reshape(size, size)
+
+    num_gt = len(gt_classes)
+    return {
+        'num_images': len(gt), 'num_ground_truth': num_gt, 'num_predictions': int(np.count_nonzero(kept)),
+        'score_threshold': score_threshold, 'iou_thresholds': iou_thresholds.tolist(),
+        'precision': _ratio(tp_total, tp_total + fp_total), 'recall': _ratio(tp_total, num_gt),
+        'map50': float(np.mean([row['ap50'] for row in with_gt])) if with_gt else None,
+        'map': float(np.mean([row['ap'] for row in with_gt])) if with_gt else None,
+        'classes': per_class,
+        'confusion_matrix': {'labels': [name_of(c) for c in classes.tolist()] + ['background'],
+                             'matrix': confusion.tolist()},
+        'images_with_false_negatives': int(np.count_nonzero(missed_per_image)),
+        'false_negatives': false_negatives,
+    }
+
+
+def project_class_names(project_dir):
+    """Class id order of a project: labels.txt first, then any other saved label, as in dataset exports."""
+    with AnnotationStore(project_dir) as store:
+        categories = store.categories()
+    labels_file = os.path.join(project_dir, 'labels.txt')
+    if os.path.exists(labels_file):
+        with open(labels_file, 'r', encoding='utf-8') as f:
+            categories = [l.strip() for l in f if l.strip()] + categories
+    return list(dict.fromkeys(categories))
+
+
+def project_ground_truth(project_dir, class_names, names=None):
+    """Manual annotations as ground truth; labels missing from class_names are appended to it."""
+    class_ids = {label: i for i, label in enumerate(class_names)}
+
+    def items():
+        with AnnotationStore(project_dir) as store:
+            for name, entry in store.iter_images():
+                if names is not None and name not in names:
+                    continue
+                annotations = entry['annotations']
+                labels = [a.get('label') or a.get('category') for a in annotations]
+                for label in labels:
+                    if label not in class_ids:
+                        class_ids[label] = len(class_ids)
+                        class_names.append(label)
+                yield name, xywh_to_xyxy([a['bbox'] for a in annotations]), [class_ids[l] for l in labels]
+    return flatten_ground_truth(items())
+
+
+def evaluate_project(project_dir, class_names=None, names=None, **kwargs):
+    """evaluate() of a project's latest auto-label run against its manual annotations.
+
+    Prediction class id i is taken to mean class_names[i], defaulting to the
+    project's class order (the ids a model trained on its exports predicts).
+    Returns None when the project has no predictions.
+    """
+    columns = current_prediction_columns(project_dir)
+    if columns is None:
+        return None
+    class_names = list(class_names) if class_names else project_class_names(project_dir)
+    gt = project_ground_truth(project_dir, class_names, names)
+    return evaluate(gt, from_columns(columns), class_names, **kwargs)
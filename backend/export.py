@@ -0,0 +1,148 @@
+import json
+import os
+import time
+import zipfile
+
+import numpy as np
+import yaml
+
+from geometry import xywh_to_xyxy, xyxy_to_xywhn, yolo_lines
+
+EXPORT_FORMATS = ('yolo', 'coco')
+_COPY_CHUNK = 1024 * 1024
+
+
+class _ZipSink:
+    """Write-only file object for ZipFile that hands bytes back to the caller instead of storing them.
+
+    It has no seek or tell, so ZipFile writes data descriptors after each
+    member rather than seeking back to patch headers.
+    """
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def _member(name, compress_type):
+    info = zipfile.ZipInfo(name, time.localtime()[:6])
+    info.compress_type = compress_type
+    return info
+
+
+def _write_file(zf, sink, arcname, path):
+    """Copy a file into the archive in fixed-size chunks, yielding the output as it is produced."""
+    # Images are already compressed, so they are stored as-is and the export stays I/O-bound
+    with open(path, 'rb') as src, zf.open(_member(arcname, zipfile.ZIP_STORED), 'w', force_zip64=True) as dst:
+        for chunk in iter(lambda: src.read(_COPY_CHUNK), b''):
+            dst.write(chunk)
+            yield sink.drain()
+
+
+def _write_text(zf, sink, arcname, pieces):
+    """Write an iterable of strings as one deflated member, yielding the output every ~1 MB."""
+    with zf.open(_member(arcname, zipfile.ZIP_DEFLATED), 'w', force_zip64=True) as dst:
+        pending = []
+        size = 0
+        for piece in pieces:
+            pending.append(piece)
+            size += len(piece)
+            if size >= _COPY_CHUNK:
+                dst.write(''.join(pending).encode('utf-8'))
+                pending, size = [], 0
+                yield sink.drain()
+        dst.write(''.join(pending).encode('utf-8'))
+    yield sink.drain()
+
+
+def _yolo_lines(record, class_ids):
+    _, width, height, boxes = record
+    xywh = np.array([box[1:5] for box in boxes], dtype=np.float64)
+    return yolo_lines([class_ids[box[0]] for box in boxes], xyxy_to_xywhn(xywh_to_xyxy(xywh), width, height))
+
+
+def _coco_json(records, class_ids):
+    """The COCO document as a stream of strings; records() is iterated once per array."""
+    yield '{"images": ['
+    for image_id, (name, width, height, _) in enumerate(records(), 1):
+        yield (',\n' if image_id > 1 else '\n') + json.dumps(
+            {'id': image_id, 'file_name': name, 'width': width, 'height': height})
+    yield '\n], "annotations": ['
+    annotation_id = 0
+    for image_id, (_, _, _, boxes) in enumerate(records(), 1):
+        for label, x, y, w, h, score in boxes:
+            annotation_id += 1
+            annotation = {'id': annotation_id, 'image_id': image_id, 'category_id': class_ids[label] + 1,
+                          'bbox': [x, y, w, h], 'area': w * h, 'iscrowd': 0}
+            if score is not None:
+                annotation['score'] = score
+            yield (',\n' if annotation_id > 1 else '\n') + json.dumps(annotation)
+    yield '\n], "categories": '
+    yield json.dumps([{'id': i + 1, 'name': name} for name, i in class_ids.items()])
+    yield '}\n'
+
+
+def iter_export_zip(fmt, records, categories, images_dir=None):
+    """Yield a YOLO or COCO dataset zip as a stream of byte chunks.
+
+    records() returns a fresh iterator of (image_name, width, height, boxes),
+    boxes being (label, x, y, w, h, score) tuples in pixels with a top-left
+    origin and score None for human labels. categories lists every label in
+    class-id order; labels are appended as they turn up if it is incomplete.
+    When images_dir is given the image files are included under images/.
+    Only one image chunk and one label file are ever held in memory.
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f'format must be one of {list(EXPORT_FORMATS)}')
+    # Deflate buffers internally, so many writes produce no output yet
+    return (chunk for chunk in _iter_zip(fmt, records, categories, images_dir) if chunk)
+
+
+def _yolo_stem(name, used):
+    """A label file stem for name, unique among used (case-insensitively, as on Windows/macOS).
+
+    YOLO pairs images and labels by stem, so x.jpg and x.png would both want
+    labels/x.txt; the later one is exported as x__png.png with labels/x__png.txt.
+    """
+    stem, ext = os.path.splitext(name)
+    candidate, n = stem, 1
+    while candidate.lower() in used:
+        candidate = f'{stem}__{ext.lstrip(".")}' + (f'_{n}' if n > 1 else '')
+        n += 1
+    used.add(candidate.lower())
+    return candidate, candidate + ext
+
+
+def _iter_zip(fmt, records, categories, images_dir):
+    class_ids = {label: i for i, label in enumerate(dict.fromkeys(categories))}
+    used_stems = set()
+    sink = _ZipSink()
+    with zipfile.ZipFile(sink, 'w', allowZip64=True) as zf:
+        for record in records():
+            name, width, height, boxes = record
+            for label, *_ in boxes:
+                class_ids.setdefault(label, len(class_ids))
+            stem, member = _yolo_stem(name, used_stems) if fmt == 'yolo' else (None, name)
+            if images_dir is not None and os.path.exists(os.path.join(images_dir, name)):
+                yield from _write_file(zf, sink, f'images/{member}', os.path.join(images_dir, name))
+            if fmt == 'yolo':
+                # Images without boxes still get an (empty) label file so YOLO treats them as background
+                yield from _write_text(zf, sink, f'labels/{stem}.txt', _yolo_lines(record, class_ids))
+        if fmt == 'yolo':
+            data = {'path': '.', 'train': 'images', 'val': 'images',
+                    'names': {i: name for name, i in class_ids.items()}}
+            yield from _write_text(zf, sink, 'data.yaml', [yaml.safe_dump(data, sort_keys=False)])
+        else:
+            yield from _write_text(zf, sink, 'annotations.json', _coco_json(records, class_ids))
+    yield sink.drain()
@@ -0,0 +1,175 @@
+import numpy as np
+
+# Box pairs compared at once when matching two sets of boxes
+_PAIR_CHUNK = 4_000_000
+
+
+def as_boxes(boxes):
+    """boxes as an (N, 4) float array; float32 input stays float32, anything else becomes float64."""
+    boxes = np.asarray(boxes)
+    if not np.issubdtype(boxes.dtype, np.floating):
+        boxes = boxes.astype(np.float64)
+    return boxes.reshape(-1, 4)
+
+
+def xywh_to_xyxy(boxes):
+    """Top-left [x, y, w, h] (saved annotations, COCO, canvas rects) to [x1, y1, x2, y2]."""
+    boxes = as_boxes(boxes)
+    out = boxes.copy()
+    out[:, 2:] += boxes[:, :2]
+    return out
+
+
+def xyxy_to_xywh(boxes):
+    boxes = as_boxes(boxes)
+    out = boxes.copy()
+    out[:, 2:] -= boxes[:, :2]
+    return out
+
+
+def cxcywh_to_xyxy(boxes):
+    """Centre [cx, cy, w, h] (YOLO heads and labels) to [x1, y1, x2, y2] in the same units."""
+    boxes = as_boxes(boxes)
+    out = np.empty_like(boxes)
+    out[:, :2] = boxes[:, :2] - boxes[:, 2:] / 2
+    out[:, 2:] = boxes[:, :2] + boxes[:, 2:] / 2
+    return out
+
+
+def xyxy_to_cxcywh(boxes):
+    boxes = as_boxes(boxes)
+    out = np.empty_like(boxes)
+    out[:, :2] = (boxes[:, :2] + boxes[:, 2:]) / 2
+    out[:, 2:] = boxes[:, 2:] - boxes[:, :2]
+    return out
+
+
+def _size(width, height):
+    """[w, h, w, h] broadcastable against (N, 4); width and height may be scalars or per-box arrays."""
+    width, height = np.asarray(width, dtype=np.float64), np.asarray(height, dtype=np.float64)
+    return np.stack(np.broadcast_arrays(width, height, width, height), axis=-1).reshape(-1, 4)
+
+
+def xyxy_to_xywhn(boxes, width, height):
+    """Pixel xyxy to YOLO's normalized centre xywh for an image of width x height."""
+    return xyxy_to_cxcywh(boxes) / _size(width, height)
+
+
+def xywhn_to_xyxy(boxes, width, height):
+    """YOLO's normalized centre xywh to pixel xyxy for an image of width x height."""
+    return cxcywh_to_xyxy(as_boxes(boxes) * _size(width, height))
+
+
+def clip_boxes(boxes, width, height):
+    """xyxy boxes clipped to the image, as a new array."""
+    boxes = as_boxes(boxes)
+    out = np.empty_like(boxes)
+    size = _size(width, height)
+    np.clip(boxes, 0, size, out=out)
+    return out
+
+
+def rescale_boxes(boxes, from_size, to_size):
+    """Map xyxy or xywh boxes between two resolutions of the same image, e.g. a display canvas and
+    the original; sizes are (width, height)."""
+    sx, sy = to_size[0] / from_size[0], to_size[1] / from_size[1]
+    return as_boxes(boxes) * np.array([sx, sy, sx, sy])
+
+
+def box_area(boxes):
+    boxes = as_boxes(boxes)
+    return np.clip(boxes[:, 2] - boxes[:, 0], 0, None) * np.clip(boxes[:, 3] - boxes[:, 1], 0, None)
+
+
+def paired_iou(a, b):
+    """IoU of aligned rows of two equally long sets of xyxy boxes."""
+    a, b = as_boxes(a), as_boxes(b)
+    w = np.clip(np.minimum(a[:, 2], b[:, 2]) - np.maximum(a[:, 0], b[:, 0]), 0, None)
+    h = np.clip(np.minimum(a[:, 3], b[:, 3]) - np.maximum(a[:, 1], b[:, 1]), 0, None)
+    inter = w * h
+    union = box_area(a) + box_area(b) - inter
+    return np.where(union > 0, inter / np.where(union > 0, union, 1), 0)
+
+
+def iou_matrix(a, b):
+    """(len(a), len(b)) IoU of every pair of xyxy boxes; callers chunk a when both sides are large."""
+    a, b = as_boxes(a), as_boxes(b)
+    w = np.clip(np.minimum(a[:, None, 2], b[None, :, 2]) - np.maximum(a[:, None, 0], b[None, :, 0]), 0, None)
+    h = np.clip(np.minimum(a[:, None, 3], b[None, :, 3]) - np.maximum(a[:, None, 1], b[None, :, 1]), 0, None)
+    inter = w * h
+    union = box_area(a)[:, None] + box_area(b)[None, :] - inter
+    return np.where(union > 0, inter / np.where(union > 0, union, 1), 0)
+
+
+def _groups(keys):
+    """(row order, unique keys, group starts, group counts) of rows grouped by key."""
+    order = np.argsort(keys, kind='stable')
+    sorted_keys = keys[order]
+    starts = np.flatnonzero(np.concatenate(([True], sorted_keys[1:] != sorted_keys[:-1]))) if len(keys) else \
+        np.empty(0, dtype=np.int64)
+    return order, sorted_keys[starts], starts, np.diff(np.concatenate((starts, [len(keys)])))
+
+
+def iter_pairs_by_key(keys_a, keys_b, chunk=_PAIR_CHUNK):
+    """Yield (rows_a, rows_b) index arrays that together cover every pair of rows with equal keys.
+
+    Keys are integers such as image * num_classes + class, so only boxes
+    that could match are ever compared; about chunk pairs are yielded at a time.
+    """
+    order_a, groups_a, starts_a, counts_a = _groups(np.asarray(keys_a))
+    order_b, groups_b, starts_b, counts_b = _groups(np.asarray(keys_b))
+    _, ga, gb = np.intersect1d(groups_a, groups_b, assume_unique=True, return_indices=True)
+    starts_a, counts_a, starts_b, counts_b = starts_a[ga], counts_a[ga], starts_b[gb], counts_b[gb]
+    pairs = counts_a * counts_b
+    pair_ends = np.cumsum(pairs)
+    bounds = np.searchsorted(pair_ends, np.arange(chunk, int(pair_ends[-1]) if len(pairs) else 0, chunk),
+                             side='left')
+    for lo, hi in zip(np.concatenate(([0], bounds)), np.concatenate((bounds, [len(pairs)]))):
+        n_pairs = pairs[lo:hi]
+        if not n_pairs.sum():
+            continue
+        group = np.repeat(np.arange(lo, hi), n_pairs)
+        local = np.arange(int(n_pairs.sum())) - np.repeat(np.cumsum(n_pairs) - n_pairs, n_pairs)
+        per_b = counts_b[group]
+        yield order_a[starts_a[group] + local // per_b], order_b[starts_b[group] + local % per_b]
+
+
+def nms(boxes, scores, iou_threshold, classes=None, max_det=None):
+    """Greedy non-maximum suppression over xyxy boxes; returns kept indices, highest score first.
+
+    With classes, boxes only suppress boxes of the same class.
+    """
+    boxes = as_boxes(boxes)
+    scores = np.asarray(scores)
+    if classes is not None and len(boxes):
+        # Shift each class past every other class's coordinates so one pass never suppresses across classes
+        offset = float(boxes.max() - boxes.min()) + 1
+        boxes = boxes + np.unique(classes, return_inverse=True)[1].reshape(-1, 1) * offset
+    order = scores.argsort(kind='stable')[::-1]
+    areas = box_area(boxes)
+    keep = []
+    while order.size and (max_det is None or len(keep) < max_det):
+        i = order[0]
+        keep.append(i)
+        rest = order[1:]
+        xx1 = np.maximum(boxes[i, 0], boxes[rest, 0])
+        yy1 = np.maximum(boxes[i, 1], boxes[rest, 1])
+        xx2 = np.minimum(boxes[i, 2], boxes[rest, 2])
+        yy2 = np.minimum(boxes[i, 3], boxes[rest, 3])
+        inter = np.clip(xx2 - xx1, 0, None) * np.clip(yy2 - yy1, 0, None)
+        iou = inter / (areas[i] + areas[rest] - inter + 1e-9)
+        order = rest[iou <= iou_threshold]
+    return np.array(keep, dtype=np.int64)
+
+
+def yolo_lines(class_ids, boxes_xywhn):
+    """YOLO label file lines ("cls cx cy w h\\n") for integer class ids and normalized centre boxes."""
+    return [f'{int(c)} {x:.6f} {y:.6f} {w:.6f} {h:.6f}\n'
+            for c, (x, y, w, h) in zip(np.asarray(class_ids).tolist(), as_boxes(boxes_xywhn).tolist())]
+
+
+def parse_yolo_lines(lines):
+    """(class ids, normalized centre boxes) from YOLO label lines; malformed lines are skipped."""
+    rows = [parts for parts in (line.split() for line in lines) if len(parts) == 5]
+    values = np.array(rows, dtype=np.float64).reshape(-1, 5)
+    return values[:, 0].astype(np.int64), values[:, 1:]
@@ -0,0 +1,113 @@
+import gzip
+import os
+import shutil
+import tempfile
+
+from flask import request, send_from_directory
+from werkzeug.security import safe_join
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Served for URLs carrying a ?v= version token, which change whenever the file does
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+# Smaller bodies gain nothing from compression once headers are counted
+MIN_COMPRESS_BYTES = 1024
+_ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+_COMPRESS_CHUNK = 1024 * 1024
+
+
+def send_cached_file(directory, filename, mimetype=None, immutable=False):
+    """send_from_directory with validators, ranges and an explicit caching policy.
+
+    Werkzeug already answers If-None-Match / If-Modified-Since with 304 and
+    Range with 206; this adds the Cache-Control policy. immutable responses
+    may be reused for a year without revalidation, everything else is
+    revalidated on every use.
+    """
+    response = send_from_directory(directory, filename, mimetype=mimetype, conditional=True, etag=True,
+                                   max_age=IMMUTABLE_MAX_AGE if immutable else None)
+    response.accept_ranges = 'bytes'
+    if immutable:
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+    else:
+        response.cache_control.no_cache = True
+    return response
+
+
+def _accepted_encodings():
+    accepted = request.accept_encodings
+    for encoding, suffix in _ENCODINGS:
+        if encoding == 'br' and brotli is None:
+            continue
+        if accepted[encoding] > 0:
+            yield encoding, suffix
+
+
+def _compress(source_path, encoding, target_path):
+    """Write an encoded copy of source_path in chunks, publishing it with a rename once complete."""
+    directory = os.path.dirname(target_path)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as out, open(source_path, 'rb') as src:
+            if encoding == 'br':
+                compressor = brotli.Compressor(quality=5)
+                for chunk in iter(lambda: src.read(_COMPRESS_CHUNK), b''):
+                    out.write(compressor.process(chunk))
+                out.write(compressor.finish())
+            else:
+                with gzip.GzipFile(fileobj=out, mode='wb', compresslevel=6, mtime=0) as gz:
+                    shutil.copyfileobj(src, gz)
+        os.replace(tmp_path, target_path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+def write_json_export(path, chunks):
+    """Write generated JSON text chunks to path, replacing it atomically.
+
+    Routes that build a document on the fly write it here once, then serve
+    it with send_compressed_json like any other JSON file.
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as out:
+            for chunk in chunks:
+                out.write(chunk)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+def send_compressed_json(directory, filename):
+    """Serve a JSON file, gzip/brotli encoded when the client accepts it.
+
+    Encoded copies are written once next to the source (name.json.gz/.br) and
+    rebuilt when the source is newer, so repeat requests are a plain file send
+    with its own ETag and range support.
+    """
+    source_path = safe_join(directory, filename)
+    if source_path is None or not os.path.isfile(source_path):
+        return send_cached_file(directory, filename)
+    source_stat = os.stat(source_path)
+    if source_stat.st_size >= MIN_COMPRESS_BYTES:
+        for encoding, suffix in _accepted_encodings():
+            encoded_path = source_path + suffix
+            try:
+                fresh = os.stat(encoded_path).st_mtime_ns >= source_stat.st_mtime_ns
+            except FileNotFoundError:
+                fresh = False
+            if not fresh:
+                _compress(source_path, encoding, encoded_path)
+            response = send_cached_file(directory, filename + suffix, mimetype='application/json')
+            response.content_encoding = encoding
+            response.vary.add('Accept-Encoding')
+            return response
+    response = send_cached_file(directory, filename, mimetype='application/json')
+    response.vary.add('Accept-Encoding')
+    return response
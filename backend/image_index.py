@@ -0,0 +1,196 @@
+import base64
+import bisect
+import json
+import os
+import threading
+import time
+
+SORT_KEYS = ('name', 'mtime')
+# A directory modified this recently may still change within the same mtime tick
+_RACY_WINDOW_NS = 2 * 1000 * 1000 * 1000
+
+
+class ImageIndex:
+    """Sorted in-memory listing of one project's images directory.
+
+    The directory is only rescanned when its mtime changes, so listing a
+    200k-image project is a memory read instead of a listdir plus one stat
+    per file. Uploads and deletes made through the app update the index in
+    place; changes made by other processes are picked up through the mtime
+    check. Per-file mtimes are only collected once something sorts by them.
+    """
+
+    def __init__(self, images_dir):
+        self.images_dir = images_dir
+        self._names = []
+        self._by_mtime = None
+        self._mtimes = {}
+        self._dir_mtime_ns = None
+        self._racy = False
+        self._lock = threading.Lock()
+
+    def _refresh(self):
+        try:
+            dir_mtime_ns = os.stat(self.images_dir).st_mtime_ns
+        except FileNotFoundError:
+            self._names, self._by_mtime, self._mtimes, self._dir_mtime_ns = [], None, {}, None
+            return
+        if dir_mtime_ns == self._dir_mtime_ns and not self._needs_recheck(dir_mtime_ns):
+            return
+        with os.scandir(self.images_dir) as entries:
+            # DirEntry.is_file uses the d_type from the listing, so no per-file stat
+            self._names = sorted(entry.name for entry in entries if entry.is_file())
+        self._by_mtime = None
+        self._mtimes = {}
+        self._dir_mtime_ns = dir_mtime_ns
+        self._racy = time.time_ns() - dir_mtime_ns < _RACY_WINDOW_NS
+
+    def _needs_recheck(self, dir_mtime_ns):
+        """A listing taken within the directory's current mtime tick may have missed a later
+        write in that tick, so it is rescanned once after the window has passed."""
+        return self._racy and time.time_ns() - dir_mtime_ns >= _RACY_WINDOW_NS
+
+    def _mtime_keys(self):
+        if self._by_mtime is None:
+            for name in self._names:
+                if name not in self._mtimes:
+                    try:
+                        self._mtimes[name] = os.stat(os.path.join(self.images_dir, name)).st_mtime_ns
+                    except FileNotFoundError:
+                        self._mtimes[name] = 0
+            self._by_mtime = sorted((self._mtimes[name], name) for name in self._names)
+        return self._by_mtime
+
+    def _mark_current(self):
+        try:
+            self._dir_mtime_ns = os.stat(self.images_dir).st_mtime_ns
+        except FileNotFoundError:
+            self._dir_mtime_ns = None
+        # Other writers may have touched the directory in the same tick; verify once later
+        self._racy = True
+
+    def names(self):
+        with self._lock:
+            self._refresh()
+            return list(self._names)
+
+    def count(self):
+        with self._lock:
+            self._refresh()
+            return len(self._names)
+
+    def __contains__(self, name):
+        with self._lock:
+            self._refresh()
+            i = bisect.bisect_left(self._names, name)
+            return i < len(self._names) and self._names[i] == name
+
+    def add(self, names):
+        """Record files just written to the directory."""
+        with self._lock:
+            if self._dir_mtime_ns is None:
+                self._refresh()
+                return
+            for name in names:
+                i = bisect.bisect_left(self._names, name)
+                if i == len(self._names) or self._names[i] != name:
+                    self._names.insert(i, name)
+                self._mtimes.pop(name, None)
+            self._by_mtime = None
+            self._mark_current()
+
+    def remove(self, names):
+        """Forget files just deleted from the directory."""
+        with self._lock:
+            if self._dir_mtime_ns is None:
+                self._refresh()
+                return
+            for name in names:
+                i = bisect.bisect_left(self._names, name)
+                if i < len(self._names) and self._names[i] == name:
+                    del self._names[i]
+                self._mtimes.pop(name, None)
+            self._by_mtime = None
+            self._mark_current()
+
+    def page(self, limit=None, cursor=None, prefix='', sort='name', descending=False):
+        """Return (names, next_cursor) for one page of the listing.
+
+        cursor is the opaque value returned by the previous page; next_cursor
+        is None on the last page. Cursors stay valid across uploads and
+        deletes because they encode the last key seen, not an offset.
+        """
+        if sort not in SORT_KEYS:
+            raise ValueError(f'sort must be one of {list(SORT_KEYS)}')
+        after = decode_cursor(cursor) if cursor else None
+        with self._lock:
+            self._refresh()
+            if sort == 'name':
+                keys = self._names
+                lo = bisect.bisect_left(keys, prefix)
+                hi = bisect.bisect_left(keys, prefix + '\U0010ffff') if prefix else len(keys)
+                key_of = lambda k: k
+                if after is not None:
+                    after = after[1]
+            else:
+                keys = self._mtime_keys()
+                lo, hi = 0, len(keys)
+                key_of = lambda k: k[1]
+                if after is not None:
+                    if not isinstance(after[0], int):
+                        raise ValueError('Invalid cursor')
+                    after = tuple(after)
+            if after is not None:
+                if descending:
+                    hi = min(hi, bisect.bisect_left(keys, after, lo, hi))
+                else:
+                    lo = max(lo, bisect.bisect_right(keys, after, lo, hi))
+            selected = []
+            last = None
+            indices = range(hi - 1, lo - 1, -1) if descending else range(lo, hi)
+            for i in indices:
+                if sort != 'name' and prefix and not key_of(keys[i]).startswith(prefix):
+                    continue
+                if limit is not None and len(selected) == limit:
+                    return selected, encode_cursor(last)
+                selected.append(key_of(keys[i]))
+                last = keys[i]
+        return selected, None
+
+
+def encode_cursor(key):
+    if isinstance(key, str):
+        key = [None, key]
+    raw = json.dumps(list(key)).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        key = json.loads(raw)
+        if not isinstance(key, list) or len(key) != 2:
+            raise ValueError
+        return key
+    except (ValueError, TypeError):
+        raise ValueError('Invalid cursor')
+
+
+class ImageIndexes:
+    """One ImageIndex per project images directory, created on first use."""
+
+    def __init__(self):
+        self._indexes = {}
+        self._lock = threading.Lock()
+
+    def get(self, images_dir):
+        images_dir = os.path.abspath(images_dir)
+        with self._lock:
+            index = self._indexes.get(images_dir)
+            if index is None:
+                index = self._indexes[images_dir] = ImageIndex(images_dir)
+            return index
+
+    def drop(self, images_dir):
+        with self._lock:
+            self._indexes.pop(os.path.abspath(images_dir), None)
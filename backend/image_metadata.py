@@ -0,0 +1,231 @@
+import hashlib
+import os
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image
+
+from near_duplicates import dhash, to_signed, to_unsigned
+
+METADATA_FILENAME = 'image_metadata.sqlite'
+_HASH_CHUNK = 1024 * 1024
+_COMMIT_EVERY = 500
+# Bits per channel for each Pillow mode; 16-bit infrared frames open as I;16 / I
+_BIT_DEPTHS = {'1': 1, 'L': 8, 'P': 8, 'LA': 8, 'PA': 8, 'RGB': 8, 'RGBA': 8, 'RGBX': 8, 'CMYK': 8,
+               'YCbCr': 8, 'LAB': 8, 'HSV': 8, 'I;16': 16, 'I;16L': 16, 'I;16B': 16, 'I;16N': 16,
+               'I': 32, 'F': 32}
+HEADER_COLUMNS = ('width', 'height', 'format', 'mode', 'channels', 'bit_depth')
+# Header fields plus the perceptual hash used for near-duplicate detection
+INFO_COLUMNS = HEADER_COLUMNS + ('dhash',)
+_COLUMN_TYPES = {'width': 'INTEGER', 'height': 'INTEGER', 'format': 'TEXT', 'mode': 'TEXT',
+                 'channels': 'INTEGER', 'bit_depth': 'INTEGER', 'dhash': 'INTEGER'}
+
+
+def hash_file(path):
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(_HASH_CHUNK), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def read_header(path):
+    """Dimensions, format and bit depth of an image, parsed from its header only.
+
+    Pillow's open is lazy, so no pixel data is decoded here.
+    """
+    with Image.open(path) as img:
+        return {'width': img.width, 'height': img.height, 'format': img.format, 'mode': img.mode,
+                'channels': len(img.getbands()), 'bit_depth': _BIT_DEPTHS.get(img.mode)}
+
+
+def read_image_info(path):
+    """Header fields plus the image's dHash; this one does decode (at reduced scale for JPEG)."""
+    info = read_header(path)
+    info['dhash'] = dhash(path)
+    return info
+
+
+def describe_file(path):
+    """(sha1, info) for one file; info is None if it is not a readable image.
+
+    sha1 is '' if the file exists but could not be read at all; a file that
+    is gone raises FileNotFoundError.
+    """
+    try:
+        sha1 = hash_file(path)
+    except FileNotFoundError:
+        raise
+    except OSError:
+        return '', None
+    try:
+        info = read_image_info(path)
+    except (OSError, ValueError):
+        info = None
+    return sha1, info
+
+
+class ImageMetadataStore:
+    """Per-project table of what is known about each file in images/.
+
+    Rows are keyed by file name and carry the content hash, the header fields
+    (dimensions, format, mode, channels, bit depth), a perceptual dHash and
+    the size and mtime they were read at, so a changed file is never matched
+    on stale data.
+    """
+
+    def __init__(self, project_dir):
+        self.path = os.path.join(project_dir, METADATA_FILENAME)
+        self.images_dir = os.path.join(project_dir, 'images')
+        self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('CREATE TABLE IF NOT EXISTS images ('
+                           'name TEXT PRIMARY KEY, sha1 TEXT NOT NULL, size INTEGER, mtime_ns INTEGER)')
+        existing = {row[1] for row in self._conn.execute('PRAGMA table_info(images)')}
+        for column in INFO_COLUMNS:
+            if column not in existing:
+                self._conn.execute(f'ALTER TABLE images ADD COLUMN {column} {_COLUMN_TYPES[column]}')
+        if 'unreadable' not in existing:
+            # Set when a file was read but is not a decodable image, so scans do not retry it until it changes
+            self._conn.execute('ALTER TABLE images ADD COLUMN unreadable INTEGER NOT NULL DEFAULT 0')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS images_sha1 ON images (sha1)')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS images_resolution ON images (width, height)')
+        self._conn.commit()
+
+    def close(self):
+        self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _is_current(self, name, size, mtime_ns):
+        try:
+            stat = os.stat(os.path.join(self.images_dir, name))
+        except FileNotFoundError:
+            return False
+        return stat.st_size == size and stat.st_mtime_ns == mtime_ns
+
+    def name_for_hash(self, sha1):
+        """Name of a file in images/ whose content hashes to sha1, or None."""
+        for name, size, mtime_ns in self._conn.execute(
+                'SELECT name, size, mtime_ns FROM images WHERE sha1 = ?', (sha1,)):
+            if self._is_current(name, size, mtime_ns):
+                return name
+        return None
+
+    def hash_of(self, name):
+        """Content hash of images/<name>, hashing and recording it if unknown or stale."""
+        path = os.path.join(self.images_dir, name)
+        stat = os.stat(path)
+        row = self._conn.execute('SELECT sha1, size, mtime_ns FROM images WHERE name = ?', (name,)).fetchone()
+        if row and row[1] == stat.st_size and row[2] == stat.st_mtime_ns:
+            return row[0]
+        sha1 = hash_file(path)
+        self.put(name, sha1)
+        return sha1
+
+    def put(self, name, sha1, info=None, commit=True, unreadable=False):
+        """Record name's hash and info; unreadable marks a file that was read but could not be decoded."""
+        stat = os.stat(os.path.join(self.images_dir, name))
+        info = dict(info or {})
+        if info.get('dhash') is not None:
+            info['dhash'] = to_signed(info['dhash'])
+        self._conn.execute('INSERT OR REPLACE INTO images (name, sha1, size, mtime_ns, unreadable, '
+                           f'{", ".join(INFO_COLUMNS)}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                           (name, sha1, stat.st_size, stat.st_mtime_ns, int(unreadable),
+                            *(info.get(column) for column in INFO_COLUMNS)))
+        if commit:
+            self._conn.commit()
+
+    def get(self, name):
+        """Recorded metadata for name, or None if unknown or the file changed since."""
+        row = self._conn.execute(f'SELECT sha1, size, mtime_ns, {", ".join(INFO_COLUMNS)} '
+                                 'FROM images WHERE name = ?', (name,)).fetchone()
+        if row is None or not self._is_current(name, row[1], row[2]):
+            return None
+        info = dict(zip(('name', 'sha1', 'size', 'mtime_ns') + INFO_COLUMNS, (name,) + row))
+        if info['dhash'] is not None:
+            info['dhash'] = f"{to_unsigned(info['dhash']):016x}"
+        return info
+
+    def stale(self, names):
+        """The names with no row, a row from before the file last changed, or no image info yet.
+
+        Files recorded as unreadable are not stale until their size or mtime changes.
+        """
+        known = {}
+        for name, size, mtime_ns, width, hash_value, unreadable in self._conn.execute(
+                'SELECT name, size, mtime_ns, width, dhash, unreadable FROM images'):
+            known[name] = (size, mtime_ns, bool(unreadable) or (width is not None and hash_value is not None))
+        out = []
+        for name in names:
+            row = known.get(name)
+            if row is None or not row[2] or not self._is_current(name, row[0], row[1]):
+                out.append(name)
+        return out
+
+    def dhashes(self, names):
+        """{name: unsigned dHash} for the names that have one recorded."""
+        wanted = set(names)
+        return {name: to_unsigned(value)
+                for name, value in self._conn.execute('SELECT name, dhash FROM images WHERE dhash IS NOT NULL')
+                if name in wanted}
+
+    def resolution_groups(self, names=None):
+        """{(width, height): [names]} for recorded images, optionally restricted to names."""
+        wanted = set(names) if names is not None else None
+        groups = {}
+        for name, width, height in self._conn.execute(
+                'SELECT name, width, height FROM images WHERE width IS NOT NULL ORDER BY width, height, name'):
+            if wanted is None or name in wanted:
+                groups.setdefault((width, height), []).append(name)
+        return groups
+
+    def commit(self):
+        self._conn.commit()
+
+    def delete(self, name):
+        self._conn.execute('DELETE FROM images WHERE name = ?', (name,))
+        self._conn.commit()
+
+
+def _describe_if_present(path):
+    try:
+        return describe_file(path)
+    except FileNotFoundError:
+        return None
+
+
+def scan_metadata_job(job, project_dir, image_names, workers=4):
+    """Job body recording hashes and image info for images not yet (or no longer) described.
+
+    Files deleted or renamed while the scan runs are skipped; files that
+    cannot be read are recorded as unreadable.
+    """
+    images_dir = os.path.join(project_dir, 'images')
+    with ImageMetadataStore(project_dir) as store:
+        pending = store.stale(image_names)
+        job.update(total=len(pending), message='Reading image info...')
+        unreadable = missing = 0
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            # Hashing releases the GIL, so threads keep several disks/NFS reads in flight
+            results = pool.map(lambda name: _describe_if_present(os.path.join(images_dir, name)), pending)
+            for i, (name, described) in enumerate(zip(pending, results)):
+                job.check_cancelled()
+                job.advance(1)
+                if described is None:
+                    missing += 1
+                    continue
+                sha1, info = described
+                try:
+                    store.put(name, sha1, info, commit=(i + 1) % _COMMIT_EVERY == 0, unreadable=info is None)
+                except FileNotFoundError:
+                    missing += 1
+                    continue
+                unreadable += info is None
+        store.commit()
+    return {'num_images': len(image_names), 'num_scanned': len(pending), 'num_unreadable': unreadable,
+            'num_missing': missing}
@@ -0,0 +1,195 @@
+import hashlib
+import os
+import re
+import shutil
+import tempfile
+import uuid
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+from image_metadata import ImageMetadataStore, read_image_info
+
+SUPPORTED_EXTS = (".jpg", ".jpeg", ".png", ".bmp")
+UPLOADS_DIRNAME = 'uploads'
+_STAGING_DIRNAME = 'staging'
+_COPY_CHUNK = 1024 * 1024
+_COMMIT_EVERY = 500
+_UPLOAD_ID = re.compile(r'^[0-9a-f]{32}$')
+
+
+class UploadOffsetMismatch(Exception):
+    """A chunk was sent for an offset other than the current end of the upload."""
+
+    def __init__(self, offset):
+        super().__init__(f'Upload is at offset {offset}')
+        self.offset = offset
+
+
+def is_image_member(info):
+    if info.is_dir() or '__MACOSX/' in info.filename:
+        return False
+    name = os.path.basename(info.filename)
+    # ._name files are macOS resource forks that happen to keep the image extension
+    return bool(name) and not name.startswith('._') and name.lower().endswith(SUPPORTED_EXTS)
+
+
+def _extract_member(z, info, staging_dir):
+    """Stream one member into a staging file in fixed-size chunks, hashing as it goes.
+
+    Image info (dimensions, format, bit depth, dHash) is read from the staged
+    file while it is still in the page cache.
+    """
+    digest = hashlib.sha1()
+    fd, tmp_path = tempfile.mkstemp(dir=staging_dir, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as out, z.open(info) as src:
+            for chunk in iter(lambda: src.read(_COPY_CHUNK), b''):
+                digest.update(chunk)
+                out.write(chunk)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+    try:
+        info = read_image_info(tmp_path)
+    except (OSError, ValueError):
+        info = None
+    return tmp_path, digest.hexdigest(), info
+
+
+class _Ingest:
+    """Moves extracted members into images/, deciding names one member at a time."""
+
+    def __init__(self, store, images_dir):
+        self.store = store
+        self.images_dir = images_dir
+        self.added = []
+        self.duplicates = []
+        self.collisions = []
+
+    def place(self, member, tmp_path, sha1, info=None):
+        existing = self.store.name_for_hash(sha1)
+        name = os.path.basename(member)
+        if existing is None and os.path.exists(os.path.join(self.images_dir, name)):
+            if self.store.hash_of(name) == sha1:
+                existing = name
+            else:
+                # Same file name, different content: keep both, tagged with the content hash
+                stem, ext = os.path.splitext(name)
+                name = f'{stem}__{sha1[:8]}{ext}'
+                if os.path.exists(os.path.join(self.images_dir, name)):
+                    existing = name
+                else:
+                    self.collisions.append({'member': member, 'saved_as': name})
+        if existing is not None:
+            os.remove(tmp_path)
+            self.duplicates.append({'member': member, 'existing': existing})
+            return
+        os.replace(tmp_path, os.path.join(self.images_dir, name))
+        self.store.put(name, sha1, info, commit=False, unreadable=info is None)
+        self.added.append(name)
+        if len(self.added) % _COMMIT_EVERY == 0:
+            self.store.commit()
+
+    def report(self):
+        return {'added': self.added, 'duplicates': self.duplicates, 'collisions': self.collisions}
+
+
+def ingest_zip(source, project_dir, workers=4, on_member=None):
+    """Extract the images in a zip (path or seekable file) into project_dir/images.
+
+    Members are decompressed by a thread pool straight to disk in 1 MB
+    chunks, so no image is ever held in memory whole. Files whose content is
+    already in the project are skipped and reported as duplicates; a name
+    clash with different content is saved as <stem>__<hash8><ext> and
+    reported as a collision. on_member is called after each member, and may
+    raise to stop the ingest.
+    """
+    images_dir = os.path.join(project_dir, 'images')
+    staging_dir = os.path.join(project_dir, UPLOADS_DIRNAME, _STAGING_DIRNAME)
+    os.makedirs(images_dir, exist_ok=True)
+    os.makedirs(staging_dir, exist_ok=True)
+    with zipfile.ZipFile(source) as z, ImageMetadataStore(project_dir) as store, \
+            ThreadPoolExecutor(max_workers=workers) as pool:
+        # ZipFile serialises the raw reads itself; decompression and writes run in parallel
+        members = iter([info for info in z.infolist() if is_image_member(info)])
+        ingest = _Ingest(store, images_dir)
+        pending = [(info, pool.submit(_extract_member, z, info, staging_dir))
+                   for info in islice(members, workers * 2)]
+        try:
+            while pending:
+                info, future = pending.pop(0)
+                ingest.place(info.filename, *future.result())
+                for next_info in islice(members, 1):
+                    pending.append((next_info, pool.submit(_extract_member, z, next_info, staging_dir)))
+                if on_member:
+                    on_member(info.filename)
+        finally:
+            for _, future in pending:
+                if not future.cancel() and future.exception() is None:
+                    os.remove(future.result()[0])
+            store.commit()
+    return ingest.report()
+
+
+def count_image_members(source):
+    with zipfile.ZipFile(source) as z:
+        return sum(1 for info in z.infolist() if is_image_member(info))
+
+
+def ingest_zip_job(job, zip_path, project_dir, workers, on_added=None, remove_source=False):
+    """Job body for ingesting an uploaded archive; on_added(names) runs once the files are in place."""
+    try:
+        job.update(total=count_image_members(zip_path), message='Extracting images...')
+
+        def on_member(member):
+            job.check_cancelled()
+            job.advance(1)
+
+        # A cancel leaves the members placed so far; the image index picks them up by mtime
+        report = ingest_zip(zip_path, project_dir, workers, on_member)
+        if on_added:
+            on_added(report['added'])
+    finally:
+        if remove_source and os.path.exists(zip_path):
+            os.remove(zip_path)
+    return {'num_added': len(report['added']), 'num_duplicates': len(report['duplicates']),
+            'duplicates': report['duplicates'], 'collisions': report['collisions']}
+
+
+def _upload_path(project_dir, upload_id):
+    if not _UPLOAD_ID.match(upload_id or ''):
+        raise ValueError('Invalid upload id')
+    return os.path.join(project_dir, UPLOADS_DIRNAME, upload_id + '.part')
+
+
+def start_upload(project_dir):
+    """Create an empty resumable upload and return its id."""
+    upload_id = uuid.uuid4().hex
+    path = _upload_path(project_dir, upload_id)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    open(path, 'wb').close()
+    return upload_id
+
+
+def upload_offset(project_dir, upload_id):
+    """Bytes received so far; a client resumes by sending from this offset."""
+    return os.path.getsize(_upload_path(project_dir, upload_id))
+
+
+def append_upload_chunk(project_dir, upload_id, offset, stream):
+    """Append a request body at offset, which must equal the bytes already received."""
+    path = upload_path(project_dir, upload_id)
+    with open(path, 'ab') as f:
+        current = f.tell()
+        if offset != current:
+            raise UploadOffsetMismatch(current)
+        shutil.copyfileobj(stream, f, _COPY_CHUNK)
+        return f.tell()
+
+
+def upload_path(project_dir, upload_id):
+    path = _upload_path(project_dir, upload_id)
+    if not os.path.exists(path):
+        raise FileNotFoundError(upload_id)
+    return path
@@ -0,0 +1,158 @@
+import json
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+FINISHED_STATUSES = ('completed', 'failed', 'cancelled')
+
+
+class JobCancelled(Exception):
+    """Raised inside a job function when its job has been cancelled."""
+
+
+class Job:
+    """State of one background job, shared between its worker and status readers."""
+
+    def __init__(self, kind, project_name, total=0):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.project_name = project_name
+        self.status = 'queued'
+        self.total = total
+        self.done = 0
+        self.message = ''
+        self.error = None
+        self.result = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.cancel_event = threading.Event()
+        self._version = 0
+        self._cond = threading.Condition()
+
+    def update(self, **fields):
+        with self._cond:
+            for name, value in fields.items():
+                setattr(self, name, value)
+            self._version += 1
+            self._cond.notify_all()
+
+    def advance(self, count=1, message=None):
+        """Record count more processed items and wake up anyone streaming progress."""
+        with self._cond:
+            self.done += count
+            if message is not None:
+                self.message = message
+            self._version += 1
+            self._cond.notify_all()
+
+    def check_cancelled(self):
+        if self.cancel_event.is_set():
+            raise JobCancelled()
+
+    def wait_for_change(self, version, timeout):
+        """Block until the job changes after version (or timeout); return the new version."""
+        with self._cond:
+            self._cond.wait_for(lambda: self._version != version, timeout=timeout)
+            return self._version
+
+    @property
+    def finished(self):
+        return self.status in FINISHED_STATUSES
+
+    def snapshot(self):
+        with self._cond:
+            now = self.finished_at or time.time()
+            elapsed = now - self.started_at if self.started_at else 0.0
+            throughput = self.done / elapsed if elapsed > 0 else 0.0
+            remaining = max(self.total - self.done, 0)
+            eta = remaining / throughput if throughput > 0 and not self.finished else None
+            return {
+                'job_id': self.id,
+                'kind': self.kind,
+                'project': self.project_name,
+                'status': self.status,
+                'total': self.total,
+                'done': self.done,
+                'message': self.message,
+                'error': self.error,
+                'result': self.result,
+                'elapsed_s': round(elapsed, 3),
+                'images_per_s': round(throughput, 3),
+                'eta_s': round(eta, 1) if eta is not None else None,
+                'version': self._version,
+            }
+
+
+class JobManager:
+    """Runs job functions on a bounded worker pool and keeps their Job records in jobs.
+
+    Request threads and running jobs both submit and list jobs, so the jobs
+    dict is only touched under _lock.
+    """
+
+    def __init__(self, jobs, max_workers, keep_finished=100):
+        self.jobs = jobs
+        self.keep_finished = keep_finished
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='job')
+
+    def submit(self, kind, project_name, fn, *args, total=0):
+        """Queue fn(job, *args); its return value becomes the job result."""
+        job = Job(kind, project_name, total=total)
+        with self._lock:
+            self._prune()
+            self.jobs[job.id] = job
+        self._executor.submit(self._run, job, fn, args)
+        return job
+
+    def _run(self, job, fn, args):
+        if job.cancel_event.is_set():
+            job.update(status='cancelled', finished_at=time.time())
+            return
+        job.update(status='running', started_at=time.time())
+        try:
+            result = fn(job, *args)
+            job.update(status='completed', result=result, finished_at=time.time())
+        except JobCancelled:
+            job.update(status='cancelled', message='Cancelled', finished_at=time.time())
+        except Exception as e:
+            job.update(status='failed', error=str(e), finished_at=time.time())
+
+    def _prune(self):
+        # Called with _lock held
+        finished = sorted((j for j in self.jobs.values() if j.finished), key=lambda j: j.finished_at)
+        for job in finished[:max(len(finished) - self.keep_finished, 0)]:
+            self.jobs.pop(job.id, None)
+
+    def get(self, job_id):
+        with self._lock:
+            return self.jobs.get(job_id)
+
+    def cancel(self, job_id):
+        job = self.get(job_id)
+        if job is not None and not job.finished:
+            job.cancel_event.set()
+            job.update(message='Cancelling...')
+        return job
+
+    def list(self, project_name=None):
+        with self._lock:
+            return [job for job in self.jobs.values()
+                    if project_name is None or job.project_name == project_name]
+
+
+def sse_events(job, heartbeat_s=15.0):
+    """Yield server-sent events with the job snapshot each time the job changes."""
+    version = None
+    while True:
+        snapshot = job.snapshot()
+        if snapshot['version'] != version:
+            version = snapshot['version']
+            yield f"data: {json.dumps(snapshot)}\n\n"
+        if snapshot['status'] in FINISHED_STATUSES:
+            return
+        if job.wait_for_change(version, heartbeat_s) == version:
+            # Comment line keeps proxies from closing an idle stream
+            yield ': keep-alive\n\n'
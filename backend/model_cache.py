@@ -0,0 +1,77 @@
+import os
+import threading
+from collections import OrderedDict
+
+
+class ModelCache:
+    """In-process LRU cache of loaded models, bounded by an approximate memory budget.
+
+    Entries are keyed by (family, version, mtime) so replacing a weights file on
+    disk invalidates the loaded copy. The size of an entry is estimated from the
+    size of its weights file; models larger than the whole budget are loaded but
+    never kept. Each entry carries a lock for callers whose model is not safe
+    to run from two threads at once.
+    """
+
+    def __init__(self, budget_bytes):
+        self.budget_bytes = budget_bytes
+        self._entries = OrderedDict()
+        self._used_bytes = 0
+        self._lock = threading.Lock()
+        self._load_locks = {}
+
+    def get(self, family, version, path, loader):
+        """Return the cached model for path, loading it with loader(path) on a miss."""
+        return self.get_with_lock(family, version, path, loader)[0]
+
+    def get_with_lock(self, family, version, path, loader):
+        """(model, lock) for path; hold the lock while running a model other jobs may share."""
+        stat = os.stat(path)
+        key = (family, version, stat.st_mtime)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                return entry[0], entry[2]
+            load_lock = self._load_locks.setdefault(key, threading.Lock())
+        # Only one thread loads a given model; the others wait and reuse it
+        with load_lock:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None:
+                    self._entries.move_to_end(key)
+                    return entry[0], entry[2]
+            model = loader(path)
+            use_lock = threading.Lock()
+            with self._lock:
+                self._load_locks.pop(key, None)
+                self._insert(key, model, stat.st_size, use_lock)
+            return model, use_lock
+
+    def _insert(self, key, model, size, use_lock):
+        # Drop copies loaded from an older version of the same file
+        for old_key in [k for k in self._entries if k[:2] == key[:2]]:
+            self._used_bytes -= self._entries.pop(old_key)[1]
+        if size > self.budget_bytes:
+            return
+        self._entries[key] = (model, size, use_lock)
+        self._used_bytes += size
+        while self._used_bytes > self.budget_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._used_bytes -= evicted[1]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._used_bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'budget_bytes': self.budget_bytes,
+                'used_bytes': self._used_bytes,
+                'models': [
+                    {'family': k[0], 'version': k[1], 'mtime': k[2], 'size_bytes': v[1]}
+                    for k, v in self._entries.items()
+                ],
+            }
@@ -0,0 +1,115 @@
+from itertools import combinations
+
+import numpy as np
+from PIL import Image
+
+HASH_BITS = 64
+# Four 16-bit chunks; two hashes within radius r share a chunk within r // 4 bits of each other
+_CHUNKS = 4
+_CHUNK_BITS = HASH_BITS // _CHUNKS
+_CHUNK_MASK = (1 << _CHUNK_BITS) - 1
+# Beyond this the per-chunk probe sets grow too large to beat a linear scan
+MAX_RADIUS = 11
+DEFAULT_RADIUS = 5
+_HIGH_BIT_MODES = ('I;16', 'I;16L', 'I;16B', 'I;16N', 'I', 'F')
+_POPCOUNT8 = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+
+def dhash(path):
+    """64-bit difference hash: one bit per horizontal gradient on a 9x8 grayscale thumbnail."""
+    with Image.open(path) as img:
+        # JPEGs decode straight at 1/8 scale; other formats are reduced in a single box filter pass
+        img.draft('L', (64, 64))
+        if img.mode in _HIGH_BIT_MODES:
+            # 16-bit infrared frames: stretch to 8 bits first, converting would clip them to white
+            arr = np.asarray(img, dtype=np.float32)
+            lo, hi = float(arr.min()), float(arr.max())
+            img = Image.fromarray(((arr - lo) * (255.0 / ((hi - lo) or 1.0))).astype(np.uint8))
+        small = np.asarray(img.convert('L').resize((9, 8), Image.BOX), dtype=np.int16)
+    bits = (small[:, 1:] > small[:, :-1]).ravel()
+    return int(np.packbits(bits).view('>u8')[0])
+
+
+def to_signed(value):
+    """Map an unsigned 64-bit hash into SQLite's signed INTEGER range and back with to_unsigned."""
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+def to_unsigned(value):
+    return value + (1 << 64) if value < 0 else value
+
+
+def popcount(values):
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(values)
+    return _POPCOUNT8[values.view(np.uint8).reshape(-1, 8)].sum(axis=1)
+
+
+def _chunk_probes(value, flips):
+    """All 16-bit values within flips bits of value."""
+    probes = [value]
+    for n in range(1, flips + 1):
+        for bits in combinations(range(_CHUNK_BITS), n):
+            probe = value
+            for bit in bits:
+                probe ^= 1 << bit
+            probes.append(probe)
+    return np.array(probes, dtype=np.uint16)
+
+
+class HammingIndex:
+    """Multi-index hashing over 64-bit hashes for Hamming-radius lookups.
+
+    Each 16-bit chunk of every hash is kept in a sorted table. By the pigeonhole
+    principle a hash within radius r of a query matches it on at least one
+    chunk to within r // 4 bits, so a query only probes those few chunk values
+    and verifies the candidates with a vectorized popcount.
+    """
+
+    def __init__(self, hashes):
+        self.hashes = np.asarray(hashes, dtype=np.uint64)
+        self._tables = []
+        for c in range(_CHUNKS):
+            keys = ((self.hashes >> np.uint64(c * _CHUNK_BITS)) & np.uint64(_CHUNK_MASK)).astype(np.uint16)
+            order = np.argsort(keys, kind='stable')
+            self._tables.append((keys[order], order))
+
+    def __len__(self):
+        return len(self.hashes)
+
+    def query(self, value, radius=DEFAULT_RADIUS):
+        """Indices of all hashes within radius bits of value, ascending."""
+        if not 0 <= radius <= MAX_RADIUS:
+            raise ValueError(f'radius must be between 0 and {MAX_RADIUS}')
+        flips = radius // _CHUNKS
+        candidates = []
+        for c, (sorted_keys, order) in enumerate(self._tables):
+            probes = _chunk_probes((value >> (c * _CHUNK_BITS)) & _CHUNK_MASK, flips)
+            starts = np.searchsorted(sorted_keys, probes, side='left')
+            ends = np.searchsorted(sorted_keys, probes, side='right')
+            candidates.extend(order[s:e] for s, e in zip(starts, ends) if e > s)
+        if not candidates:
+            return np.empty(0, dtype=np.int64)
+        candidates = np.unique(np.concatenate(candidates))
+        distances = popcount(self.hashes[candidates] ^ np.uint64(value))
+        return candidates[distances <= radius]
+
+
+def cluster_representatives(hashes, radius=DEFAULT_RADIUS):
+    """Greedy leader clustering: returns (representative indices, cluster id per hash).
+
+    Hashes are visited in input order; the first unassigned one becomes a
+    representative and claims every unassigned hash within radius of it.
+    """
+    index = HammingIndex(hashes)
+    cluster_of = np.full(len(index), -1, dtype=np.int64)
+    representatives = []
+    for i in range(len(index)):
+        if cluster_of[i] >= 0:
+            continue
+        members = index.query(int(index.hashes[i]), radius)
+        members = members[cluster_of[members] < 0]
+        cluster_of[members] = len(representatives)
+        cluster_of[i] = len(representatives)
+        representatives.append(i)
+    return representatives, cluster_of
@@ -0,0 +1,78 @@
+import hashlib
+import json
+import os
+import sqlite3
+
+CACHE_FILENAME = 'prediction_cache.sqlite'
+_HASH_CHUNK = 1024 * 1024
+_QUERY_CHUNK = 500
+
+
+class PredictionCache:
+    """Content-addressed store of per-image predictions inside a project directory.
+
+    A prediction is keyed by the hash of the image bytes, the hash of the model
+    file and the inference parameters, so renamed or re-uploaded images and
+    overlapping subsets reuse earlier work. File hashes are memoized by
+    (size, mtime) so unchanged files are only read once.
+    """
+
+    def __init__(self, project_dir):
+        self.path = os.path.join(project_dir, CACHE_FILENAME)
+        # Used by one thread at a time, but not always the one that opened it
+        self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('CREATE TABLE IF NOT EXISTS file_hashes ('
+                           'path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, sha1 TEXT)')
+        self._conn.execute('CREATE TABLE IF NOT EXISTS predictions (key TEXT PRIMARY KEY, data TEXT)')
+        self._conn.commit()
+
+    def close(self):
+        self._conn.close()
+
+    def file_hash(self, path):
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        row = self._conn.execute('SELECT size, mtime_ns, sha1 FROM file_hashes WHERE path = ?', (path,)).fetchone()
+        if row and row[0] == stat.st_size and row[1] == stat.st_mtime_ns:
+            return row[2]
+        digest = hashlib.sha1()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(_HASH_CHUNK), b''):
+                digest.update(chunk)
+        sha1 = digest.hexdigest()
+        self._conn.execute('INSERT OR REPLACE INTO file_hashes VALUES (?, ?, ?, ?)',
+                           (path, stat.st_size, stat.st_mtime_ns, sha1))
+        return sha1
+
+    def file_hashes(self, paths):
+        hashes = [self.file_hash(p) for p in paths]
+        self._conn.commit()
+        return hashes
+
+    @staticmethod
+    def prediction_key(image_hash, model_hash, params):
+        raw = json.dumps([image_hash, model_hash, params], sort_keys=True)
+        return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+    def get_many(self, keys):
+        """Return {key: prediction} for the keys that are cached."""
+        found = {}
+        unique = list(dict.fromkeys(keys))
+        for start in range(0, len(unique), _QUERY_CHUNK):
+            chunk = unique[start:start + _QUERY_CHUNK]
+            placeholders = ','.join('?' * len(chunk))
+            for key, data in self._conn.execute(
+                    f'SELECT key, data FROM predictions WHERE key IN ({placeholders})', chunk):
+                found[key] = json.loads(data)
+        return found
+
+    def put_many(self, items):
+        """Store (key, prediction) pairs and commit, so they survive a crash or cancel."""
+        self._conn.executemany('INSERT OR REPLACE INTO predictions VALUES (?, ?)',
+                               [(key, json.dumps(pred)) for key, pred in items])
+        self._conn.commit()
+
+    def clear(self):
+        self._conn.execute('DELETE FROM predictions')
+        self._conn.commit()
@@ -0,0 +1,249 @@
+import json
+import os
+import shutil
+import threading
+import time
+
+import numpy as np
+
+RESULTS_FILENAME = 'auto_annotate_results.json'
+RESULTS_LOG_FILENAME = 'auto_annotate_results.jsonl'
+# A run's {image: predictions} document, written into its directory when first requested
+RESULTS_EXPORT_FILENAME = 'results.json'
+# Columnar runs live in predictions/<run>/; CURRENT names the one readers should use
+PREDICTIONS_DIRNAME = 'predictions'
+_CURRENT_FILENAME = 'CURRENT'
+# Column name -> values per detection; every column is float32, as the engines produce
+_COLUMNS = {'boxes': 4, 'scores': 1, 'classes': 1}
+_WRITE_CHUNK = 1000
+
+
+class PredictionLogWriter:
+    """Append-only JSON Lines log with one {"image", "predictions"} record per image.
+
+    Records are flushed after every write_many call so readers see partial
+    results while a run is in progress and a crash loses at most one batch.
+    """
+
+    def __init__(self, path, truncate=True):
+        self.path = path
+        self._f = open(path, 'w' if truncate else 'a', encoding='utf-8')
+
+    def write_many(self, items):
+        for image_name, predictions in items:
+            self._f.write(json.dumps({'image': image_name, 'predictions': predictions}) + '\n')
+        self._f.flush()
+
+    def close(self):
+        self._f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def iter_prediction_log(path):
+    """Yield (offset, image_name, predictions) for each complete record in the log."""
+    with open(path, 'rb') as f:
+        offset = 0
+        for line in f:
+            try:
+                record = json.loads(line)
+                yield offset, record['image'], record['predictions']
+            except (ValueError, KeyError):
+                # A torn final line from a crashed writer; everything before it is intact
+                pass
+            offset += len(line)
+
+
+def iter_latest_records(log_path, image_names=None):
+    """Yield (image_name, predictions) from the log, keeping the last record per image.
+
+    Entries follow image_names order when given, otherwise first-seen log
+    order. Only one record is held in memory at a time.
+    """
+    offsets = {}
+    for offset, image_name, _ in iter_prediction_log(log_path):
+        offsets[image_name] = offset
+    order = offsets if image_names is None else [n for n in dict.fromkeys(image_names) if n in offsets]
+    with open(log_path, 'rb') as log:
+        for image_name in order:
+            log.seek(offsets[image_name])
+            yield image_name, json.loads(log.readline())['predictions']
+
+
+def iter_results_json(items):
+    """Yield a {image: predictions} JSON document, one entry per line, for (image_name, predictions) items."""
+    yield '{'
+    for i, (image_name, predictions) in enumerate(items):
+        yield f"{',' if i else ''}\n{json.dumps(image_name)}: {json.dumps(predictions)}"
+    yield '\n}\n'
+
+
+def iter_prediction_results(path):
+    """Yield (image_name, predictions) from a results file without loading it whole.
+
+    Files written from iter_results_json hold one entry per line and are
+    parsed line by line; other layouts (e.g. indented JSON) fall back to json.load.
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        if f.readline().strip() == '{':
+            yielded = False
+            for line in f:
+                if line.rstrip() == '}':
+                    return
+                try:
+                    # Compacted entries start at column 0; indented JSON spreads them over lines
+                    if not line.startswith('"'):
+                        raise ValueError('Not a compacted results file')
+                    (entry,) = json.loads('{' + line.rstrip().rstrip(',') + '}').items()
+                except ValueError:
+                    if yielded:
+                        raise
+                    break
+                yielded = True
+                yield entry
+            else:
+                return
+    with open(path, 'r', encoding='utf-8') as f:
+        yield from json.load(f).items()
+
+
+def _raw_to_npy(raw_path, npy_path, shape):
+    """Prefix a raw little-endian float32 file with an .npy header so np.load can memory-map it."""
+    with open(npy_path, 'wb') as out, open(raw_path, 'rb') as raw:
+        np.lib.format.write_array_header_1_0(out, {'descr': '<f4', 'fortran_order': False, 'shape': shape})
+        shutil.copyfileobj(raw, out, 1024 * 1024)
+    os.remove(raw_path)
+
+
+def write_prediction_columns(items, project_dir):
+    """Store (image_name, predictions) items as a new columnar run and make it current.
+
+    Each column is one contiguous float32 .npy array over every detection
+    of the run, and offsets.npy gives image i the rows offsets[i]:offsets[i + 1],
+    so one image's predictions are a slice of a memory map. Items are
+    streamed to disk a chunk at a time. Returns the number of images.
+    """
+    predictions_dir = os.path.join(project_dir, PREDICTIONS_DIRNAME)
+    run = f'run_{time.time_ns()}'
+    run_dir = os.path.join(predictions_dir, run)
+    os.makedirs(run_dir)
+    names = []
+    counts = []
+    raw = {column: open(os.path.join(run_dir, column + '.raw'), 'wb') for column in _COLUMNS}
+    try:
+        pending = {column: [] for column in _COLUMNS}
+        for image_name, predictions in items:
+            names.append(image_name)
+            counts.append(sum(len(p.get('scores', [])) for p in predictions))
+            for p in predictions:
+                for column in _COLUMNS:
+                    pending[column].extend(p.get(column, []))
+            if len(names) % _WRITE_CHUNK == 0:
+                for column, values in pending.items():
+                    raw[column].write(np.asarray(values, dtype='<f4').tobytes())
+                    values.clear()
+        for column, values in pending.items():
+            raw[column].write(np.asarray(values, dtype='<f4').tobytes())
+    finally:
+        for f in raw.values():
+            f.close()
+    total = sum(counts)
+    for column, width in _COLUMNS.items():
+        _raw_to_npy(os.path.join(run_dir, column + '.raw'), os.path.join(run_dir, column + '.npy'),
+                    (total, width) if width > 1 else (total,))
+    np.save(os.path.join(run_dir, 'offsets.npy'), np.concatenate(([0], np.cumsum(counts, dtype=np.int64))))
+    with open(os.path.join(run_dir, 'names.json'), 'w', encoding='utf-8') as f:
+        json.dump(names, f)
+    current_path = os.path.join(predictions_dir, _CURRENT_FILENAME)
+    with open(current_path + '.tmp', 'w', encoding='utf-8') as f:
+        f.write(run)
+    os.replace(current_path + '.tmp', current_path)
+    # Readers holding a memory map of an older run keep it; the files vanish once they close
+    for entry in os.listdir(predictions_dir):
+        if entry.startswith('run_') and entry != run:
+            shutil.rmtree(os.path.join(predictions_dir, entry), ignore_errors=True)
+    return len(names)
+
+
+def _load_column(path):
+    try:
+        return np.load(path, mmap_mode='r')
+    except ValueError:
+        # A run without detections has zero-length arrays, which cannot be memory-mapped
+        return np.load(path)
+
+
+class PredictionColumns:
+    """Read side of a columnar run: memory-mapped arrays plus an image name index."""
+
+    def __init__(self, run_dir):
+        self.run_dir = run_dir
+        self.run = os.path.basename(run_dir)
+        self.boxes = _load_column(os.path.join(run_dir, 'boxes.npy'))
+        self.scores = _load_column(os.path.join(run_dir, 'scores.npy'))
+        self.classes = _load_column(os.path.join(run_dir, 'classes.npy'))
+        self.offsets = np.load(os.path.join(run_dir, 'offsets.npy'))
+        with open(os.path.join(run_dir, 'names.json'), 'r', encoding='utf-8') as f:
+            self.names = json.load(f)
+        self._index = None
+
+    def __len__(self):
+        return len(self.names)
+
+    def index_of(self, image_name):
+        if self._index is None:
+            self._index = {name: i for i, name in enumerate(self.names)}
+        return self._index.get(image_name)
+
+    def predictions_at(self, i):
+        """Image i's predictions in the results-file layout: a one-element list of box/score/class lists."""
+        start, end = int(self.offsets[i]), int(self.offsets[i + 1])
+        return [{'boxes': self.boxes[start:end].tolist(), 'scores': self.scores[start:end].tolist(),
+                 'classes': self.classes[start:end].tolist()}]
+
+    def get(self, image_name):
+        i = self.index_of(image_name)
+        return None if i is None else self.predictions_at(i)
+
+    def __iter__(self):
+        for i, name in enumerate(self.names):
+            yield name, self.predictions_at(i)
+
+
+_open_columns = {}
+_open_columns_lock = threading.Lock()
+
+
+def current_prediction_columns(project_dir):
+    """The project's current PredictionColumns, or None if it has no predictions.
+
+    A project whose only results are an auto_annotate_results.json from
+    before columnar runs is converted on first use; the JSON is left as is.
+    Opened runs are cached and reopened only when a new run becomes current.
+    """
+    predictions_dir = os.path.join(project_dir, PREDICTIONS_DIRNAME)
+    current_path = os.path.join(predictions_dir, _CURRENT_FILENAME)
+    legacy_path = os.path.join(project_dir, RESULTS_FILENAME)
+    key = os.path.abspath(project_dir)
+    with _open_columns_lock:
+        for attempt in range(2):
+            if not os.path.exists(current_path):
+                if not os.path.exists(legacy_path):
+                    return None
+                write_prediction_columns(iter_prediction_results(legacy_path), project_dir)
+            with open(current_path, 'r', encoding='utf-8') as f:
+                run = f.read().strip()
+            columns = _open_columns.get(key)
+            if columns is not None and columns.run == run:
+                return columns
+            try:
+                columns = _open_columns[key] = PredictionColumns(os.path.join(predictions_dir, run))
+                return columns
+            except FileNotFoundError:
+                # A newer run replaced this one between reading CURRENT and opening it
+                if attempt:
+                    raise
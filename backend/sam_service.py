@@ -0,0 +1,228 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+try:
+    import torch
+    from segment_anything import SamPredictor, sam_model_registry
+except ImportError:
+    torch = None
+    SamPredictor = None
+    sam_model_registry = None
+
+try:
+    import cv2
+except ImportError:
+    cv2 = None
+
+EMBEDDINGS_DIRNAME = 'sam_embeddings'
+
+
+def sam_model_type(model_version):
+    """Map a checkpoint name such as sam_vit_b.pth to its registry key (vit_b)."""
+    for model_type in ('vit_h', 'vit_l', 'vit_b'):
+        if model_type in model_version:
+            return model_type
+    raise ValueError(f'Cannot tell SAM model type from {model_version}')
+
+
+class EmbeddingCache:
+    """Two-level cache of SAM image embeddings: a small in-memory LRU over .npz files on disk.
+
+    Entries are keyed by model version and the image's path, size and mtime, so
+    an edited image gets a new embedding. The disk level is trimmed by least
+    recent access once it grows past disk_budget_bytes.
+    """
+
+    def __init__(self, memory_items, disk_budget_bytes):
+        self.memory_items = memory_items
+        self.disk_budget_bytes = disk_budget_bytes
+        self._memory = OrderedDict()
+        self._disk_usage = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(model_version, image_path):
+        stat = os.stat(image_path)
+        raw = f'{model_version}|{os.path.abspath(image_path)}|{stat.st_size}|{stat.st_mtime_ns}'
+        return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def _disk_path(project_dir, key):
+        return os.path.join(project_dir, EMBEDDINGS_DIRNAME, key[:2], key + '.npz')
+
+    def get(self, project_dir, key):
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                self._memory.move_to_end(key)
+                return entry
+        path = self._disk_path(project_dir, key)
+        if not os.path.exists(path):
+            return None
+        with np.load(path) as data:
+            entry = (data['features'].astype(np.float32),
+                     tuple(int(v) for v in data['original_size']), tuple(int(v) for v in data['input_size']))
+        os.utime(path)
+        self._remember(key, entry)
+        return entry
+
+    def contains(self, project_dir, key):
+        return key in self._memory or os.path.exists(self._disk_path(project_dir, key))
+
+    def put(self, project_dir, key, entry):
+        """Store entry and return it as get will: features rounded to float16, held as float32.
+
+        Disk copies are float16 to halve their size; callers decode from the
+        returned entry, so a fresh embedding and a cached one give the decoder
+        exactly the same values.
+        """
+        path = self._disk_path(project_dir, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        features, original_size, input_size = entry
+        features = features.astype(np.float16)
+        tmp_path = path + '.tmp.npz'
+        np.savez(tmp_path, features=features,
+                 original_size=np.array(original_size), input_size=np.array(input_size))
+        os.replace(tmp_path, path)
+        entry = (features.astype(np.float32), tuple(original_size), tuple(input_size))
+        self._remember(key, entry)
+        with self._lock:
+            if project_dir not in self._disk_usage:
+                self._disk_usage[project_dir] = self._trim_disk(project_dir)
+            else:
+                self._disk_usage[project_dir] += os.path.getsize(path)
+                if self._disk_usage[project_dir] > self.disk_budget_bytes:
+                    self._disk_usage[project_dir] = self._trim_disk(project_dir)
+        return entry
+
+    def _remember(self, key, entry):
+        with self._lock:
+            self._memory[key] = entry
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_items:
+                self._memory.popitem(last=False)
+
+    def _trim_disk(self, project_dir):
+        """Delete least recently used files until under budget; returns the remaining size."""
+        root = os.path.join(project_dir, EMBEDDINGS_DIRNAME)
+        files = []
+        for dirpath, _, filenames in os.walk(root):
+            for name in filenames:
+                stat = os.stat(os.path.join(dirpath, name))
+                files.append((stat.st_mtime, stat.st_size, os.path.join(dirpath, name)))
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.disk_budget_bytes:
+                break
+            os.remove(path)
+            total -= size
+        return total
+
+
+class SamService:
+    """Interactive SAM segmentation with embeddings computed once per image.
+
+    Only one SAM checkpoint is held in memory at a time; switching versions
+    releases the previous one, so sam_vit_h never sits next to sam_vit_b.
+    """
+
+    def __init__(self, models_dir, embeddings, device=None):
+        self.models_dir = models_dir
+        self.embeddings = embeddings
+        self.device = device
+        self._model_version = None
+        self._predictor = None
+        self._lock = threading.Lock()
+
+    @property
+    def available(self):
+        return SamPredictor is not None and cv2 is not None
+
+    def _get_predictor(self, model_family, model_version):
+        if self._model_version != (model_family, model_version):
+            self._predictor = None
+            checkpoint = os.path.join(self.models_dir, model_family, model_version)
+            sam = sam_model_registry[sam_model_type(model_version)](checkpoint=checkpoint)
+            device = self.device or ('cuda' if torch.cuda.is_available() else 'cpu')
+            sam.to(device)
+            self._predictor = SamPredictor(sam)
+            self._model_version = (model_family, model_version)
+        return self._predictor
+
+    def _compute_embedding(self, predictor, image_path):
+        image = cv2.imread(image_path)
+        if image is None:
+            raise ValueError(f'Could not read image: {image_path}')
+        predictor.set_image(cv2.cvtColor(image, cv2.COLOR_BGR2RGB))
+        features = predictor.get_image_embedding().cpu().numpy()
+        return features, tuple(predictor.original_size), tuple(predictor.input_size)
+
+    def ensure_embedding(self, project_dir, model_family, model_version, image_path):
+        """Compute and store the embedding for image_path unless it is already cached."""
+        key = self.embeddings.key(model_version, image_path)
+        if self.embeddings.contains(project_dir, key):
+            return False
+        with self._lock:
+            predictor = self._get_predictor(model_family, model_version)
+            entry = self._compute_embedding(predictor, image_path)
+        self.embeddings.put(project_dir, key, entry)
+        return True
+
+    def predict(self, project_dir, model_family, model_version, image_path, points=None, point_labels=None, box=None):
+        """Run the mask decoder for one prompt; points/box are in original image pixels (box is xyxy)."""
+        key = self.embeddings.key(model_version, image_path)
+        entry = self.embeddings.get(project_dir, key)
+        with self._lock:
+            predictor = self._get_predictor(model_family, model_version)
+            if entry is None:
+                entry = self.embeddings.put(project_dir, key, self._compute_embedding(predictor, image_path))
+            features, original_size, input_size = entry
+            # Restore the cached encoder output instead of calling set_image again
+            predictor.reset_image()
+            predictor.features = torch.from_numpy(features).to(predictor.device)
+            predictor.original_size = original_size
+            predictor.input_size = input_size
+            predictor.is_image_set = True
+            masks, scores, _ = predictor.predict(
+                point_coords=np.array(points, dtype=np.float32) if points else None,
+                point_labels=np.array(point_labels, dtype=np.int32) if points else None,
+                box=np.array(box, dtype=np.float32) if box is not None else None,
+                multimask_output=box is None,
+            )
+        best = int(np.argmax(scores))
+        return masks[best], float(scores[best])
+
+
+def mask_to_box(mask):
+    """Tight [x, y, w, h] box around a boolean mask, or None if it is empty."""
+    ys, xs = np.nonzero(mask)
+    if not len(xs):
+        return None
+    x1, y1, x2, y2 = xs.min(), ys.min(), xs.max() + 1, ys.max() + 1
+    return [float(x1), float(y1), float(x2 - x1), float(y2 - y1)]
+
+
+def mask_to_rle(mask):
+    """Uncompressed COCO-style RLE (column-major run lengths starting with zeros)."""
+    flat = mask.ravel(order='F').astype(np.int8)
+    boundaries = np.flatnonzero(np.diff(flat)) + 1
+    counts = np.diff(np.concatenate([[0], boundaries, [flat.size]])).tolist()
+    if flat.size and flat[0]:
+        counts = [0] + counts
+    return {'size': list(mask.shape), 'counts': counts}
+
+
+def precompute_embeddings_job(job, service, project_dir, model_family, model_version, image_paths):
+    """Job body that fills the embedding cache for image_paths in the background."""
+    computed = 0
+    job.update(message='Computing image embeddings...')
+    for image_path in image_paths:
+        job.check_cancelled()
+        if service.ensure_embedding(project_dir, model_family, model_version, image_path):
+            computed += 1
+        job.advance(1, message=f'Embedded {os.path.basename(image_path)}')
+    return {'num_images': len(image_paths), 'num_computed': computed}
@@ -45,6 +45,57 @@ function requestAutoAnnotateDataset(projectName, userOptions = {}) {
     });
 }
 
+// Add a View Predictions button under the status message
+function showViewPredictionsButton(projectName, subsetName) {
+    const statusDiv = document.getElementById('autoAnnotateStatus');
+    if (!statusDiv) return;
+    const viewBtn = document.createElement('button');
+    viewBtn.textContent = 'View Predictions';
+    viewBtn.style.marginLeft = '12px';
+    viewBtn.onclick = function() {
+        // Open the new predictions viewer page with project and subset as params (same tab)
+        window.location.href = `view_predictions.html?project=${encodeURIComponent(projectName)}&subset=${encodeURIComponent(subsetName)}`;
+    };
+    statusDiv.appendChild(viewBtn);
+}
+
+// Follow a background auto-label job through its server-sent progress events
+function followAutoLabelJob(jobId, projectName, subsetName) {
+    const source = new EventSource(`${BACKEND_URL}/api/jobs/${jobId}/events`);
+    source.onmessage = function(event) {
+        const job = JSON.parse(event.data);
+        if (job.status === 'completed') {
+            source.close();
+            showAutoAnnotateStatus(`Inference complete! Labeled ${job.done} image(s) in ${job.elapsed_s.toFixed(1)}s.`);
+            showViewPredictionsButton(projectName, subsetName);
+        } else if (job.status === 'failed') {
+            source.close();
+            showAutoAnnotateStatus('Inference error: ' + job.error, true);
+        } else if (job.status === 'cancelled') {
+            source.close();
+            showAutoAnnotateStatus('Auto-labeling cancelled.', true);
+        } else {
+            let text = `${job.message || 'Running inference...'} ${job.done}/${job.total} images`;
+            if (job.images_per_s > 0) text += ` (${job.images_per_s.toFixed(1)} img/s`;
+            if (job.eta_s !== null) text += `, ETA ${Math.ceil(job.eta_s)}s`;
+            if (job.images_per_s > 0) text += ')';
+            showAutoAnnotateStatus(text);
+        }
+    };
+    source.onerror = function() {
+        // The browser reconnects on its own; fall back to a status poll if the job already ended
+        fetch(`${BACKEND_URL}/api/jobs/${jobId}`)
+            .then(response => response.json())
+            .then(job => {
+                if (job.error && !job.status) {
+                    source.close();
+                    showAutoAnnotateStatus('Job lost: ' + job.error, true);
+                }
+            })
+            .catch(() => {});
+    };
+}
+
 // Fetch and display the list of images for the current project
 function fetchAndDisplayImageList(projectName) {
     fetch(`${BACKEND_URL}/api/projects/${projectName}/images`)
@@ -76,9 +127,9 @@ function showSubsetOptions(projectName, subsetJson) {
             html += `<div><b>Images in this subset (${images.length}):</b></div>`;
             html += '<div style="display:flex;flex-wrap:wrap;gap:10px;margin:10px 0;">' +
                 images.map(img => {
-                    const imgUrl = `${BACKEND_URL}/projects/${projectName}/images/${encodeURIComponent(img)}`;
+                    const imgUrl = `${BACKEND_URL}/projects/${projectName}/thumbnails/128/${encodeURIComponent(img)}`;
                     return `<div style='display:inline-block;text-align:center;'>
-                        <img src='${imgUrl}' alt='${img}' style='width:80px;height:80px;object-fit:cover;display:block;margin-bottom:4px;border:1px solid #ccc;'>
+                        <img src='${imgUrl}' alt='${img}' loading='lazy' style='width:80px;height:80px;object-fit:cover;display:block;margin-bottom:4px;border:1px solid #ccc;'>
                         <span style='font-size:12px;word-break:break-all;'>${img}</span>
                     </div>`;
                 }).join('') + '</div>';
@@ -183,11 +234,20 @@ document.addEventListener('DOMContentLoaded', function() {
     const randomSection = document.getElementById('random-section');
     const randomPercent = document.getElementById('random-percent');
     const randomSubmit = document.getElementById('random-submit');
+    const dedupBtn = document.getElementById('dedup-btn');
+    const dedupSection = document.getElementById('dedup-section');
+    const dedupRadius = document.getElementById('dedup-radius');
+    const dedupSubmit = document.getElementById('dedup-submit');
+    const uncertaintyBtn = document.getElementById('uncertainty-btn');
+    const uncertaintySection = document.getElementById('uncertainty-section');
+    const uncertaintySubmit = document.getElementById('uncertainty-submit');
     const projectName = getCurrentProjectName && getCurrentProjectName();
 
     function hideAllSections() {
         manualSection.style.display = 'none';
         randomSection.style.display = 'none';
+        if (dedupSection) dedupSection.style.display = 'none';
+        if (uncertaintySection) uncertaintySection.style.display = 'none';
         manualForm.innerHTML = '';
     }
 
@@ -236,10 +296,10 @@ document.addEventListener('DOMContentLoaded', function() {
                             return;
                         }
                         manualForm.innerHTML = images.map(img => {
-                            const imgUrl = `${BACKEND_URL}/projects/${projectName}/images/${encodeURIComponent(img)}`;
+                            const imgUrl = `${BACKEND_URL}/projects/${projectName}/thumbnails/128/${encodeURIComponent(img)}`;
                             return `<label style='display:inline-block;margin:8px;text-align:center;'>\
                                 <input type='checkbox' name='images' value='${img}'>\
-                                <img src='${imgUrl}' alt='${img}' style='width:80px;height:80px;object-fit:cover;display:block;margin-bottom:4px;border:1px solid #ccc;'>\
+                                <img src='${imgUrl}' alt='${img}' loading='lazy' style='width:80px;height:80px;object-fit:cover;display:block;margin-bottom:4px;border:1px solid #ccc;'>\
                                 <span style='font-size:12px;word-break:break-all;'>${img}</span>\
                             </label>`;
                         }).join('');
@@ -314,10 +374,104 @@ document.addEventListener('DOMContentLoaded', function() {
                 showAutoAnnotateStatus('Please enter a valid percentage (1-100).', true);
                 return;
             }
+            const body = { percent };
+            const seedInput = document.getElementById('random-seed');
+            if (seedInput && seedInput.value !== '') body.seed = parseInt(seedInput.value, 10);
+            const stratifyInput = document.getElementById('random-stratify');
+            if (stratifyInput && stratifyInput.checked) body.stratify = 'resolution';
             fetch(`${BACKEND_URL}/api/projects/${projectName}/create_random_subset`, {
                 method: 'POST',
                 headers: { 'Content-Type': 'application/json' },
-                body: JSON.stringify({ percent })
+                body: JSON.stringify(body)
+            })
+            .then(response => response.json())
+            .then(function(data) {
+                if (data.message) {
+                    showAutoAnnotateStatus(`${data.message} (seed ${data.seed})`);
+                    fetchAndDisplaySubsets(projectName);
+                    hideAllSections();
+                } else {
+                    showAutoAnnotateStatus('Error: ' + (data.error || 'Unknown error'), true);
+                }
+            })
+            .catch(function(error) {
+                showAutoAnnotateStatus('Request failed: ' + error, true);
+            });
+        });
+    }
+
+    if (dedupBtn) {
+        let dedupActive = false;
+        dedupBtn.addEventListener('click', function() {
+            hideAllSections();
+            dedupActive = !dedupActive;
+            if (dedupActive) dedupSection.style.display = 'block';
+        });
+    }
+
+    if (dedupSubmit) {
+        dedupSubmit.addEventListener('click', function(e) {
+            e.preventDefault();
+            if (!projectName) {
+                showAutoAnnotateStatus('Project name not found. Please select a project.', true);
+                return;
+            }
+            const radius = parseInt(dedupRadius.value, 10);
+            if (isNaN(radius) || radius < 0 || radius > 11) {
+                showAutoAnnotateStatus('Please enter a radius between 0 and 11.', true);
+                return;
+            }
+            fetch(`${BACKEND_URL}/api/projects/${projectName}/create_dedup_subset`, {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({ radius })
+            })
+            .then(response => response.json())
+            .then(function(data) {
+                if (data.message) {
+                    showAutoAnnotateStatus(data.message);
+                    fetchAndDisplaySubsets(projectName);
+                    hideAllSections();
+                } else {
+                    showAutoAnnotateStatus('Error: ' + (data.error || 'Unknown error'), true);
+                }
+            })
+            .catch(function(error) {
+                showAutoAnnotateStatus('Request failed: ' + error, true);
+            });
+        });
+    }
+
+    if (uncertaintyBtn) {
+        let uncertaintyActive = false;
+        uncertaintyBtn.addEventListener('click', function() {
+            hideAllSections();
+            uncertaintyActive = !uncertaintyActive;
+            if (uncertaintyActive) uncertaintySection.style.display = 'block';
+        });
+    }
+
+    if (uncertaintySubmit) {
+        uncertaintySubmit.addEventListener('click', function(e) {
+            e.preventDefault();
+            if (!projectName) {
+                showAutoAnnotateStatus('Project name not found. Please select a project.', true);
+                return;
+            }
+            const count = parseInt(document.getElementById('uncertainty-count').value, 10);
+            if (isNaN(count) || count < 1) {
+                showAutoAnnotateStatus('Please enter a number of images (at least 1).', true);
+                return;
+            }
+            const body = { strategy: document.getElementById('uncertainty-strategy').value, count };
+            if (body.strategy === 'disagreement') {
+                body.compare_model_family = document.getElementById('modelFamily').value;
+                body.compare_model_version = document.getElementById('modelVersion').value;
+            }
+            fetch(`${BACKEND_URL}/api/projects/${projectName}/create_uncertainty_subset`, {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify(body)
             })
             .then(response => response.json())
             .then(function(data) {
@@ -508,20 +662,8 @@ document.addEventListener('DOMContentLoaded', function() {
                                         headers: { 'Content-Type': 'application/json' }
                                     });
                                     const inferData = await inferResp.json();
-                                    if (inferData.message) {
-                                        showAutoAnnotateStatus('Inference complete! ' + inferData.message);
-                                        // Add View Predictions button
-                                        const statusDiv = document.getElementById('autoAnnotateStatus');
-                                        if (statusDiv) {
-                                            const viewBtn = document.createElement('button');
-                                            viewBtn.textContent = 'View Predictions';
-                                            viewBtn.style.marginLeft = '12px';
-                                            viewBtn.onclick = function() {
-                                                // Open the new predictions viewer page with project and subset as params (same tab)
-                                                window.location.href = `view_predictions.html?project=${encodeURIComponent(projectName)}&subset=${encodeURIComponent(subsetName)}`;
-                                            };
-                                            statusDiv.appendChild(viewBtn);
-                                        }
+                                    if (inferData.job_id) {
+                                        followAutoLabelJob(inferData.job_id, projectName, subsetName);
                                     } else if (inferData.error) {
                                         showAutoAnnotateStatus('Inference error: ' + inferData.error, true);
                                     } else {
@@ -606,10 +748,10 @@ function renderSubsetImages(images, projectName) {
     const subsetImagesDiv = document.getElementById('subset-images');
     if (!subsetImagesDiv) return;
     subsetImagesDiv.innerHTML = images.map(img => {
-        const imgUrl = `${BACKEND_URL}/projects/${projectName}/images/${encodeURIComponent(img)}`;
+        const imgUrl = `${BACKEND_URL}/projects/${projectName}/thumbnails/128/${encodeURIComponent(img)}`;
         return `<label style='display:inline-block;margin:8px;text-align:center;'>
             <input type='checkbox' name='subset-images' value='${img}'>
-            <img src='${imgUrl}' alt='${img}' style='width:80px;height:80px;object-fit:cover;display:block;margin-bottom:4px;border:1px solid #ccc;'>
+            <img src='${imgUrl}' alt='${img}' loading='lazy' style='width:80px;height:80px;object-fit:cover;display:block;margin-bottom:4px;border:1px solid #ccc;'>
             <span style='font-size:12px;word-break:break-all;'>${img}</span>
         </label>`;
     }).join('');
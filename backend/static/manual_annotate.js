@@ -44,6 +44,31 @@ function saveAnnotations(imgName, boxes) {
   }).then(res => res.json());
 }
 
+// Ask the backend to turn a click or rough box into a fitted box with SAM
+function samRefine(imgName, prompt) {
+  return fetch(`/api/projects/${encodeURIComponent(projectName)}/sam/predict`, {
+    method: 'POST',
+    headers: {'Content-Type': 'application/json'},
+    body: JSON.stringify(Object.assign({ image: imgName }, prompt))
+  }).then(res => res.json());
+}
+
+// Images around the current one whose SAM embeddings are computed ahead of time
+const SAM_PRECOMPUTE_BEHIND = 2;
+const SAM_PRECOMPUTE_AHEAD = 8;
+
+// Start computing SAM embeddings for the current image and its neighbours in the background
+function samPrecompute() {
+  const nearby = images.slice(currentImageIdx, currentImageIdx + SAM_PRECOMPUTE_AHEAD + 1)
+    .concat(images.slice(Math.max(0, currentImageIdx - SAM_PRECOMPUTE_BEHIND), currentImageIdx));
+  if (!nearby.length) return Promise.resolve({});
+  return fetch(`/api/projects/${encodeURIComponent(projectName)}/sam/precompute`, {
+    method: 'POST',
+    headers: {'Content-Type': 'application/json'},
+    body: JSON.stringify({ images: nearby })
+  }).then(res => res.json()).catch(() => ({}));
+}
+
 function renderImageList() {
   const listDiv = document.getElementById('imageList');
   listDiv.innerHTML = '';
@@ -57,8 +82,9 @@ function renderImageList() {
       listDiv.appendChild(rowDiv);
     }
     const imgElem = document.createElement('img');
-    imgElem.src = `/projects/${encodeURIComponent(projectName)}/images/${encodeURIComponent(img)}`;
+    imgElem.src = `/projects/${encodeURIComponent(projectName)}/thumbnails/128/${encodeURIComponent(img)}`;
     imgElem.className = 'anno-img-thumb' + (idx === currentImageIdx ? ' selected' : '');
+    imgElem.loading = 'lazy';
     imgElem.style.width = '60px';
     imgElem.style.height = '60px';
     imgElem.style.objectFit = 'cover';
@@ -68,6 +94,7 @@ function renderImageList() {
       currentImageIdx = idx;
       loadImage();
       renderImageList();
+      if (currentMode === 'sam') samPrecompute();
     };
     rowDiv.appendChild(imgElem);
   });
@@ -262,6 +289,13 @@ function setupCanvas() {
       canvas.style.cursor = 'crosshair';
     }
   };
+  document.getElementById('samModeRadio').onchange = function() {
+    if (this.checked) {
+      currentMode = 'sam';
+      canvas.style.cursor = 'crosshair';
+      samPrecompute();
+    }
+  };
   document.getElementById('panModeRadio').onchange = function() {
     if (this.checked) {
       currentMode = 'pan';
@@ -313,10 +347,10 @@ function setupCanvas() {
       canvas.style.cursor = 'grabbing';
       return;
     }
-    if (currentMode !== 'draw') return;
+    if (currentMode !== 'draw' && currentMode !== 'sam') return;
     const {x: mx, y: my} = getMousePos(e);
     // Show zoomed area on every click
-    if (isEditing && editBoxIdx !== null) {
+    if (currentMode === 'draw' && isEditing && editBoxIdx !== null) {
       // Editing mode: check for handle or drag
       const box = boxes[editBoxIdx];
       const handleIdx = hitTestHandle(mx, my, box);
@@ -349,9 +383,9 @@ function setupCanvas() {
       drawCanvasWithPreview();
       return;
     }
-    if (currentMode !== 'draw') return;
+    if (currentMode !== 'draw' && currentMode !== 'sam') return;
     const {x: mx, y: my} = getMousePos(e);
-    if (isEditing && editBoxIdx !== null && editDragMode) {
+    if (currentMode === 'draw' && isEditing && editBoxIdx !== null && editDragMode) {
       let box = boxes[editBoxIdx];
       if (editDragMode === 'move') {
         box.x = mx - editDragOffset.x;
@@ -395,6 +429,30 @@ function setupCanvas() {
       canvas.style.cursor = 'grab';
       return;
     }
+    if (currentMode === 'sam' && isDrawing) {
+      isDrawing = false;
+      const {x: mx, y: my} = getMousePos(e);
+      // A drag is a rough box prompt, a plain click is a foreground point
+      const prompt = (previewBox && previewBox.w > 4 && previewBox.h > 4)
+        ? { box: [previewBox.x, previewBox.y, previewBox.w, previewBox.h] }
+        : { points: [[mx, my]], point_labels: [1] };
+      previewBox = null;
+      document.getElementById('annoMsg').innerText = 'Segmenting...';
+      samRefine(images[currentImageIdx], prompt).then(data => {
+        if (data.box) {
+          const [x, y, w, h] = data.box;
+          boxes.push({ x, y, w, h, label: labels[0] || '' });
+          renderLabels();
+          document.getElementById('annoMsg').innerText = `Smart box added (score ${data.score.toFixed(2)})`;
+        } else {
+          document.getElementById('annoMsg').innerText = data.error || 'No object found.';
+        }
+        drawCanvasWithPreview();
+      }).catch(err => {
+        document.getElementById('annoMsg').innerText = 'Smart box failed: ' + err;
+      });
+      return;
+    }
     if (currentMode !== 'draw') return;
     if (isEditing && editBoxIdx !== null && editDragMode) {
       editDragMode = null;
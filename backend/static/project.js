@@ -7,6 +7,79 @@ function getProjectName() {
   return params.get('name');
 }
 
+const PREVIEW_COUNT = 12;
+// Archives above this size go through the resumable chunked upload API
+const CHUNKED_UPLOAD_THRESHOLD = 64 * 1024 * 1024;
+const UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024;
+const UPLOAD_RETRIES = 5;
+
+function uploadZipSingle(projectName, file) {
+  const formData = new FormData();
+  formData.append('file', file);
+  return fetch(`/api/projects/${encodeURIComponent(projectName)}/upload`, {
+    method: 'POST',
+    body: formData
+  }).then(res => res.json());
+}
+
+function waitForJob(jobId, onProgress) {
+  return new Promise((resolve, reject) => {
+    const source = new EventSource(`/api/jobs/${encodeURIComponent(jobId)}/events`);
+    source.onmessage = function(event) {
+      const job = JSON.parse(event.data);
+      onProgress(job);
+      if (['completed', 'failed', 'cancelled'].includes(job.status)) {
+        source.close();
+        job.status === 'completed' ? resolve(job.result) : reject(new Error(job.error || job.status));
+      }
+    };
+    source.onerror = function() {
+      source.close();
+      reject(new Error('Lost connection to the server'));
+    };
+  });
+}
+
+async function uploadZipChunked(projectName, file, onProgress) {
+  const base = `/api/projects/${encodeURIComponent(projectName)}/uploads`;
+  const started = await fetch(base, { method: 'POST' }).then(res => res.json());
+  const uploadUrl = `${base}/${started.upload_id}`;
+  let offset = 0;
+  let failures = 0;
+  while (offset < file.size) {
+    const chunk = file.slice(offset, offset + UPLOAD_CHUNK_SIZE);
+    try {
+      const res = await fetch(`${uploadUrl}?offset=${offset}`, { method: 'PUT', body: chunk });
+      const data = await res.json();
+      if (!res.ok && res.status !== 409) throw new Error(data.error || 'Upload failed');
+      // On 409 the server tells us where it actually is; continue from there
+      offset = data.offset;
+      failures = 0;
+    } catch (err) {
+      if (++failures > UPLOAD_RETRIES) throw err;
+      await new Promise(resolve => setTimeout(resolve, 1000 * failures));
+      offset = (await fetch(uploadUrl).then(res => res.json())).offset;
+    }
+    onProgress(`Uploading... ${Math.floor(100 * offset / file.size)}%`);
+  }
+  const completed = await fetch(`${uploadUrl}/complete`, { method: 'POST' }).then(res => res.json());
+  if (!completed.job_id) throw new Error(completed.error || 'Upload failed');
+  const result = await waitForJob(completed.job_id, job => onProgress(`Extracting images... ${job.done}/${job.total}`));
+  return { message: `Uploaded ${result.num_added} image(s)!`, duplicates: result.duplicates, collisions: result.collisions };
+}
+
+function uploadZip(projectName, file, msgDiv) {
+  const upload = file.size > CHUNKED_UPLOAD_THRESHOLD
+    ? uploadZipChunked(projectName, file, text => { msgDiv.innerText = text; })
+    : uploadZipSingle(projectName, file);
+  return upload.then(data => {
+    let text = data.message || data.error;
+    if (data.duplicates && data.duplicates.length) text += ` Skipped ${data.duplicates.length} duplicate(s).`;
+    if (data.collisions && data.collisions.length) text += ` Renamed ${data.collisions.length} file(s) with clashing names.`;
+    msgDiv.innerText = text;
+  });
+}
+
 function fetchImageList(projectName) {
   return fetch(`/projects/${encodeURIComponent(projectName)}/images/`)
     .then(res => res.json())
@@ -18,9 +91,14 @@ function showMetaInfo(projectName) {
     const metaDiv = document.getElementById('metaInfo');
     const folderPath = `backend/projects/${projectName}/images`;
     if (files.length > 0) {
+      // Small preview strip served from the thumbnail cache rather than the originals
+      const previews = files.slice(0, PREVIEW_COUNT).map(f =>
+        `<img src='/projects/${encodeURIComponent(projectName)}/thumbnails/128/${encodeURIComponent(f)}' alt='${f}' loading='lazy' style='width:64px;height:64px;object-fit:cover;margin:2px;border:1px solid #ccc;'>`
+      ).join('');
       metaDiv.innerHTML = `Number of images: ${files.length}<br>
         <span>Images folder: <code>${folderPath}</code></span>
-        <button id='copyPathBtn'>Copy Path</button>`;
+        <button id='copyPathBtn'>Copy Path</button>
+        <div id='previewStrip'>${previews}</div>`;
       document.getElementById('copyPathBtn').onclick = function() {
         navigator.clipboard.writeText(folderPath);
       };
@@ -54,15 +132,8 @@ document.addEventListener('DOMContentLoaded', function() {
             msgDiv.innerText = 'Please select a zip file.';
             return;
           }
-          const formData = new FormData();
-          formData.append('file', zipInput.files[0]);
-          fetch(`/api/projects/${encodeURIComponent(projectName)}/upload`, {
-            method: 'POST',
-            body: formData
-          })
-          .then(res => res.json())
-          .then(data => {
-            msgDiv.innerText = data.message || data.error;
+          uploadZip(projectName, zipInput.files[0], msgDiv)
+          .then(() => {
             showMetaInfo(projectName);
           })
           .catch(() => {
@@ -86,15 +157,8 @@ document.addEventListener('DOMContentLoaded', function() {
           msgDiv.innerText = 'Please select a zip file.';
           return;
         }
-        const formData = new FormData();
-        formData.append('file', zipInput.files[0]);
-        fetch(`/api/projects/${encodeURIComponent(projectName)}/upload`, {
-          method: 'POST',
-          body: formData
-        })
-        .then(res => res.json())
-        .then(data => {
-          msgDiv.innerText = data.message || data.error;
+        uploadZip(projectName, zipInput.files[0], msgDiv)
+        .then(() => {
           showMetaInfo(projectName);
         })
         .catch(() => {
@@ -114,4 +178,14 @@ document.addEventListener('DOMContentLoaded', function() {
   document.getElementById('autoBtn').onclick = function() {
     window.location.href = `auto_annotate_dataset.html?name=${encodeURIComponent(projectName)}`;
   };
+
+  // Export: the server streams the archive, so a plain navigation downloads it without buffering
+  document.getElementById('exportBtn').onclick = function() {
+    const params = new URLSearchParams({
+      format: document.getElementById('exportFormat').value,
+      source: document.getElementById('exportSource').value,
+      images: document.getElementById('exportImages').checked ? '1' : '0'
+    });
+    window.location.href = `/api/projects/${encodeURIComponent(projectName)}/export?${params}`;
+  };
 });
@@ -158,8 +158,9 @@ function renderImageList(projectName) {
       fragment.appendChild(rowDiv);
     }
     const imgElem = document.createElement('img');
-    imgElem.src = `http://localhost:5000/projects/${encodeURIComponent(projectName)}/images/${encodeURIComponent(img)}`;
+    imgElem.src = `http://localhost:5000/projects/${encodeURIComponent(projectName)}/thumbnails/128/${encodeURIComponent(img)}`;
     imgElem.className = 'anno-img-thumb' + (idx === currentImageIdx ? ' selected' : '');
+    imgElem.loading = 'lazy';
     imgElem.style.width = '60px';
     imgElem.style.height = '60px';
     imgElem.style.objectFit = 'cover';
@@ -387,6 +388,13 @@ function loadImage(projectName) {
   currentLoadedImageIsReady = !!currentLoadedImage;
   canvasLoading = !currentLoadedImage;
   preloadAdjacentImages(projectName, currentImageIdx);
+  // Predictions are fetched one image at a time and kept in predictions
+  if (!(imgName in predictions)) {
+    fetchImagePredictions(imgName, projectName).then(() => {
+      if (images[currentImageIdx] === imgName) loadImage(projectName);
+    });
+    return;
+  }
   // Use predictions if available, else fallback to fetchAnnotations
   if (predictions && predictions[imgName] && predictions[imgName][0] && predictions[imgName][0].boxes && predictions[imgName][0].boxes.length > 0) {
     const pred = predictions[imgName][0];
@@ -765,17 +773,10 @@ document.addEventListener('DOMContentLoaded', async function() {
   Promise.all([
     fetchSubsetImages(projectName, subsetName),
     fetchPredictions(projectName)
-  ]).then(([imgList, preds]) => {
+  ]).then(([imgList, summary]) => {
     images = imgList;
-    predictions = preds;
-    // Parse all unique class indices from predictions
-    const allClassIndices = new Set();
-    Object.values(predictions).forEach(arr => {
-      if (Array.isArray(arr) && arr[0] && arr[0].classes) {
-        arr[0].classes.forEach(c => allClassIndices.add(Math.round(c)));
-      }
-    });
-    presentLabelsGlobal = Array.from(allClassIndices).map(idx => labels[idx]).filter(Boolean);
+    // The summary lists every class index present in the run
+    presentLabelsGlobal = (summary.classes || []).map(idx => labels[idx]).filter(Boolean);
     if (!images.length) {
       document.getElementById('imageList').innerHTML = '<div>No images to annotate.</div>';
       return;
@@ -799,8 +800,8 @@ document.addEventListener('DOMContentLoaded', async function() {
 });
 
 async function fetchPredictions(projectNameArg) {
-  // Fetch auto_annotate_results.json for the project
-  const url = `http://localhost:5000/projects/${encodeURIComponent(projectNameArg)}/auto_annotate_results.json`;
+  // Summary of the latest auto-label run (class indices, counts); per-image boxes are fetched on demand
+  const url = `http://localhost:5000/api/projects/${encodeURIComponent(projectNameArg)}/predictions`;
   try {
     const resp = await fetch(url);
     if (!resp.ok) throw new Error('Failed to fetch predictions');
@@ -809,4 +810,16 @@ async function fetchPredictions(projectNameArg) {
     console.error('Error fetching predictions:', e);
     return {};
   }
-}
\ No newline at end of file
+}
+
+async function fetchImagePredictions(imgName, projectNameArg) {
+  const url = `http://localhost:5000/api/projects/${encodeURIComponent(projectNameArg)}/predictions?image=${encodeURIComponent(imgName)}`;
+  try {
+    const resp = await fetch(url);
+    const data = resp.ok ? await resp.json() : {};
+    predictions[imgName] = data[imgName] || null;
+  } catch (e) {
+    console.error('Error fetching predictions:', e);
+    predictions[imgName] = null;
+  }
+}
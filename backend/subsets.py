@@ -0,0 +1,257 @@
+import json
+import os
+import re
+import sqlite3
+
+import numpy as np
+
+IDS_FILENAME = 'image_ids.sqlite'
+BITMAP_EXT = '.bitmap'
+SET_OPERATIONS = ('union', 'intersection', 'difference')
+SUBSET_NAME = re.compile(r'^subset_\d+$')
+# Stays under SQLite's default limit on bound parameters per statement
+_LOOKUP_CHUNK = 900
+_SCAN_THRESHOLD = 20 * _LOOKUP_CHUNK
+
+
+class ImageIds:
+    """Stable integer ids for a project's image names.
+
+    Ids are handed out in the order names are first seen and never reused,
+    so a subset bitmap keeps meaning the same images after later uploads
+    shift their positions in the sorted listing.
+    """
+
+    def __init__(self, project_dir):
+        self.path = os.path.join(project_dir, IDS_FILENAME)
+        self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('CREATE TABLE IF NOT EXISTS image_ids (id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE)')
+        self._conn.commit()
+
+    def close(self):
+        self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _lookup(self, names):
+        if len(names) > _SCAN_THRESHOLD:
+            # One pass over the table beats thousands of IN queries for bulk lookups
+            wanted = set(names)
+            return {name: i for name, i in self._conn.execute('SELECT name, id FROM image_ids') if name in wanted}
+        known = {}
+        for start in range(0, len(names), _LOOKUP_CHUNK):
+            chunk = names[start:start + _LOOKUP_CHUNK]
+            known.update(self._conn.execute(
+                f'SELECT name, id FROM image_ids WHERE name IN ({",".join("?" * len(chunk))})', chunk))
+        return known
+
+    def id_of(self, name):
+        row = self._conn.execute('SELECT id FROM image_ids WHERE name = ?', (name,)).fetchone()
+        return row[0] if row else None
+
+    def ids_for(self, names, create=True):
+        """Ids for names, in order; unknown names are assigned new ids, or -1 with create=False."""
+        names = list(names)
+        known = self._lookup(names)
+        missing = [name for name in dict.fromkeys(names) if name not in known]
+        if missing and create:
+            with self._conn:
+                self._conn.executemany('INSERT OR IGNORE INTO image_ids (name) VALUES (?)',
+                                       ((name,) for name in missing))
+            # Another writer may have claimed some of them first, so read the ids back
+            known.update(self._lookup(missing))
+        return np.array([known.get(name, -1) for name in names], dtype=np.int64)
+
+    def names_for(self, ids):
+        """Names for ids, in order."""
+        ids = [int(i) for i in ids]
+        found = {}
+        for start in range(0, len(ids), _LOOKUP_CHUNK):
+            chunk = ids[start:start + _LOOKUP_CHUNK]
+            found.update(self._conn.execute(
+                f'SELECT id, name FROM image_ids WHERE id IN ({",".join("?" * len(chunk))})', chunk))
+        return [found[i] for i in ids]
+
+
+def to_bitmap(ids):
+    """Pack ids into a little-endian bitmap: bit i of the result is set when id i is present."""
+    ids = np.asarray(ids, dtype=np.int64)
+    bits = np.zeros(int(ids.max()) + 1 if len(ids) else 0, dtype=bool)
+    bits[ids] = True
+    return np.packbits(bits, bitorder='little')
+
+
+def bitmap_ids(bitmap):
+    return np.flatnonzero(np.unpackbits(bitmap, bitorder='little'))
+
+
+def bitmap_count(bitmap):
+    return int(np.count_nonzero(np.unpackbits(bitmap)))
+
+
+def combine_bitmaps(operation, bitmaps):
+    """Union, intersection or difference (first minus the rest) of bitmaps of any lengths."""
+    if operation not in SET_OPERATIONS:
+        raise ValueError(f'operation must be one of {list(SET_OPERATIONS)}')
+    if not bitmaps:
+        raise ValueError('At least one subset is required')
+    width = max(len(b) for b in bitmaps)
+    padded = [np.pad(b, (0, width - len(b))) for b in bitmaps]
+    if operation == 'union':
+        return np.bitwise_or.reduce(padded)
+    if operation == 'intersection':
+        return np.bitwise_and.reduce(padded)
+    if len(padded) == 1:
+        return padded[0]
+    return padded[0] & ~np.bitwise_or.reduce(padded[1:])
+
+
+def subset_paths(project_dir, subset_name):
+    """(legacy JSON path, bitmap path) for subset_name; at most one of them exists."""
+    subset_dir = os.path.join(project_dir, subset_name)
+    return (os.path.join(subset_dir, subset_name + '.json'),
+            os.path.join(subset_dir, subset_name + BITMAP_EXT))
+
+
+def subset_name_of(ref):
+    """Subset folder name from either 'subset_N' or the 'subset_N/subset_N.json' form stored in configs."""
+    name = ref.replace('\\', '/').split('/')[0]
+    if not SUBSET_NAME.match(name):
+        raise ValueError(f'Invalid subset: {ref}')
+    return name
+
+
+def list_subsets(project_dir):
+    """[(name, format)] for every subset folder holding a JSON list or a bitmap, ordered by N."""
+    subsets = []
+    for name in os.listdir(project_dir):
+        if not SUBSET_NAME.match(name):
+            continue
+        json_path, bitmap_path = subset_paths(project_dir, name)
+        if os.path.exists(bitmap_path):
+            subsets.append((name, 'bitmap'))
+        elif os.path.exists(json_path):
+            subsets.append((name, 'json'))
+    return sorted(subsets, key=lambda s: int(s[0].split('_')[1]))
+
+
+def read_bitmap(project_dir, subset_name):
+    return np.fromfile(subset_paths(project_dir, subset_name)[1], dtype=np.uint8)
+
+
+def subset_bitmap(project_dir, subset_name, image_ids):
+    """Bitmap for a subset in either format; legacy name lists are mapped through image_ids."""
+    json_path, bitmap_path = subset_paths(project_dir, subset_name)
+    if os.path.exists(bitmap_path):
+        return np.fromfile(bitmap_path, dtype=np.uint8)
+    with open(json_path, 'r', encoding='utf-8') as f:
+        names = json.load(f).get('images', [])
+    return to_bitmap(image_ids.ids_for(names))
+
+
+def subset_images(project_dir, subset_name):
+    """Image names in a subset of either format; raises FileNotFoundError if it has neither."""
+    json_path, bitmap_path = subset_paths(project_dir, subset_name)
+    if os.path.exists(bitmap_path):
+        with ImageIds(project_dir) as image_ids:
+            return sorted(image_ids.names_for(bitmap_ids(np.fromfile(bitmap_path, dtype=np.uint8))))
+    with open(json_path, 'r', encoding='utf-8') as f:
+        return json.load(f).get('images', [])
+
+
+def iter_subset_json(project_dir, subset_name, chunk=10000):
+    """Yield a bitmap subset as the legacy {"images": [...]} document, sorted by name, in chunks."""
+    names = subset_images(project_dir, subset_name)
+    yield '{"images": ['
+    for start in range(0, len(names), chunk):
+        yield (', ' if start else '') + ', '.join(json.dumps(name) for name in names[start:start + chunk])
+    yield ']}'
+
+
+def subset_contains(project_dir, subset_name, names):
+    """{name: bool} membership, reading one byte of the bitmap per name."""
+    json_path, bitmap_path = subset_paths(project_dir, subset_name)
+    if not os.path.exists(bitmap_path):
+        with open(json_path, 'r', encoding='utf-8') as f:
+            members = set(json.load(f).get('images', []))
+        return {name: name in members for name in names}
+    out = {}
+    with ImageIds(project_dir) as image_ids, open(bitmap_path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        for name in names:
+            image_id = image_ids.id_of(name)
+            if image_id is None or image_id >> 3 >= size:
+                out[name] = False
+                continue
+            f.seek(image_id >> 3)
+            out[name] = bool(f.read(1)[0] >> (image_id & 7) & 1)
+    return out
+
+
+def _claim_subset_name(project_dir):
+    """Create the next free subset_N folder and return its name."""
+    n = 1
+    while True:
+        name = f'subset_{n}'
+        try:
+            # mkdir either claims the folder or fails, so concurrent creators never share an N
+            os.mkdir(os.path.join(project_dir, name))
+            return name
+        except FileExistsError:
+            n += 1
+
+
+def write_subset(project_dir, bitmap):
+    """Save bitmap as the next free subset_N and return that name."""
+    name = _claim_subset_name(project_dir)
+    bitmap_path = subset_paths(project_dir, name)[1]
+    tmp_path = bitmap_path + '.tmp'
+    np.asarray(bitmap, dtype=np.uint8).tofile(tmp_path)
+    os.replace(tmp_path, bitmap_path)
+    return name
+
+
+def create_subset(project_dir, names, keep_order=False):
+    """Save a list of image names as a new subset; returns its name.
+
+    Subsets are bitmaps, which list their images sorted by name. With
+    keep_order the names are saved as a JSON list instead, exactly as given,
+    duplicates included; every reader accepts both formats.
+    """
+    if keep_order:
+        name = _claim_subset_name(project_dir)
+        json_path = subset_paths(project_dir, name)[0]
+        with open(json_path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump({'images': list(names)}, f, indent=2)
+        os.replace(json_path + '.tmp', json_path)
+        return name
+    with ImageIds(project_dir) as image_ids:
+        return write_subset(project_dir, to_bitmap(image_ids.ids_for(names)))
+
+
+def sample(strata, k, seed):
+    """Draw k names without replacement, reproducibly for a given seed.
+
+    strata is a list of name lists. Each stratum gets a share of k
+    proportional to its size (largest remainders break ties), so small
+    groups such as a rare camera resolution are still represented. Pass a
+    single stratum for plain random sampling.
+    """
+    rng = np.random.default_rng(seed)
+    sizes = np.array([len(s) for s in strata], dtype=np.int64)
+    total = int(sizes.sum())
+    k = min(k, total)
+    quotas = sizes * k / total if total else sizes.astype(float)
+    counts = np.floor(quotas).astype(np.int64)
+    for i in np.argsort(-(quotas - counts), kind='stable')[:k - int(counts.sum())]:
+        counts[i] += 1
+    selected = []
+    for names, count in zip(strata, counts):
+        picks = rng.choice(len(names), size=int(count), replace=False)
+        selected.extend(names[i] for i in np.sort(picks))
+    return selected
@@ -0,0 +1,107 @@
+import multiprocessing
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+from PIL import Image, features
+
+THUMBNAILS_DIRNAME = 'thumbnails'
+# Longest edge in pixels; requests for other sizes are rejected rather than resized on demand
+THUMBNAIL_SIZES = (128, 256, 512)
+THUMBNAIL_FORMAT = 'WEBP' if features.check('webp') else 'JPEG'
+THUMBNAIL_EXT = '.webp' if THUMBNAIL_FORMAT == 'WEBP' else '.jpg'
+THUMBNAIL_MIMETYPE = 'image/webp' if THUMBNAIL_FORMAT == 'WEBP' else 'image/jpeg'
+_PREGENERATE_CHUNK = 32
+
+
+def thumbnail_path(cache_dir, image_name, size):
+    return os.path.join(cache_dir, str(size), image_name + THUMBNAIL_EXT)
+
+
+def project_thumbnail_path(project_dir, image_name, size):
+    return thumbnail_path(os.path.join(project_dir, THUMBNAILS_DIRNAME), image_name, size)
+
+
+def _is_fresh(thumb_path, source_mtime_ns):
+    try:
+        return os.stat(thumb_path).st_mtime_ns >= source_mtime_ns
+    except FileNotFoundError:
+        return False
+
+
+def ensure_thumbnails(source_path, cache_dir, image_name, sizes=THUMBNAIL_SIZES):
+    """Create any missing or stale thumbnails of source_path and return their paths, in sizes order.
+
+    The source is decoded at most once: JPEG draft mode lets libjpeg downscale
+    while decoding, and smaller sizes are resized from the largest one.
+    """
+    source_mtime_ns = os.stat(source_path).st_mtime_ns
+    paths = [thumbnail_path(cache_dir, image_name, size) for size in sizes]
+    stale = [(size, path) for size, path in zip(sizes, paths) if not _is_fresh(path, source_mtime_ns)]
+    if not stale:
+        return paths
+    with Image.open(source_path) as img:
+        largest = max(size for size, _ in stale)
+        img.draft('RGB', (largest, largest))
+        img = img.convert('RGB')
+        for size, path in sorted(stale, reverse=True):
+            img.thumbnail((size, size))
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # A unique temporary file, since a page request and the pregeneration job may write the same thumbnail
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.', suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'wb') as out:
+                    img.save(out, format=THUMBNAIL_FORMAT, quality=80)
+                os.replace(tmp_path, path)
+            except BaseException:
+                os.remove(tmp_path)
+                raise
+    return paths
+
+
+def ensure_thumbnail(source_path, cache_dir, image_name, size):
+    return ensure_thumbnails(source_path, cache_dir, image_name, (size,))[0]
+
+
+def ensure_project_thumbnail(project_dir, image_name, size):
+    source_path = os.path.join(project_dir, 'images', image_name)
+    return ensure_thumbnail(source_path, os.path.join(project_dir, THUMBNAILS_DIRNAME), image_name, size)
+
+
+def remove_project_thumbnails(project_dir, image_name):
+    for size in THUMBNAIL_SIZES:
+        path = project_thumbnail_path(project_dir, image_name, size)
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def _pregenerate_chunk(project_dir, image_names):
+    images_dir = os.path.join(project_dir, 'images')
+    cache_dir = os.path.join(project_dir, THUMBNAILS_DIRNAME)
+    failed = 0
+    for image_name in image_names:
+        try:
+            ensure_thumbnails(os.path.join(images_dir, image_name), cache_dir, image_name)
+        except (OSError, ValueError):
+            failed += 1
+    return len(image_names), failed
+
+
+def pregenerate_thumbnails_job(job, project_dir, image_names, workers=None):
+    """Job body that fills the thumbnail cache for image_names across a process pool."""
+    workers = workers or os.cpu_count() or 1
+    chunks = [image_names[i:i + _PREGENERATE_CHUNK] for i in range(0, len(image_names), _PREGENERATE_CHUNK)]
+    failed = 0
+    job.update(message='Generating thumbnails...')
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+        futures = [pool.submit(_pregenerate_chunk, project_dir, chunk) for chunk in chunks]
+        try:
+            for future in futures:
+                job.check_cancelled()
+                done, chunk_failed = future.result()
+                failed += chunk_failed
+                job.advance(done)
+        finally:
+            for future in futures:
+                future.cancel()
+    return {'num_images': len(image_names), 'num_failed': failed}
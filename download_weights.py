@@ -7,6 +7,7 @@ weights = [
     ("yolov8", "yolov8s.pt", "https://github.com/ultralytics/assets/releases/download/v0.0.0/yolov8s.pt"),
     # Add more YOLOv8 weights as needed
     # Example for SAM (update the URL to the correct checkpoint for your use case):
+    ("sam", "sam_vit_b.pth", "https://dl.fbaipublicfiles.com/segment_anything/sam_vit_b_01ec64.pth"),
     ("sam", "sam_vit_h.pth", "https://dl.fbaipublicfiles.com/segment_anything/sam_vit_h_4b8939.pth"),
     # Add more SAM weights as needed
 ]
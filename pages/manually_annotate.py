@@ -7,6 +7,11 @@ import datetime
 import yaml
 import random
 from functools import lru_cache
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+from geometry import xywh_to_xyxy, xyxy_to_xywhn, yolo_lines
+from thumbnails import THUMBNAILS_DIRNAME, ensure_thumbnail
 
 # Cache resized images to avoid recomputation on every rerun
 @st.cache_data(show_spinner=False)
@@ -28,6 +33,7 @@ if not project_name:
     st.stop()
 
 images_dir = os.path.join("projects", project_name, "images")
+thumbnails_dir = os.path.join("projects", project_name, THUMBNAILS_DIRNAME)
 if not os.path.exists(images_dir):
     st.error(f"No images found in projects/{project_name}/images. Please upload images first.")
     st.stop()
@@ -76,9 +82,8 @@ with col1:
     for idx, i in enumerate(range(start_idx, end_idx)):
         img_path = image_files[i]
         try:
-            img = Image.open(img_path)
-            scale = min(1.0, 180 / max(img.size))  # Increased thumbnail size
-            thumb = img.resize((int(img.size[0] * scale), int(img.size[1] * scale)))
+            # Cached on disk under projects/<name>/thumbnails; only regenerated when the image changes
+            thumb = ensure_thumbnail(img_path, thumbnails_dir, os.path.basename(img_path), 256)
             with img_cols[idx % 2]:
                 st.image(thumb, width=180)  # Increased width
                 if st.button("Select", key=f"btn_{i}"):
@@ -136,28 +141,18 @@ with col2:
         os.makedirs(annotation_dir, exist_ok=True)
         if st.button("💾 Save Annotations", key="save_annotations_btn_col2"):
             objects = st.session_state['canvas_states'][canvas_key]['objects']
-            yolo_lines = []
-            yaml_annots = []
             image, img_width, img_height = get_resized_image(os.path.join("projects", project_name, "images", selected_image_name))
-            for i, obj in enumerate(objects):
-                if obj['type'] == 'rect':
-                    left, top = obj['left'], obj['top']
-                    width, height = obj['width'], obj['height']
-                    x_center = (left + width / 2) / img_width
-                    y_center = (top + height / 2) / img_height
-                    w_norm = width / img_width
-                    h_norm = height / img_height
-                    label = obj.get('label', label_options[0])
-                    class_id = label_options.index(label)
-                    yolo_lines.append(f"{class_id} {x_center:.6f} {y_center:.6f} {w_norm:.6f} {h_norm:.6f}\n")
-                    yaml_annots.append({
-                        'label': label,
-                        'bbox': [x_center, y_center, w_norm, h_norm]
-                    })
+            rects = [obj for obj in objects if obj['type'] == 'rect']
+            box_labels = [obj.get('label', label_options[0]) for obj in rects]
+            # Canvas rects are in display pixels; normalizing by the display size makes them resolution independent
+            boxes_xywhn = xyxy_to_xywhn(
+                xywh_to_xyxy([[obj['left'], obj['top'], obj['width'], obj['height']] for obj in rects]),
+                img_width, img_height)
+            yaml_annots = [{'label': label, 'bbox': bbox} for label, bbox in zip(box_labels, boxes_xywhn.tolist())]
             # Save YOLO format
             label_path = os.path.join(annotation_dir, selected_image_name.rsplit('.', 1)[0] + '.txt')
             with open(label_path, 'w') as f:
-                f.writelines(yolo_lines)
+                f.writelines(yolo_lines([label_options.index(label) for label in box_labels], boxes_xywhn))
             # Save YAML format (optional, for richer info)
             yaml_path = os.path.join(annotation_dir, selected_image_name.rsplit('.', 1)[0] + '.yaml')
             yaml_data = {
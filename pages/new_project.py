@@ -1,8 +1,11 @@
 import streamlit as st
 import os
 import zipfile
-import io
 import importlib.util
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+from ingest import ingest_zip
 
 st.set_page_config(page_title="Create New Project", layout="wide")
 
@@ -34,25 +37,27 @@ zip_file = st.file_uploader(
     accept_multiple_files=False
 )
 
-SUPPORTED_EXTS = (".jpg", ".jpeg", ".png", ".bmp")
-
 if zip_file and project_name:
     project_dir = os.path.join("projects", project_name)
     images_dir = os.path.join(project_dir, "images")
     if not os.path.exists(images_dir):
         st.error("Please create the project first.")
     else:
-        with zipfile.ZipFile(io.BytesIO(zip_file.read())) as z:
-            valid_files = [f for f in z.namelist() if f.lower().endswith(SUPPORTED_EXTS)]
-            if not valid_files:
+        # The uploaded file is already seekable, so members are streamed from it without another copy
+        try:
+            report = ingest_zip(zip_file, project_dir)
+        except zipfile.BadZipFile:
+            report = None
+            st.error("The uploaded file is not a valid zip archive.")
+        if report is not None:
+            if not report['added'] and not report['duplicates']:
                 st.error("No supported image files found in the uploaded zip.")
             else:
-                for file in valid_files:
-                    filename = os.path.basename(file)
-                    if filename:
-                        with z.open(file) as source, open(os.path.join(images_dir, filename), "wb") as target:
-                            target.write(source.read())
-                st.success(f"Uploaded {len(valid_files)} image(s) to '{project_name}/images'!")
+                st.success(f"Uploaded {len(report['added'])} image(s) to '{project_name}/images'!")
+            if report['duplicates']:
+                st.info(f"Skipped {len(report['duplicates'])} image(s) already in the project.")
+            for collision in report['collisions']:
+                st.warning(f"{collision['member']} clashed with an existing name and was saved as {collision['saved_as']}.")
 
 st.markdown("---")
 
@@ -0,0 +1,391 @@
+"""Benchmark the backend's hot paths on synthetic projects, without a GPU, network or real model.
+
+Projects of the requested sizes are generated under a temporary
+PROJECTS_DIR (images are hard links to one small JPEG, with metadata and
+dense manual annotations written straight into the project stores), and
+requests go through the Flask test client. Auto-labeling uses a stub model,
+so its timings measure the pipeline around inference rather than inference
+itself. Results are written as JSON; pass --compare with an earlier file to
+flag regressions.
+
+    python scripts/benchmark.py --sizes 10000,100000 --output bench_results.json
+    python scripts/benchmark.py --sizes 10000 --compare bench_results.json
+"""
+import argparse
+import hashlib
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import zipfile
+from datetime import datetime, timezone
+
+import numpy as np
+from PIL import Image
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend')
+sys.path.insert(0, BACKEND_DIR)
+
+# Resolutions synthetic images claim to have, so stratified sampling has several groups
+_RESOLUTIONS = ((640, 512), (640, 480), (1280, 1024), (320, 256))
+_LABELS = ('person', 'car', 'bicycle', 'animal')
+_STUB_FAMILY = 'bench'
+_STUB_MODEL = 'stub.pt'
+_JOB_POLL_S = 0.005
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--sizes', default='10000',
+                        help='Comma-separated image counts of the synthetic projects, e.g. 10000,100000,1000000')
+    parser.add_argument('--annotated-fraction', type=float, default=0.1,
+                        help='Share of images given manual annotations')
+    parser.add_argument('--boxes-per-image', type=int, default=20, help='Boxes in each annotated image')
+    parser.add_argument('--upload-images', type=int, default=1000, help='Distinct images in the uploaded zip')
+    parser.add_argument('--auto-label-images', type=int, default=1000, help='Images auto-labeled per run')
+    parser.add_argument('--batch-size', type=int, default=16, help='Auto-label batch size')
+    parser.add_argument('--repeat', type=int, default=5, help='Timed runs per benchmark')
+    parser.add_argument('--saves', type=int, default=200, help='save_annotation requests per timed run')
+    parser.add_argument('--only', default=None, help='Comma-separated benchmark names to run (default: all)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workdir', default=None,
+                        help='Where to build projects (default: a temporary directory, removed afterwards)')
+    parser.add_argument('--output', default='bench_results.json', help='Write results here')
+    parser.add_argument('--compare', default=None, help='Earlier results file to compare medians against')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='With --compare, exit non-zero when a median is this much slower (0.25 = 25%%)')
+    return parser.parse_args(argv)
+
+
+class _Array:
+    """Stands in for a torch tensor: .cpu().numpy() returns the data."""
+
+    def __init__(self, values):
+        self._values = np.asarray(values, dtype=np.float32)
+
+    def cpu(self):
+        return self
+
+    def numpy(self):
+        return self._values
+
+
+class _Boxes:
+    def __init__(self, xyxy, conf, cls):
+        self.xyxy, self.conf, self.cls = _Array(xyxy), _Array(conf), _Array(cls)
+
+    def __len__(self):
+        return len(self.conf.numpy())
+
+
+class _Result:
+    def __init__(self, boxes):
+        self.boxes = boxes
+
+
+class StubYOLO:
+    """Replaces ultralytics.YOLO: every image gets a few boxes derived from its pixels, instantly."""
+
+    def __init__(self, path):
+        self.path = path
+
+    def predict(self, source, **kwargs):
+        items = source if isinstance(source, list) else [source]
+        results = []
+        for item in items:
+            pixels = np.asarray(Image.open(item)) if isinstance(item, str) else item
+            seed = int(pixels[::8, ::8].sum()) % 9973
+            n = seed % 6
+            x = (seed % 50) + np.arange(n, dtype=np.float32) * 40
+            xyxy = np.stack([x, x / 2, x + 30, x / 2 + 50], axis=1)
+            conf = 0.2 + (seed + np.arange(n)) % 80 / 100
+            results.append(_Result(_Boxes(xyxy, conf, np.arange(n) % len(_LABELS))))
+        return results
+
+    __call__ = predict
+
+
+def make_app(root):
+    """Import the backend app with its data directories and model loader pointed at the bench setup."""
+    import app as appmod
+    appmod.PROJECTS_DIR = os.path.join(root, 'projects')
+    appmod.MODELS_DIR = os.path.join(root, 'models')
+    os.makedirs(appmod.PROJECTS_DIR, exist_ok=True)
+    os.makedirs(os.path.join(appmod.MODELS_DIR, _STUB_FAMILY), exist_ok=True)
+    with open(os.path.join(appmod.MODELS_DIR, _STUB_FAMILY, _STUB_MODEL), 'wb') as f:
+        f.write(b'stub')
+    appmod.YOLO = StubYOLO
+    return appmod, appmod.app.test_client()
+
+
+def _jpeg_bytes(rng, size=32):
+    image = Image.fromarray(rng.integers(0, 256, (size, size, 3), dtype=np.uint8))
+    buf = io.BytesIO()
+    image.save(buf, format='JPEG', quality=70)
+    return buf.getvalue()
+
+
+def _annotation(rng, width, height, boxes):
+    x = rng.uniform(0, width * 0.9, boxes)
+    y = rng.uniform(0, height * 0.9, boxes)
+    w = rng.uniform(4, width * 0.1, boxes)
+    h = rng.uniform(4, height * 0.1, boxes)
+    labels = rng.integers(0, len(_LABELS), boxes)
+    return [{'bbox': [round(a, 1), round(b, 1), round(c, 1), round(d, 1)], 'label': _LABELS[l]}
+            for a, b, c, d, l in zip(x.tolist(), y.tolist(), w.tolist(), h.tolist(), labels.tolist())]
+
+
+def build_project(appmod, client, name, num_images, annotated_fraction, boxes_per_image, seed):
+    """A project of num_images hard-linked images with recorded metadata and dense manual annotations."""
+    from annotation_store import AnnotationStore
+    from image_metadata import ImageMetadataStore
+
+    rng = np.random.default_rng(seed)
+    _expect(client.post('/api/projects', json={'project_name': name}), 200)
+    project_dir = os.path.join(appmod.PROJECTS_DIR, name)
+    images_dir = os.path.join(project_dir, 'images')
+    template = os.path.join(project_dir, 'template.jpg')
+    with open(template, 'wb') as f:
+        f.write(_jpeg_bytes(rng))
+    names = [f'frame_{i:07d}.jpg' for i in range(num_images)]
+    for image_name in names:
+        try:
+            os.link(template, os.path.join(images_dir, image_name))
+        except OSError:
+            shutil.copyfile(template, os.path.join(images_dir, image_name))
+    resolutions = rng.integers(0, len(_RESOLUTIONS), num_images)
+    # Runs of consecutive frames share a hash family, like video, so dedup has clusters to find
+    dhashes = rng.integers(0, 2 ** 63, num_images // 8 + 1, dtype=np.int64).repeat(8)[:num_images]
+    dhashes ^= 1 << rng.integers(0, 3, num_images)
+    with ImageMetadataStore(project_dir) as metadata:
+        for i, image_name in enumerate(names):
+            width, height = _RESOLUTIONS[resolutions[i]]
+            metadata.put(image_name, hashlib.sha1(image_name.encode()).hexdigest(),
+                         {'width': width, 'height': height, 'format': 'JPEG', 'mode': 'RGB', 'channels': 3,
+                          'bit_depth': 8, 'dhash': int(dhashes[i])}, commit=False)
+        metadata.commit()
+    step = max(1, round(1 / annotated_fraction)) if annotated_fraction > 0 else None
+    annotated = range(0, num_images, step) if step else range(0)
+    with AnnotationStore(project_dir) as store:
+        for start in range(0, len(annotated), 10000):
+            images = {}
+            for i in annotated[start:start + 10000]:
+                width, height = _RESOLUTIONS[resolutions[i]]
+                images[names[i]] = {'width': width, 'height': height,
+                                    'annotations': _annotation(rng, width, height, boxes_per_image)}
+            store.import_json({'images': images, 'categories': list(_LABELS)})
+    return names
+
+
+def make_zip(num_images, seed):
+    rng = np.random.default_rng(seed)
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, 'w', zipfile.ZIP_STORED) as zf:
+        for i in range(num_images):
+            zf.writestr(f'upload/img_{i:06d}.jpg', _jpeg_bytes(rng))
+    return buf.getvalue()
+
+
+def _expect(response, *codes):
+    if response.status_code not in codes:
+        raise RuntimeError(f'{response.request.path} returned {response.status_code}: {response.get_data(as_text=True)[:500]}')
+    return response
+
+
+def wait_for_job(client, job_id):
+    while True:
+        job = _expect(client.get(f'/api/jobs/{job_id}'), 200).get_json()
+        if job['status'] in ('completed', 'failed', 'cancelled'):
+            if job['status'] != 'completed':
+                raise RuntimeError(f"Job {job_id} {job['status']}: {job.get('error')}")
+            return job
+        time.sleep(_JOB_POLL_S)
+
+
+def timed(fn, repeat, setup=None, per=1):
+    """Wall-clock seconds of repeat calls of fn (setup runs untimed before each); per divides each run."""
+    runs = []
+    for _ in range(repeat):
+        state = setup() if setup else None
+        start = time.perf_counter()
+        fn(state) if setup else fn()
+        runs.append((time.perf_counter() - start) / per)
+    return {'median_s': statistics.median(runs), 'min_s': min(runs), 'max_s': max(runs),
+            'mean_s': statistics.fmean(runs), 'runs': len(runs), 'per_call': per > 1}
+
+
+def project_benchmarks(client, name, names, args, rng):
+    """{benchmark: timing} for the per-project endpoints on one synthetic project."""
+    base = f'/api/projects/{name}'
+    sample_names = random.Random(args.seed).sample(names, max(1, len(names) // 100))
+
+    def save_many():
+        for i in range(args.saves):
+            image_name = names[(i * 7919) % len(names)]
+            _expect(client.post(f'{base}/save_annotation', json={
+                'file_name': image_name, 'width': 640, 'height': 512,
+                'annotations': _annotation(rng, 640, 512, args.boxes_per_image)}), 200)
+
+    return {
+        'list_images': lambda: timed(lambda: _expect(client.get(f'/projects/{name}/images/'), 200), args.repeat),
+        'list_images_page': lambda: timed(
+            lambda: _expect(client.get(f'/projects/{name}/images/?limit=100&cursor='), 200), args.repeat),
+        'save_single_annotation': lambda: timed(save_many, args.repeat, per=args.saves),
+        'create_manual_subset': lambda: timed(
+            lambda: _expect(client.post(f'{base}/create_manual_subset', json={'images': sample_names}), 200),
+            args.repeat),
+        'create_random_subset': lambda: timed(
+            lambda: _expect(client.post(f'{base}/create_random_subset', json={'percent': 10, 'seed': 1}), 200),
+            args.repeat),
+        'create_random_subset_stratified': lambda: timed(
+            lambda: _expect(client.post(f'{base}/create_random_subset',
+                                        json={'percent': 10, 'seed': 1, 'stratify': 'resolution'}), 200),
+            args.repeat),
+        'create_dedup_subset': lambda: timed(
+            lambda: _expect(client.post(f'{base}/create_dedup_subset', json={}), 200), args.repeat),
+    }
+
+
+def upload_benchmarks(client, args):
+    payload = make_zip(args.upload_images, args.seed)
+    counter = iter(range(10 ** 6))
+
+    def fresh_project():
+        name = f'upload_{next(counter)}'
+        _expect(client.post('/api/projects', json={'project_name': name}), 200)
+        return name
+
+    def upload(name):
+        return _expect(client.post(f'/api/projects/{name}/upload', content_type='multipart/form-data',
+                                   data={'file': (io.BytesIO(payload), 'bench.zip')}), 200).get_json()
+
+    def upload_and_thumbnails(name):
+        wait_for_job(client, upload(name)['thumbnail_job_id'])
+
+    return {
+        'upload_zip': lambda: timed(upload, args.repeat, setup=fresh_project),
+        'upload_zip_with_thumbnails': lambda: timed(upload_and_thumbnails, args.repeat, setup=fresh_project),
+    }
+
+
+def auto_label_benchmarks(client, args):
+    name = 'auto_label'
+    _expect(client.post('/api/projects', json={'project_name': name}), 200)
+    base = f'/api/projects/{name}'
+    job = _expect(client.post(f'{base}/upload', content_type='multipart/form-data',
+                              data={'file': (io.BytesIO(make_zip(args.auto_label_images, args.seed + 1)),
+                                             'bench.zip')}), 200).get_json()
+    wait_for_job(client, job['thumbnail_job_id'])
+    subset = _expect(client.post(f'{base}/create_random_subset', json={'percent': 100, 'seed': 0}), 200).get_json()
+    _expect(client.post(f'{base}/save_auto_annotate_config', json={
+        'model_family': _STUB_FAMILY, 'model_version': _STUB_MODEL,
+        'subset': f"{subset['subset']}/{subset['subset']}.json", 'batch_size': args.batch_size}), 200)
+
+    def run():
+        wait_for_job(client, _expect(client.post(f'{base}/run_auto_label'), 202).get_json()['job_id'])
+
+    def clear_cache():
+        _expect(client.post(f'{base}/prediction_cache/clear'), 200)
+
+    return {
+        'run_auto_label': lambda: timed(lambda _: run(), args.repeat, setup=clear_cache),
+        # Every image already in the prediction cache: measures everything around inference
+        'run_auto_label_cached': lambda: timed(run, args.repeat),
+        'create_uncertainty_subset': lambda: timed(
+            lambda: _expect(client.post(f'{base}/create_uncertainty_subset',
+                                        json={'strategy': 'entropy', 'percent': 10, 'exclude_annotated': False}),
+                            200),
+            args.repeat),
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=BACKEND_DIR, capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline_path, tolerance):
+    """Print median ratios against a baseline file; returns the benchmarks that got slower than tolerance."""
+    with open(baseline_path, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)['results']
+    regressions = []
+    print(f"\n{'benchmark':<48} {'baseline':>10} {'now':>10} {'ratio':>7}")
+    for key, timing in results.items():
+        if key not in baseline:
+            continue
+        before, now = baseline[key]['median_s'], timing['median_s']
+        ratio = now / before if before else float('inf')
+        flag = ''
+        if ratio > 1 + tolerance:
+            regressions.append(key)
+            flag = '  SLOWER'
+        print(f'{key:<48} {before * 1000:>8.2f}ms {now * 1000:>8.2f}ms {ratio:>6.2f}x{flag}')
+    return regressions
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    sizes = [int(s) for s in args.sizes.split(',') if s.strip()]
+    only = set(args.only.split(',')) if args.only else None
+    root = args.workdir or tempfile.mkdtemp(prefix='bench_')
+    os.makedirs(root, exist_ok=True)
+    results = {}
+
+    def record(key, bench):
+        if only is not None and key.split('@')[0] not in only:
+            return
+        results[key] = bench()
+        timing = results[key]
+        unit = 'per call' if timing['per_call'] else 'per run'
+        print(f"{key:<48} median {timing['median_s'] * 1000:9.2f}ms  min {timing['min_s'] * 1000:9.2f}ms  ({unit})")
+
+    try:
+        appmod, client = make_app(root)
+        rng = np.random.default_rng(args.seed)
+        for size in sizes:
+            name = f'synthetic_{size}'
+            start = time.perf_counter()
+            names = build_project(appmod, client, name, size, args.annotated_fraction, args.boxes_per_image,
+                                  args.seed)
+            print(f'Built {name} in {time.perf_counter() - start:.1f}s')
+            for key, bench in project_benchmarks(client, name, names, args, rng).items():
+                record(f'{key}@{size}', bench)
+        for key, bench in upload_benchmarks(client, args).items():
+            record(f'{key}@{args.upload_images}', bench)
+        for key, bench in auto_label_benchmarks(client, args).items():
+            record(f'{key}@{args.auto_label_images}', bench)
+    finally:
+        if not args.workdir:
+            shutil.rmtree(root, ignore_errors=True)
+
+    report = {
+        'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'git_commit': _git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'params': {k: v for k, v in vars(args).items() if k not in ('output', 'compare', 'workdir')},
+        'results': results,
+    }
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f'Results written to {args.output}')
+    if args.compare:
+        regressions = compare(results, args.compare, args.tolerance)
+        if regressions:
+            sys.exit(f"{len(regressions)} benchmark(s) slower than the baseline by more than "
+                     f"{args.tolerance:.0%}: {', '.join(regressions)}")
+
+
+if __name__ == '__main__':
+    main()
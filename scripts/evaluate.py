@@ -0,0 +1,65 @@
+"""Evaluate a project's latest auto-label run against its manual annotations.
+
+Prints per-class precision, recall and AP and optionally writes the full
+report (confusion matrix, per-image false negatives) as JSON; the same
+report the /api/projects/<project>/evaluate endpoint returns.
+
+    python scripts/evaluate.py --project backend/projects/my_project --output eval.json
+"""
+import argparse
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+from evaluation import evaluate_project
+from subsets import subset_images, subset_name_of
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--project', required=True, help='Project directory, e.g. backend/projects/<name>')
+    parser.add_argument('--subset', default=None, help='Only evaluate images in this subset (subset_N)')
+    parser.add_argument('--score-threshold', type=float, default=0.0,
+                        help='Minimum score for precision/recall, the confusion matrix and false negatives')
+    parser.add_argument('--class-names', default=None,
+                        help='Text file with one name per prediction class id (defaults to the project labels)')
+    parser.add_argument('--output', default=None, help='Write the full JSON report here')
+    parser.add_argument('--max-false-negative-images', type=int, default=None,
+                        help='Only list this many images in the report, most missed boxes first')
+    return parser.parse_args(argv)
+
+
+def _fmt(value):
+    return '-' if value is None else f'{value:.3f}'
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    class_names = None
+    if args.class_names:
+        with open(args.class_names, 'r', encoding='utf-8') as f:
+            class_names = [line.strip() for line in f if line.strip()]
+    names = set(subset_images(args.project, subset_name_of(args.subset))) if args.subset else None
+    report = evaluate_project(args.project, class_names, names, score_threshold=args.score_threshold,
+                              max_false_negative_images=args.max_false_negative_images)
+    if report is None:
+        sys.exit('No auto-annotate results in this project; run auto-labeling first.')
+
+    print(f"{report['num_images']} images, {report['num_ground_truth']} ground-truth boxes, "
+          f"{report['num_predictions']} predictions")
+    print(f"{'class':<20} {'gt':>7} {'pred':>7} {'P':>6} {'R':>6} {'AP50':>6} {'AP':>6}")
+    for row in report['classes']:
+        print(f"{row['name'][:20]:<20} {row['ground_truth']:>7} {row['predictions']:>7} {_fmt(row['precision']):>6} "
+              f"{_fmt(row['recall']):>6} {_fmt(row['ap50']):>6} {_fmt(row['ap']):>6}")
+    print(f"{'all':<20} {report['num_ground_truth']:>7} {report['num_predictions']:>7} "
+          f"{_fmt(report['precision']):>6} {_fmt(report['recall']):>6} {_fmt(report['map50']):>6} {_fmt(report['map']):>6}")
+    print(f"{report['images_with_false_negatives']} images have missed boxes")
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,78 +1,206 @@
-from ultralytics import YOLO
+"""Flag images where the model likely missed objects, for manual review in annotation_app.py.
+
+By default an image is flagged when no detection reaches --threshold.
+With --ground-truth pointing at YOLO label files for the source images,
+it is flagged when a labelled box has no same-class detection at or above
+--threshold overlapping it by --iou, and the missed boxes are listed.
+
+For each flagged image the model's own predictions are written as a YOLO
+label file, and an entry is appended to the metadata YAML list. Images are
+predicted in streamed batches, so memory does not grow with the dataset,
+and a rerun skips images that an interrupted run already processed. Those
+are recorded relative to --source, so a rerun may start from another
+directory or name the source by an absolute path.
+
+    python scripts/filter_false_negatives.py --model model/baseline.pt --source datasets/test_subset/
+    python scripts/filter_false_negatives.py --source datasets/test/images --ground-truth datasets/test/labels
+"""
+import argparse
+import json
 import os
+import sys
+
+import numpy as np
 import yaml
 
-# Load trained model
-model = YOLO('model/baseline.pt')
-
-# Define paths
-project_root = os.getcwd()
-test_subset_dir = 'datasets/test_subset/'
-false_negative_labels_dir = 'annotations/false_negatives/'
-
-# Make sure output folder exists
-os.makedirs(false_negative_labels_dir, exist_ok=True)
-
-# Run inference on test subset
-results = model.predict(source=test_subset_dir, save=False, conf=0.2)
-
-# User-defined threshold
-user_threshold = 0.5
-
-# Metadata to save
-potential_false_negatives = []
-
-# Process results
-for result in results:
-    image_path = result.path
-    image_name = os.path.basename(image_path).replace('.jpg', '.txt')
-
-    # Extract confidence scores
-    if result.boxes is not None and len(result.boxes) > 0:
-        confs = result.boxes.conf.cpu().numpy()
-    else:
-        confs = []
-
-    # If no detection ≥ threshold — flag as potential false negative
-    if len(confs) == 0 or all(c < user_threshold for c in confs):
-        print(f"Potential false negative: {image_name}")
-
-        # Save model predictions (if any) as YOLO format to false_negative_labels_dir
-        pred_label_path = os.path.join(false_negative_labels_dir, image_name)
-        with open(pred_label_path, 'w') as f:
-            if result.boxes is not None and len(result.boxes) > 0:
-                for box, conf, cls in zip(
-                    result.boxes.xywhn.cpu().numpy(),  # normalized xywh format
-                    confs,
-                    result.boxes.cls.cpu().numpy()
-                ):
-                    line = f"{int(cls)} {box[0]:.6f} {box[1]:.6f} {box[2]:.6f} {box[3]:.6f}\n"
-                    f.write(line)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+from active_learning import FlatPredictions
+from evaluation import flatten_ground_truth, match_detections
+from geometry import parse_yolo_lines, xywhn_to_xyxy, xyxy_to_xywhn, yolo_lines
+from ingest import SUPPORTED_EXTS
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--model', default='model/baseline.pt', help='YOLO weights to run')
+    parser.add_argument('--source', default='datasets/test_subset/', help='Directory of images to check')
+    parser.add_argument('--labels-dir', default='annotations/false_negatives/',
+                        help='Where YOLO label files of flagged images are written')
+    parser.add_argument('--metadata', default='annotations/potential_false_negatives.yaml',
+                        help='YAML list of flagged images and their detections')
+    parser.add_argument('--conf', type=float, default=0.2, help='Confidence threshold passed to predict')
+    parser.add_argument('--threshold', type=float, default=0.5,
+                        help='Images with no detection at or above this score are flagged')
+    parser.add_argument('--ground-truth', default=None,
+                        help='Directory of YOLO label files; flag images with labelled boxes the model missed')
+    parser.add_argument('--iou', type=float, default=0.5,
+                        help='With --ground-truth, overlap a detection needs to count as finding a box')
+    parser.add_argument('--batch-size', type=int, default=16, help='Images per predict call')
+    parser.add_argument('--imgsz', type=int, default=None, help='Inference size (model default if omitted)')
+    parser.add_argument('--device', default=None, help='Inference device, e.g. cpu or 0')
+    parser.add_argument('--restart', action='store_true',
+                        help='Ignore a previous run and start over, replacing its metadata')
+    return parser.parse_args(argv)
+
+
+def list_images(source):
+    return sorted(entry.path for entry in os.scandir(source)
+                  if entry.is_file() and entry.name.lower().endswith(SUPPORTED_EXTS))
+
+
+def progress_path(metadata_path):
+    return os.path.splitext(metadata_path)[0] + '.progress.jsonl'
+
+
+def load_progress(metadata_path):
+    """Images finished by earlier runs; the metadata is cut back to the last completed batch.
+
+    Each line of the progress file records one batch and the metadata size
+    once that batch was written, so a batch interrupted mid-write is dropped
+    and redone rather than leaving a torn YAML entry behind.
+    """
+    done = set()
+    # Without a progress file this is a fresh run, which replaces any earlier metadata
+    metadata_size = 0
+    if os.path.exists(progress_path(metadata_path)):
+        with open(progress_path(metadata_path), 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    checkpoint = json.loads(line)
+                except ValueError:
+                    break
+                done.update(checkpoint['images'])
+                metadata_size = checkpoint['metadata_size']
+    if os.path.exists(metadata_path):
+        with open(metadata_path, 'r+b') as f:
+            f.truncate(metadata_size)
+    return done
+
+
+def read_result(result):
+    """The parts of a Results object this script needs, so its image can be freed right away."""
+    boxes = result.boxes
+    empty = boxes is None or len(boxes) == 0
+    img_height, img_width = result.orig_shape
+    return {
+        'path': result.path, 'width': img_width, 'height': img_height, 'names': result.names,
+        'xyxy': np.empty((0, 4), dtype=np.float32) if empty else boxes.xyxy.cpu().numpy(),
+        'confs': np.empty(0, dtype=np.float32) if empty else boxes.conf.cpu().numpy(),
+        'classes': np.empty(0, dtype=np.float32) if empty else boxes.cls.cpu().numpy(),
+    }
+
+
+def _label(names, class_id):
+    return names.get(class_id, str(class_id)) if isinstance(names, dict) else str(class_id)
+
+
+def missed_boxes(results, labels_dir, threshold, iou):
+    """Per result, the labelled boxes no same-class detection scoring >= threshold found at iou.
+
+    The whole batch is matched at once; images without a label file count
+    as having no objects.
+    """
+    items = []
+    for r in results:
+        label_path = os.path.join(labels_dir, os.path.splitext(os.path.basename(r['path']))[0] + '.txt')
+        class_ids, boxes_xywhn = np.empty(0, dtype=np.int64), np.empty((0, 4))
+        if os.path.exists(label_path):
+            with open(label_path, 'r') as f:
+                class_ids, boxes_xywhn = parse_yolo_lines(f)
+        items.append((r['path'], xywhn_to_xyxy(boxes_xywhn, r['width'], r['height']), class_ids))
+    gt = flatten_ground_truth(items)
+    confident = [r['confs'] >= threshold for r in results]
+    preds = FlatPredictions(gt.names, [int(c.sum()) for c in confident],
+                            np.concatenate([r['xyxy'][c] for r, c in zip(results, confident)]),
+                            np.concatenate([r['confs'][c] for r, c in zip(results, confident)]),
+                            np.concatenate([r['classes'][c] for r, c in zip(results, confident)]))
+    found = np.zeros(len(gt.scores), dtype=bool)
+    matches = match_detections(gt, preds, [iou])[0]
+    found[matches[matches >= 0]] = True
+    missed = []
+    for i, r in enumerate(results):
+        rows = np.arange(gt.offsets[i], gt.offsets[i + 1])
+        rows = rows[~found[rows]]
+        missed.append([{'bbox': box, 'label': _label(r['names'], int(c))}
+                       for box, c in zip(gt.boxes[rows].tolist(), gt.classes[rows].tolist())])
+    return missed
+
+
+def flag_entry(r, labels_dir, project_root, missed=None):
+    """Write the image's predictions as a YOLO label file and return its metadata entry."""
+    image_name = os.path.basename(r['path'])
+    with open(os.path.join(labels_dir, os.path.splitext(image_name)[0] + '.txt'), 'w') as f:
+        f.writelines(yolo_lines(r['classes'], xyxy_to_xywhn(r['xyxy'], r['width'], r['height'])))
+    entry = {
+        'image_path': os.path.relpath(r['path'], project_root),
+        'detections': [{'bbox': box, 'confidence': conf, 'label': _label(r['names'], int(cls))}
+                       for box, conf, cls in zip(r['xyxy'].tolist(), r['confs'].tolist(), r['classes'].tolist())],
+    }
+    if missed is not None:
+        entry['missed'] = missed
+    return entry
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    from ultralytics import YOLO
+
+    os.makedirs(args.labels_dir, exist_ok=True)
+    os.makedirs(os.path.dirname(os.path.abspath(args.metadata)), exist_ok=True)
+    if args.restart:
+        for path in (args.metadata, progress_path(args.metadata)):
+            if os.path.exists(path):
+                os.remove(path)
+    done = load_progress(args.metadata)
+    project_root = os.getcwd()
+    pending = [path for path in list_images(args.source) if os.path.relpath(path, args.source) not in done]
+    if done:
+        print(f"Resuming: {len(done)} images already processed, {len(pending)} to go.")
+
+    model = YOLO(args.model)
+    predict_kwargs = {'save': False, 'conf': args.conf, 'verbose': False}
+    if args.imgsz:
+        predict_kwargs['imgsz'] = args.imgsz
+    if args.device is not None:
+        predict_kwargs['device'] = args.device
+
+    flagged = 0
+    with open(args.metadata, 'ab') as metadata, \
+            open(progress_path(args.metadata), 'a', encoding='utf-8') as progress:
+        for start in range(0, len(pending), args.batch_size):
+            batch = pending[start:start + args.batch_size]
+            # stream=True hands back one Results at a time, so only this batch's images are ever decoded
+            results = [read_result(result) for result in model.predict(source=batch, stream=True, **predict_kwargs)]
+            if args.ground_truth:
+                missed = missed_boxes(results, args.ground_truth, args.threshold, args.iou)
+                entries = [flag_entry(r, args.labels_dir, project_root, m) for r, m in zip(results, missed) if m]
             else:
-                # No predictions — leave file empty or optionally skip creating it
-                pass
-
-        # Store metadata for YAML
-        detections = []
-        if result.boxes is not None and len(result.boxes) > 0:
-            for box, conf, cls in zip(
-                result.boxes.xyxy.cpu().numpy(),  # absolute xyxy for YAML
-                confs,
-                result.boxes.cls.cpu().numpy()
-            ):
-                detections.append({
-                    'bbox': box.tolist(),
-                    'confidence': float(conf),
-                    'label': result.names[int(cls)]
-                })
-
-        potential_false_negatives.append({
-            'image_path': os.path.relpath(image_path, project_root),
-            'detections': detections
-        })
-
-# Save metadata to YAML
-with open('annotations/potential_false_negatives.yaml', 'w') as f:
-    yaml.dump(potential_false_negatives, f)
-
-print("False negative filtering complete.")
+                entries = [flag_entry(r, args.labels_dir, project_root)
+                           for r in results if not (r['confs'] >= args.threshold).any()]
+            for entry in entries:
+                print(f"Potential false negative: {os.path.basename(entry['image_path'])}")
+            # One-item lists dumped back to back concatenate into a single valid YAML list
+            if entries:
+                metadata.write(''.join(yaml.dump([entry]) for entry in entries).encode('utf-8'))
+                metadata.flush()
+            flagged += len(entries)
+            progress.write(json.dumps({'images': [os.path.relpath(path, args.source) for path in batch],
+                                       'metadata_size': metadata.tell()}) + '\n')
+            progress.flush()
+            print(f"{min(start + args.batch_size, len(pending))}/{len(pending)} images, {flagged} flagged")
+
+    print("False negative filtering complete.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+from PIL import Image
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+
+MODEL_FAMILY = 'yolov8'
+MODEL_VERSION = 'stub.pt'
+
+
+class _Array:
+    def __init__(self, values):
+        self._values = np.asarray(values, dtype=np.float32)
+
+    def cpu(self):
+        return self
+
+    def numpy(self):
+        return self._values
+
+
+class _Boxes:
+    def __init__(self, width, height):
+        self.xyxy = _Array([[0, 0, width / 2, height / 2]])
+        self.conf = _Array([0.6])
+        self.cls = _Array([0])
+
+
+class _Result:
+    def __init__(self, boxes):
+        self.boxes = boxes
+
+
+class StubYOLO:
+    """Stands in for ultralytics.YOLO; records the (width, height) of every image in each predict call."""
+
+    calls = []
+
+    def __init__(self, path):
+        self.path = path
+
+    def predict(self, source, **kwargs):
+        items = source if isinstance(source, list) else [source]
+        sizes = [Image.open(item).size if isinstance(item, str) else (item.shape[1], item.shape[0])
+                 for item in items]
+        StubYOLO.calls.append(sizes)
+        return [_Result(_Boxes(width, height)) for width, height in sizes]
+
+
+def write_image(path, size=(64, 48), color=(0, 0, 0)):
+    Image.new('RGB', size, color).save(path)
+
+
+@pytest.fixture
+def appmod(tmp_path, monkeypatch):
+    """The backend app with its projects and models under tmp_path and a stub YOLO."""
+    import app as appmod
+    monkeypatch.setattr(appmod, 'PROJECTS_DIR', str(tmp_path / 'projects'))
+    monkeypatch.setattr(appmod, 'MODELS_DIR', str(tmp_path / 'models'))
+    monkeypatch.setattr(appmod, 'YOLO', StubYOLO)
+    os.makedirs(appmod.PROJECTS_DIR)
+    os.makedirs(os.path.join(appmod.MODELS_DIR, MODEL_FAMILY))
+    with open(os.path.join(appmod.MODELS_DIR, MODEL_FAMILY, MODEL_VERSION), 'wb') as f:
+        f.write(b'weights')
+    StubYOLO.calls = []
+    return appmod
+
+
+@pytest.fixture
+def client(appmod):
+    return appmod.app.test_client()
+
+
+@pytest.fixture
+def project(appmod, client):
+    """(name, directory) of an empty project."""
+    assert client.post('/api/projects', json={'project_name': 'p'}).status_code == 200
+    return 'p', os.path.join(appmod.PROJECTS_DIR, 'p')
+
+
+def wait_for_job(client, job_id):
+    """Block until the job ends and return its final snapshot."""
+    client.get(f'/api/jobs/{job_id}/events').get_data()
+    return client.get(f'/api/jobs/{job_id}').get_json()
@@ -0,0 +1,41 @@
+import json
+import os
+
+from annotation_store import LEGACY_FILENAME, LEGACY_IMPORTED_SUFFIX, AnnotationStore
+
+LEGACY = {
+    'images': {'a.jpg': {'width': 64, 'height': 48,
+                         'annotations': [{'bbox': [1, 2, 3, 4], 'category': 'cat'}]}},
+    'categories': ['cat'],
+}
+
+
+def _write_legacy(project_dir, data=LEGACY):
+    with open(os.path.join(project_dir, LEGACY_FILENAME), 'w', encoding='utf-8') as f:
+        json.dump(data, f)
+
+
+def test_legacy_json_is_imported_once_and_retired(project):
+    _, project_dir = project
+    _write_legacy(project_dir)
+    legacy_path = os.path.join(project_dir, LEGACY_FILENAME)
+    with AnnotationStore(project_dir) as store:
+        assert store.get('a.jpg')['annotations'] == LEGACY['images']['a.jpg']['annotations']
+    assert not os.path.exists(legacy_path)
+    assert os.path.exists(legacy_path + LEGACY_IMPORTED_SUFFIX)
+
+    # A stale copy put back later must not overwrite what the store has since recorded
+    _write_legacy(project_dir, {'images': {'b.jpg': {'annotations': []}}, 'categories': []})
+    with AnnotationStore(project_dir) as store:
+        assert store.get('b.jpg') is None
+        assert store.get('a.jpg') is not None
+    assert os.path.exists(legacy_path)
+
+
+def test_export_serves_the_store_not_the_legacy_file(project, client):
+    name, project_dir = project
+    _write_legacy(project_dir)
+    exported = json.loads(client.get(f'/api/projects/{name}/manual_annotations.json').get_data())
+    assert exported['images']['a.jpg']['annotations'] == LEGACY['images']['a.jpg']['annotations']
+    assert exported['categories'] == ['cat']
+    assert not os.path.exists(os.path.join(project_dir, LEGACY_FILENAME))
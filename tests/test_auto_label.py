@@ -0,0 +1,47 @@
+import os
+
+from auto_label import _batches_by_resolution
+from conftest import MODEL_FAMILY, MODEL_VERSION, StubYOLO, wait_for_job, write_image
+from image_metadata import ImageMetadataStore
+
+
+def _mixed_project(project_dir):
+    """Eleven images in three sizes, only some with recorded metadata, interleaved by name."""
+    sizes = [(64, 48), (80, 60), (32, 32)]
+    names = []
+    for i in range(11):
+        name = f'img_{i:02d}.jpg'
+        write_image(os.path.join(project_dir, 'images', name), sizes[i % 3])
+        names.append(name)
+    with ImageMetadataStore(project_dir) as metadata:
+        for name in names[:5]:
+            width, height = sizes[names.index(name) % 3]
+            metadata.put(name, 'sha', {'width': width, 'height': height})
+    return names
+
+
+def test_batches_hold_one_resolution(project):
+    _, project_dir = project
+    names = _mixed_project(project_dir)
+    batches = _batches_by_resolution(project_dir, [(name, None) for name in names], 2)
+    assert sorted(name for batch in batches for name, _ in batch) == names
+    for batch in batches:
+        assert len(batch) <= 2
+        assert len({names.index(name) % 3 for name, _ in batch}) == 1
+
+
+def test_auto_label_never_mixes_sizes_in_a_predict_call(project, client):
+    name, project_dir = project
+    names = _mixed_project(project_dir)
+    subset = client.post(f'/api/projects/{name}/create_manual_subset', json={'images': names}).get_json()['subset']
+    assert client.post(f'/api/projects/{name}/save_auto_annotate_config', json={
+        'model_family': MODEL_FAMILY, 'model_version': MODEL_VERSION,
+        'subset': f'{subset}/{subset}.json', 'batch_size': 4}).status_code == 200
+    job = client.post(f'/api/projects/{name}/run_auto_label').get_json()
+    assert wait_for_job(client, job['job_id'])['status'] == 'completed'
+
+    assert sum(len(call) for call in StubYOLO.calls) == len(names)
+    for call in StubYOLO.calls:
+        assert len(set(call)) == 1
+    predictions = client.get(f'/api/projects/{name}/predictions?' + '&'.join(f'image={n}' for n in names)).get_json()
+    assert all(predictions[n] for n in names)
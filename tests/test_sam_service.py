@@ -0,0 +1,17 @@
+import numpy as np
+
+from sam_service import EmbeddingCache
+
+
+def test_fresh_and_cached_embeddings_match(tmp_path):
+    project_dir = str(tmp_path)
+    features = np.random.default_rng(0).standard_normal((1, 256, 64, 64)).astype(np.float32)
+    entry = (features, (480, 640), (768, 1024))
+
+    fresh = EmbeddingCache(4, 1 << 30).put(project_dir, 'ab' * 20, entry)
+    cached = EmbeddingCache(4, 1 << 30).get(project_dir, 'ab' * 20)
+
+    assert fresh[0].dtype == cached[0].dtype == np.float32
+    assert np.array_equal(fresh[0], cached[0])
+    assert np.array_equal(fresh[0], features.astype(np.float16).astype(np.float32))
+    assert fresh[1:] == cached[1:] == ((480, 640), (768, 1024))
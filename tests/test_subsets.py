@@ -0,0 +1,44 @@
+import json
+import os
+
+from conftest import write_image
+from subsets import subset_images
+
+NAMES = ['c.jpg', 'a.jpg', 'b.jpg']
+
+
+def _images(project_dir):
+    for name in NAMES:
+        write_image(os.path.join(project_dir, 'images', name))
+
+
+def _served(client, project_name, subset):
+    return json.loads(client.get(f'/projects/{project_name}/{subset}/{subset}.json').get_data())['images']
+
+
+def test_manual_subset_keeps_order_and_repeats(project, client):
+    name, project_dir = project
+    _images(project_dir)
+    picked = ['b.jpg', 'c.jpg', 'b.jpg', 'a.jpg']
+    subset = client.post(f'/api/projects/{name}/create_manual_subset', json={'images': picked}).get_json()['subset']
+    assert subset_images(project_dir, subset) == picked
+    assert _served(client, name, subset) == picked
+
+
+def test_random_subset_is_served_sorted(project, client):
+    name, project_dir = project
+    _images(project_dir)
+    subset = client.post(f'/api/projects/{name}/create_random_subset', json={'percent': 100}).get_json()['subset']
+    assert _served(client, name, subset) == sorted(NAMES)
+
+
+def test_manual_subset_combines_with_bitmap_subsets(project, client):
+    name, project_dir = project
+    _images(project_dir)
+    manual = client.post(f'/api/projects/{name}/create_manual_subset',
+                         json={'images': ['c.jpg', 'a.jpg']}).get_json()['subset']
+    everything = client.post(f'/api/projects/{name}/create_random_subset', json={'percent': 100}).get_json()['subset']
+    response = client.post(f'/api/projects/{name}/subsets/combine',
+                           json={'operation': 'difference', 'subsets': [everything, manual]})
+    assert response.status_code == 200
+    assert _served(client, name, response.get_json()['subset']) == ['b.jpg']